@@ -0,0 +1,61 @@
+# benchmarks/bench_replay.py
+"""
+Replays a capture as fast as possible through CanReplayService, MotorService and
+DataService (decode + stream storage + plot decimation, no GUI) and reports frames/second.
+Without an argument a synthetic 1 kHz, 8-motor capture is used.
+
+Run from the repository root:
+    python -m benchmarks.bench_replay [recording_dir | capture.asc | capture.log]
+"""
+import contextlib
+import io
+import sys
+import time
+import numpy as np
+from config import CAN_ID_TELEMETRY_BASE
+from models.motor_registry import MotorRegistry
+from services.can_replay import CanCapture, CanReplayService
+from services.data_service import DataService
+from services.motor_service import MotorService, TELEMETRY_DTYPE
+
+def _synthetic_capture(motor_count=8, seconds=30, rate_hz=1000):
+    samples = seconds * rate_hz
+    node_ids = np.tile(np.arange(1, motor_count + 1), samples)
+    sample_index = np.repeat(np.arange(samples), motor_count)
+    records = np.zeros(len(node_ids), dtype=TELEMETRY_DTYPE)
+    records["angle"] = sample_index * 10
+    records["velocity"] = sample_index % 3000
+    records["current_q"] = sample_index % 2000
+    timestamps = sample_index * (1_000_000_000 // rate_hz) + node_ids * 1000
+    return CanCapture(timestamps, CAN_ID_TELEMETRY_BASE + node_ids, np.zeros(len(node_ids)),
+                      np.full(len(node_ids), 8), records.view(np.uint8).reshape(-1, 8))
+
+def main():
+    capture = CanCapture.load(sys.argv[1]) if len(sys.argv) > 1 else _synthetic_capture()
+    with contextlib.redirect_stdout(io.StringIO()):
+        data_service = DataService()
+        data_service.change_history_length(100000)
+    replay = CanReplayService(capture, speed=0)
+    motor_service = MotorService(replay, data_service)
+    motors = MotorRegistry()
+
+    frames = 0
+    start = time.perf_counter()
+    replay.connect()
+    with contextlib.redirect_stdout(io.StringIO()):
+        while not (replay.is_finished and replay.get_rx_stats()["pending"] == 0):
+            replay.wait_for_rx(0.01)
+            for batch in replay.drain_frame_batches():
+                frames += len(batch)
+                for event_type, data in motor_service.process_frame_batch(batch, motors):
+                    if event_type == 'new_motor' and data.id not in motors:
+                        motors.append(data)
+            for motor in motors:
+                data_service.get_plot_data(f"motor_{motor.id}_angle", 2000)
+    elapsed = time.perf_counter() - start
+    replay.disconnect()
+    print(f"{frames} frames ({capture.duration_s:.1f} s of traffic, {len(motors)} motors) in {elapsed:.2f} s: "
+          f"{frames / elapsed:,.0f} frames/s, {capture.duration_s / elapsed:.0f}x real time")
+
+if __name__ == "__main__":
+    main()
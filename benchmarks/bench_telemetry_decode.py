@@ -0,0 +1,74 @@
+# benchmarks/bench_telemetry_decode.py
+"""
+Compares the scalar (per-frame struct.unpack) and batch (np.frombuffer) telemetry
+decode paths in MotorService. Reports frames/second for 1, 8 and 64 motors.
+
+Run from the repository root:
+    python -m benchmarks.bench_telemetry_decode
+"""
+import contextlib
+import io
+import struct
+import time
+import can
+from config import CAN_ID_TELEMETRY_BASE
+from models.motor import Motor
+from models.motor_registry import MotorRegistry
+from services.data_service import DataService
+from services.motor_service import MotorService
+
+FRAMES_PER_MOTOR_PER_TICK = 17  # 1 kHz telemetry drained by a 60 FPS loop
+TICKS = 200
+
+def _make_tick(motor_ids, tick_index):
+    messages = []
+    for n in range(FRAMES_PER_MOTOR_PER_TICK):
+        for motor_id in motor_ids:
+            sample = tick_index * FRAMES_PER_MOTOR_PER_TICK + n
+            data = struct.pack('<ihh', sample * 10, sample % 3000, sample % 2000)
+            messages.append(can.Message(arbitration_id=CAN_ID_TELEMETRY_BASE + motor_id, data=data,
+                                        is_extended_id=False, timestamp=sample * 0.001))
+    return messages
+
+def _make_services(motor_ids):
+    with contextlib.redirect_stdout(io.StringIO()):
+        data_service = DataService()
+        data_service.change_history_length(10000)
+        motor_service = MotorService(can_service=None, data_service=data_service)
+        for motor_id in motor_ids:
+            for suffix in ("angle", "velocity", "current_q"):
+                data_service.register_stream(f"motor_{motor_id}_{suffix}")
+    motors = MotorRegistry()
+    for motor_id in motor_ids:
+        motors.add(Motor(id=motor_id))
+    return motor_service, motors
+
+def bench_scalar(ticks, motor_ids):
+    motor_service, motors = _make_services(motor_ids)
+    start = time.perf_counter()
+    for messages in ticks:
+        for msg in messages:
+            motor_service.process_message(msg, motors)
+    return time.perf_counter() - start
+
+def bench_batch(ticks, motor_ids):
+    motor_service, motors = _make_services(motor_ids)
+    start = time.perf_counter()
+    for messages in ticks:
+        motor_service.process_messages(messages, motors)
+    return time.perf_counter() - start
+
+def main():
+    print(f"{'motors':>6} {'frames':>8} {'scalar fps':>14} {'batch fps':>14} {'speedup':>8}")
+    for motor_count in (1, 8, 64):
+        motor_ids = list(range(1, motor_count + 1))
+        ticks = [_make_tick(motor_ids, i) for i in range(TICKS)]
+        total_frames = sum(len(t) for t in ticks)
+        scalar_s = bench_scalar(ticks, motor_ids)
+        batch_s = bench_batch(ticks, motor_ids)
+        scalar_fps = total_frames / scalar_s
+        batch_fps = total_frames / batch_s
+        print(f"{motor_count:>6} {total_frames:>8} {scalar_fps:>14,.0f} {batch_fps:>14,.0f} {batch_fps / scalar_fps:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
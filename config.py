@@ -3,7 +3,31 @@
 # --- CAN Service ---
 CAN_INTERFACE = 'socketcan'
 CAN_CHANNEL = 'can0'
+# Every channel listed here is opened with its own reader. A motor with node ID n on
+# CAN_CHANNELS[k] gets the global ID k * CAN_MOTORS_PER_BUS + n, so bus 0 keeps plain node IDs.
+# Test with several vcan interfaces, e.g. CAN_CHANNELS = ['vcan0', 'vcan1'].
+CAN_CHANNELS = [CAN_CHANNEL]
+CAN_MOTORS_PER_BUS = 128
 CAN_BITRATE = 500000 # Restored to your original value
+CAN_RX_BUFFER_SIZE = 16384 # Max frames held between two GUI-loop drains
+CAN_RX_OVERFLOW_POLICY = 'drop_oldest' # 'drop_oldest' or 'drop_newest'
+# 'python-can' reads one can.Message per frame. 'raw' reads batches of frames from a raw
+# AF_CAN socket into NumPy arrays (Linux SocketCAN only; python-can is still used for TX).
+CAN_RX_BACKEND = 'python-can'
+CAN_RAW_BATCH_SIZE = 256 # Max frames read per wakeup by the raw backend
+# Run CAN I/O, frame decoding and stream storage (decimation, stats, retention, recording)
+# in a child process; the GUI reads snapshots of the stored samples out of shared-memory
+# rings and talks to the child through a command pipe. See services/ingest_process.py.
+CAN_PROCESS_MODE = False
+CAN_PROCESS_RING_CAPACITY = 65536 # Samples per stream held in shared memory
+CAN_PROCESS_CYCLE = 0.002 # Seconds between decode/publish cycles in the child
+CAN_PROCESS_STATS_INTERVAL = 0.1 # Seconds between running-stats updates sent to the GUI
+# Hand fixed-rate frames (SYNC, streamed setpoints) to the kernel's broadcast manager
+# via python-can send_periodic. Works on a real bus or on vcan0:
+#   sudo ip link add dev vcan0 type vcan && sudo ip link set vcan0 up
+CAN_USE_BCM = False
+CAN_SYNC_PERIOD = 0.01       # seconds between periodic SYNC frames
+CAN_SETPOINT_PERIOD = 0.01   # seconds between streamed setpoint frames
 
 # --- CAN IDs ---
 CAN_ID_COMMAND_BASE = 0x000
@@ -60,4 +84,68 @@ REG_CUSTOM_FLIP_SENSOR_DIR       = 0xE2
 REG_CUSTOM_TELEMETRY_PERIOD      = 0xE3
 REG_CUSTOM_CHARACTERIZE_MOTOR    = 0xE4
 REG_CUSTOM_SET_ID_AND_RESTART    = 0xE5
-REG_CUSTOM_MOTION_COMMAND        = 0xE6 # NEW
\ No newline at end of file
+REG_CUSTOM_MOTION_COMMAND        = 0xE6 # NEW
+
+# --- TX Scheduling ---
+# Commands to these registers are setpoints: only the latest value per motor is sent.
+CAN_TX_LATEST_VALUE_REGISTERS = (REG_TARGET,)
+# At most this many priority frames go out in a row while a latest-value slot is waiting.
+CAN_TX_PRIORITY_BURST = 8
+
+# --- Data Streams ---
+# Sample values are stored in preallocated NumPy arrays of this dtype (timestamps are int64 ns).
+# 'float32' halves the memory of the value arrays at ~7 significant digits.
+DATA_VALUE_DTYPE = 'float64'
+# Running statistics (mean/std/min/max/RMS/percentiles over a whole run) are kept for plotted
+# streams, or for every recorded stream when STATS_ALL_STREAMS is set.
+STATS_ALL_STREAMS = False
+STATS_HISTOGRAM_BINS = 512 # Percentiles are accurate to one bin width of the observed range
+# Streams with a retention policy (DataService.set_retention) keep their own history length;
+# all streams together stay within the budget by shrinking the lowest-priority ones first.
+DATA_MEMORY_BUDGET_MB = 256
+DATA_MIN_RETENTION = 100 # Samples a stream keeps however tight the budget
+# Decimation applied to matching streams as samples are added: stream key pattern (fnmatch) ->
+# (method, factor) with method 'nth', 'average', 'cic' or 'fir'. Plotted streams are stored at
+# the full rate while they are on the plot. Example: {'motor_*_current_q': ('fir', 4)}
+INGEST_DECIMATION = {}
+# Plots draw at most PLOT_POINTS_PER_PIXEL points per pixel of plot width per series.
+# 'minmax' keeps each pixel column's extremes, 'lttb' reduces further for a smoother look, 'none' draws every sample.
+PLOT_DECIMATION = 'minmax'
+PLOT_POINTS_PER_PIXEL = 2
+# Plot panels share one time axis. Each redraws at most refresh_hz times per second (new
+# panels start at PLOT_DEFAULT_REFRESH_HZ) and has up to PLOT_Y_AXES value axes.
+PLOT_DEFAULT_REFRESH_HZ = 60
+PLOT_Y_AXES = 3
+
+# --- Main Loop ---
+# services/frame_scheduler.py renders at up to MAIN_LOOP_MAX_FPS and lowers the frame rate,
+# down to MAIN_LOOP_MIN_FPS, when UI updates and rendering overrun their share of the frame
+# or ingest can't keep up. Between frames the loop blocks until CAN traffic is ready.
+MAIN_LOOP_MAX_FPS = 60
+MAIN_LOOP_MIN_FPS = 15
+# Share of each frame interval for each stage. Ingest also gets whatever the others leave unused.
+MAIN_LOOP_BUDGETS = {'ingest': 0.4, 'ui': 0.2, 'render': 0.4}
+MAIN_LOOP_DRAIN_SLICE = 8 # Frame batches (or 8 * CAN_RAW_BATCH_SIZE messages) ingested between deadline checks
+# While idle the loop wakes once MAIN_LOOP_WAKE_ITEMS frames (or raw frame batches) are pending,
+# or MAIN_LOOP_WAKE_LINGER seconds after the first one arrived, so kHz telemetry is ingested in
+# batches rather than one or two frames per wakeup.
+MAIN_LOOP_WAKE_ITEMS = 32
+MAIN_LOOP_WAKE_LINGER = 0.001
+
+# The frame profiler (services/frame_profiler.py) times main-loop stages into histograms of
+# PROFILER_HISTOGRAM_BINS log-spaced buckets between PROFILER_MIN_TIME and PROFILER_MAX_TIME seconds.
+# When disabled it removes its timing wrappers, so it costs nothing.
+PROFILER_ENABLED = False
+PROFILER_HISTOGRAM_BINS = 60
+PROFILER_MIN_TIME = 1e-5
+PROFILER_MAX_TIME = 1.0
+PROFILER_RECENT_FRAMES = 600   # Frames kept for the worst-frames list
+PROFILER_REPORT_INTERVAL = 0.5 # Seconds between overlay refreshes
+
+# --- Recording ---
+# Recordings go to RECORD_DIRECTORY/<date_time>/ as chunked per-column .npy files (see services/recorder.py).
+RECORD_DIRECTORY = 'recordings'
+RECORD_CHUNK_SAMPLES = 65536   # Rows per chunk file
+RECORD_COMPRESSION = None      # None (memory-mappable), 'zlib' or 'lzma'
+RECORD_MAX_PENDING_MB = 64     # Chunks waiting for the writer thread beyond this are dropped
+RECORD_FLUSH_INTERVAL = 1.0    # Seconds between writes of partially filled chunks
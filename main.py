@@ -1,6 +1,6 @@
 # main.py
 import dearpygui.dearpygui as dpg
-import time
+from services.frame_scheduler import FrameScheduler
 from viewmodels.main_viewmodel import MainViewModel
 from views.main_view import MainView
 
@@ -17,19 +17,12 @@ def main():
     # Corrected: Use "primary_window" to match the tag in UIManager
     dpg.set_primary_window("primary_window", True)
     
-    last_render_time = time.time()
-    render_interval = 1.0 / 60.0
-
-    while dpg.is_dearpygui_running():
-        main_viewmodel.update()
-
-        now = time.time()
-        if now - last_render_time >= render_interval:
-            last_render_time = now
-            main_view.update()
-            dpg.render_dearpygui_frame()
-        
-        time.sleep(0.001)
+    # The scheduler paces frames itself; with vsync, render_dearpygui_frame would block until the next refresh.
+    dpg.set_viewport_vsync(False)
+    scheduler = FrameScheduler(ingest=main_viewmodel.update, update_ui=main_view.update,
+                               render=dpg.render_dearpygui_frame, wait_for_io=main_viewmodel.wait_for_io)
+    main_viewmodel.instrument_main_loop(scheduler)
+    scheduler.run(dpg.is_dearpygui_running)
 
     main_viewmodel.disconnect()
     dpg.destroy_context()
@@ -1,10 +1,30 @@
 # models/can_message.py
 from dataclasses import dataclass
+import numpy as np
 
 @dataclass
 class CanMessage:
     """
     A simple data class for CAN messages.
+    `timestamp` is the wall-clock receive time in seconds; 0.0 means "not stamped".
+    `channel` is the index of the bus the frame was received on.
     """
     arbitration_id: int
-    data: bytearray
\ No newline at end of file
+    data: bytearray
+    timestamp: float = 0.0
+    channel: int = 0
+
+@dataclass
+class FrameBatch:
+    """
+    A batch of received frames stored as parallel arrays, one entry per frame,
+    so a whole wakeup's worth of traffic can be decoded without per-frame objects.
+    """
+    arbitration_ids: np.ndarray  # uint32, flags stripped
+    dlcs: np.ndarray             # uint8
+    data: np.ndarray             # uint8, shape (n, 8)
+    timestamps_ns: np.ndarray    # int64 on the stream time base (see utils.now_ns)
+    bus: int = 0                 # index of the bus every frame was received on
+
+    def __len__(self):
+        return len(self.arbitration_ids)
@@ -1,7 +1,29 @@
 # models/motor.py
+from config import CAN_MOTORS_PER_BUS, CAN_CHANNELS
+
+def bus_index(channel):
+    """
+    Maps a received message's `channel` to a bus index: CanService sets the index itself,
+    None means bus 0 and a channel name ('can0') is looked up in CAN_CHANNELS (bus 0 if absent).
+    """
+    if channel is None: return 0
+    if isinstance(channel, int): return channel
+    try:
+        return CAN_CHANNELS.index(channel)
+    except ValueError:
+        return 0
+
+def split_motor_id(motor_id):
+    """Splits a global motor ID into (bus index, node ID on that bus)."""
+    return divmod(motor_id, CAN_MOTORS_PER_BUS)
+
+def make_motor_id(bus, node_id):
+    return bus * CAN_MOTORS_PER_BUS + node_id
+
 class Motor:
     def __init__(self, id):
-        self.id = id
+        self.id = id  # Global ID, see split_motor_id()
+        self.bus, self.node_id = split_motor_id(id)
         self.angle = 0.0
         self.velocity = 0.0
         self.current_q = 0.0
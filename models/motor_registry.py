@@ -0,0 +1,37 @@
+# models/motor_registry.py
+class MotorRegistry:
+    """
+    Dict-backed collection of discovered motors, keyed by motor ID.
+    Iterates over Motor objects in discovery order like the list it replaces,
+    while membership tests and lookups by ID are constant time.
+    """
+
+    def __init__(self):
+        self._motors = {}
+
+    def add(self, motor):
+        self._motors[motor.id] = motor
+
+    # List-style alias so existing `motors.append(motor)` callers keep working.
+    append = add
+
+    def get(self, motor_id, default=None):
+        return self._motors.get(motor_id, default)
+
+    def remove(self, motor_id):
+        self._motors.pop(motor_id, None)
+
+    def clear(self):
+        self._motors.clear()
+
+    def ids(self):
+        return list(self._motors.keys())
+
+    def __contains__(self, motor_id):
+        return motor_id in self._motors
+
+    def __iter__(self):
+        return iter(list(self._motors.values()))
+
+    def __len__(self):
+        return len(self._motors)
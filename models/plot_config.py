@@ -2,18 +2,23 @@
 from dataclasses import dataclass, field
 from typing import List
 import uuid
+from config import PLOT_DEFAULT_REFRESH_HZ
 
 @dataclass
 class SeriesConfig:
-    """Represents a single data series on a plot's Y-axis."""
+    """Represents a single data series on one of a plot's Y-axes."""
     id: str = field(default_factory=lambda: f"series_{uuid.uuid4().hex[:8]}")
     data_key: str = ""
     dpg_tag: str = ""
+    y_axis: int = 0  # 0 is the left axis, 1 and 2 are drawn on the right
 
 @dataclass
 class PlotConfig:
-    """Represents our single plot window which can have multiple Y-axes."""
-    id: str = "main_plot"
+    """Represents one plot panel. Panels are stacked with a shared time axis, each with up to PLOT_Y_AXES Y-axes."""
+    id: str = field(default_factory=lambda: f"plot_{uuid.uuid4().hex[:8]}")
     name: str = "Live Data Plot"
     series_list: List[SeriesConfig] = field(default_factory=list)
-    dpg_tag: str = ""
\ No newline at end of file
+    refresh_hz: float = PLOT_DEFAULT_REFRESH_HZ
+    dpg_tag: str = ""
+    x_axis_tag: str = ""
+    y_axis_tags: List[str] = field(default_factory=list)
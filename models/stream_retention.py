@@ -0,0 +1,14 @@
+# models/stream_retention.py
+from dataclasses import dataclass
+from typing import Optional
+
+@dataclass
+class RetentionPolicy:
+    """
+    How much history one stream keeps: `samples`, or `seconds` at the stream's measured
+    sample rate. When the global memory budget is exceeded, streams with the lowest
+    `priority` are shrunk first.
+    """
+    samples: Optional[int] = None
+    seconds: Optional[float] = None
+    priority: int = 1
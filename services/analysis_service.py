@@ -1,13 +1,14 @@
 # services/analysis_service.py
 import numpy as np
+from utils import ns_to_seconds
 
 class AnalysisService:
     def analyze_step_response(self, timestamps, values, amplitude):
         if len(timestamps) < 2:
             return {'error': 'Not enough data'}
         
-        t = np.array(timestamps)
-        y = np.array(values)
+        t = ns_to_seconds(timestamps)
+        y = np.asarray(values)
         
         try:
             # Find the time where the response reaches 63.2% of its final value
@@ -34,8 +35,8 @@ class AnalysisService:
         if len(actual_data['values']) < 20:
             return {"error": "Not enough data for analysis."}
 
-        times = np.array(actual_data['timestamps'])
-        values = np.array(actual_data['values'])
+        times = ns_to_seconds(actual_data['timestamps'])
+        values = np.asarray(actual_data['values'])
         start_value = values[0]
         
         peak_value = np.max(values)
@@ -67,10 +68,15 @@ class AnalysisService:
         if len(target_data['values']) < 20 or len(actual_data['values']) < 20:
             return {"error": "Not enough data for analysis."}
             
-        target_times = np.array(target_data['timestamps'])
-        target_values = np.array(target_data['values'])
-        actual_times = np.array(actual_data['timestamps'])
-        actual_values = np.array(actual_data['values'])
+        target_ns = np.asarray(target_data['timestamps'])
+        target_times = ns_to_seconds(target_ns)
+        target_values = np.asarray(target_data['values'])
+        # Only the actual samples bracketing the target's time span are needed for the interpolation.
+        actual_ns = np.asarray(actual_data['timestamps'])
+        lo = max(int(np.searchsorted(actual_ns, target_ns[0], side="right")) - 1, 0)
+        hi = int(np.searchsorted(actual_ns, target_ns[-1], side="left")) + 1
+        actual_times = ns_to_seconds(actual_ns[lo:hi])
+        actual_values = np.asarray(actual_data['values'])[lo:hi]
         
         interp_actual_values = np.interp(target_times, actual_times, actual_values)
         
@@ -0,0 +1,208 @@
+# services/async_can_service.py
+"""
+asyncio variant of CanService for scripted tuning, test and monitoring tasks.
+
+Frames are delivered by can.Notifier into a can.AsyncBufferedReader on the running
+event loop (SocketCAN buses are watched with loop.add_reader, so no reader thread),
+decoded by the normal MotorService, and handed to whichever coroutines are waiting:
+
+    service = AsyncCanService()
+    await service.connect()
+    motor = await service.wait_for_motor(1)
+    kv = await motor.read_param(REG_KV)
+    sample = await motor.next_telemetry()
+"""
+import asyncio
+import can
+from config import CAN_INTERFACE, CAN_BITRATE, CAN_ID_TELEMETRY_BASE, CAN_ID_RESPONSE_BASE, CAN_ID_STATUS_FEEDBACK_BASE
+from config import REG_STATUS, REG_TARGET
+from models.motor_registry import MotorRegistry
+from services.can_service import CanService
+from services.data_service import DataService
+from services.motor_service import MotorService
+from utils import sync_receive_clock
+
+class AsyncCanService(CanService):
+    """
+    CanService whose receive side runs on an asyncio event loop. Transmission (TX
+    scheduler, latest-value slots, BCM periodic tasks) is inherited unchanged.
+    """
+
+    def __init__(self, data_service=None, channels=None):
+        super().__init__(channels)
+        self.data_service = data_service if data_service is not None else DataService()
+        self.motor_service = MotorService(self, self.data_service)
+        self.motors = MotorRegistry()
+        self._notifier = None
+        self._reader = None
+        self._dispatch_task = None
+        self._param_waiters = {}      # (motor_id, reg_id) -> [Future]
+        self._telemetry_waiters = {}  # motor_id -> [Future]
+        self._motor_waiters = {}      # motor_id -> [Future]
+        self._handles = {}
+
+    async def connect(self):
+        try:
+            can_filters = [
+                {"can_id": CAN_ID_TELEMETRY_BASE, "can_mask": 0x780},
+                {"can_id": CAN_ID_RESPONSE_BASE, "can_mask": 0x700},
+                {"can_id": CAN_ID_STATUS_FEEDBACK_BASE, "can_mask": 0x700}
+            ]
+            for channel in self.channels:
+                self._buses.append(can.interface.Bus(interface=CAN_INTERFACE, channel=channel, bitrate=CAN_BITRATE, can_filters=can_filters))
+            sync_receive_clock()
+            self._reader = can.AsyncBufferedReader()
+            self._notifier = can.Notifier(self._buses, [self._reader], loop=asyncio.get_running_loop())
+            self._is_running = True
+            self._tx_scheduler.start()
+            self._dispatch_task = asyncio.create_task(self._dispatch_loop())
+            return True
+        except Exception as e:
+            print(f"Error connecting to CAN bus: {e}")
+            if self._notifier: self._notifier.stop()
+            self._close_buses()
+            self._notifier = self._reader = None
+            return False
+
+    async def disconnect(self):
+        if not self._is_running: return
+        self.stop_all_periodic()
+        self._tx_scheduler.stop()
+        self._is_running = False
+        if self._dispatch_task:
+            self._dispatch_task.cancel()
+            try: await self._dispatch_task
+            except asyncio.CancelledError: pass
+        if self._notifier: self._notifier.stop()
+        self._close_buses()
+        self._notifier = self._reader = self._dispatch_task = None
+        for waiters in (self._param_waiters, self._telemetry_waiters, self._motor_waiters):
+            for futures in waiters.values():
+                for future in futures:
+                    if not future.done(): future.cancel()
+            waiters.clear()
+
+    async def _dispatch_loop(self):
+        buffer = self._reader.buffer
+        # The notifier leaves the channel name on each frame; MotorService expects the bus index.
+        bus_indices = {channel: index for index, channel in enumerate(self.channels)}
+        while True:
+            # Wait for one frame, then take everything else already queued so a burst is decoded in one pass.
+            messages = [await buffer.get()]
+            while not buffer.empty():
+                messages.append(buffer.get_nowait())
+            for msg in messages:
+                msg.channel = bus_indices.get(msg.channel, 0)
+            try:
+                events = self.motor_service.process_messages(messages, self.motors)
+            except Exception as e:
+                print(f"Error decoding CAN frames: {e}")
+                continue
+            for event_type, data in events:
+                self._handle_event(event_type, data)
+
+    def _handle_event(self, event_type, data):
+        if event_type == 'new_motor':
+            if data.id not in self.motors:
+                self.motors.add(data)
+            self._resolve(self._motor_waiters, data.id, self.motor(data.id))
+            return
+        motor = self.motors.get(data['motor_id'])
+        if event_type == 'telemetry':
+            if motor:
+                motor.angle, motor.velocity, motor.current_q = data['angle'], data['velocity'], data['current_q']
+            self._resolve(self._telemetry_waiters, data['motor_id'], data)
+        elif event_type == 'status_feedback':
+            if motor:
+                motor.status_angle, motor.status_velocity, motor.state = data['angle'], data['velocity'], data['state']
+        elif event_type == 'param_response':
+            if motor:
+                motor.parameters[data['reg_id']] = data['value']
+            self._resolve(self._param_waiters, (data['motor_id'], data['reg_id']), data['value'])
+        elif event_type == 'status_response':
+            if motor:
+                motor.is_enabled = data['is_enabled']
+            self._resolve(self._param_waiters, (data['motor_id'], REG_STATUS), data['is_enabled'])
+        elif event_type == 'char_response':
+            if motor:
+                motor.phase_resistance, motor.phase_inductance = data['R'], data['L']
+
+    @staticmethod
+    def _resolve(waiters, key, result):
+        for future in waiters.pop(key, ()):
+            if not future.done(): future.set_result(result)
+
+    @staticmethod
+    def _add_waiter(waiters, key):
+        # Registered before the request goes out, so a reply can never arrive unobserved.
+        future = asyncio.get_running_loop().create_future()
+        waiters.setdefault(key, []).append(future)
+        return future
+
+    @staticmethod
+    async def _wait(waiters, key, future, timeout):
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            pending = waiters.get(key)
+            if pending and future in pending:
+                pending.remove(future)
+                if not pending: del waiters[key]
+
+    # --- Coroutine API ---
+    def motor(self, motor_id):
+        """Returns the AsyncMotor handle for `motor_id` (the motor need not be discovered yet)."""
+        handle = self._handles.get(motor_id)
+        if handle is None:
+            handle = self._handles[motor_id] = AsyncMotor(self, motor_id)
+        return handle
+
+    async def wait_for_motor(self, motor_id, timeout=None):
+        """Returns the AsyncMotor once `motor_id` has sent telemetry, scanning the bus if it hasn't yet."""
+        if motor_id in self.motors:
+            return self.motor(motor_id)
+        future = self._add_waiter(self._motor_waiters, motor_id)
+        self.motor_service.scan_for_motors()
+        return await self._wait(self._motor_waiters, motor_id, future, timeout)
+
+    async def scan(self, duration=0.5):
+        """Broadcasts a scan request and returns the handles of every motor known after `duration` seconds."""
+        self.motor_service.scan_for_motors()
+        await asyncio.sleep(duration)
+        return [self.motor(motor_id) for motor_id in self.motors.ids()]
+
+class AsyncMotor:
+    """Coroutine-friendly handle on one motor of an AsyncCanService."""
+
+    def __init__(self, service, motor_id):
+        self._service = service
+        self.id = motor_id
+
+    @property
+    def state(self):
+        """The Motor model holding the latest decoded values, or None before discovery."""
+        return self._service.motors.get(self.id)
+
+    async def read_param(self, register, timeout=1.0):
+        """Requests `register` and returns its value (REG_STATUS returns the enabled flag). Raises asyncio.TimeoutError."""
+        service, key = self._service, (self.id, register)
+        future = service._add_waiter(service._param_waiters, key)
+        service.motor_service.request_parameter(self.id, register)
+        return await service._wait(service._param_waiters, key, future, timeout)
+
+    async def next_telemetry(self, timeout=None):
+        """Returns the next telemetry sample as {'motor_id', 'angle', 'velocity', 'current_q'}."""
+        service = self._service
+        future = service._add_waiter(service._telemetry_waiters, self.id)
+        return await service._wait(service._telemetry_waiters, self.id, future, timeout)
+
+    def send_command(self, register, value, fmt='f'):
+        self._service.motor_service.send_command(self.id, register, value, fmt)
+
+    async def write_param(self, register, value, fmt='f', timeout=1.0):
+        """Writes `register`, then reads it back to confirm. Returns the value the motor reports."""
+        self.send_command(register, value, fmt)
+        return await self.read_param(register, timeout)
+
+    def set_target(self, value):
+        self.send_command(REG_TARGET, value, 'f')
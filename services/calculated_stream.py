@@ -0,0 +1,233 @@
+# services/calculated_stream.py
+import numpy as np
+from scipy import signal
+from services.stream_buffer import StreamBuffer
+
+class CalculatedStream:
+    """
+    Base class for the nodes of a derived-stream graph, computed incrementally.
+
+    A node has one output sample per sample of its first (reference) input and keeps
+    its output in its own StreamBuffer. update() does nothing when no input changed,
+    and otherwise computes only the reference samples that arrived since the last call.
+    The newest outputs can depend on data that hasn't arrived yet (the next sample for
+    a derivative, a later sample of another input for an interpolation). Those are
+    counted in `provisional` and recomputed on the next update.
+
+    Subclasses implement _compute(sources, first, stable_inputs), which returns
+    (times, values, stable) for the reference samples from index `first` on, where
+    `stable` is how many of them are final. Nodes with state (filters, integrals) only
+    advance their state over the stable part.
+    """
+
+    def __init__(self, inputs, capacity, value_dtype=np.float64):
+        self.inputs = list(inputs)
+        self.result = StreamBuffer(capacity, value_dtype)
+        self.provisional = 0    # Newest results that will be recomputed when more data arrives
+        self._final_count = 0   # Reference samples (in write_count numbering) with a final result
+        self._source_state = None
+        self._generations = None
+
+    def reset(self, capacity=None):
+        """Discards every result (and any filter state) so the next update() recomputes the whole window."""
+        if capacity is not None:
+            self.result.resize(capacity)
+        self.result.clear()
+        self.provisional = 0
+        self._source_state = None
+        self._generations = None
+        self._reset_state()
+
+    def _reset_state(self):
+        pass
+
+    def update(self):
+        """Brings the result up to date and returns (result StreamBuffer, provisional count)."""
+        sources = [node.update() for node in self.inputs]
+        state = tuple((buffer.version, provisional) for buffer, provisional in sources)
+        if state == self._source_state:
+            return self.result, self.provisional
+        self._source_state = state
+
+        ref, ref_provisional = sources[0]
+        window_start = ref.write_count - len(ref)
+        generations = tuple(buffer.generation for buffer, _ in sources)
+        if generations != self._generations or ref.write_count < self._final_count:
+            self._generations = generations
+            self.result.clear()
+            self.provisional = 0
+            self._final_count = window_start
+            self._reset_state()
+
+        self.result.truncate(self.provisional)
+        self.provisional = 0
+        if self._final_count < window_start:
+            # More than a window arrived since the last update: start from the oldest sample still held.
+            self.result.clear()
+            self._final_count = window_start
+
+        first = self._final_count - window_start  # Index of the first reference sample to compute
+        if first < len(ref):
+            computed = self._compute(sources, first, len(ref) - ref_provisional)
+            if computed is not None:
+                new_times, new_values, stable = computed
+                self.result.append_many(new_times, new_values)
+                self._final_count += stable
+                self.provisional = len(new_times) - stable
+        return self.result, self.provisional
+
+    def _compute(self, sources, first, stable_inputs):
+        raise NotImplementedError
+
+class SourceNode:
+    """Leaf of the graph: a recorded stream (or another named calculated stream) looked up by key."""
+
+    def __init__(self, key, resolve):
+        self.key = key
+        self._resolve = resolve
+
+    def update(self):
+        return self._resolve(self.key)
+
+    def reset(self, capacity=None):
+        pass
+
+class ElementwiseNode(CalculatedStream):
+    """Applies a NumPy function sample by sample, e.g. abs, or `x * 2.5` with a constant."""
+
+    def __init__(self, func, node, capacity, value_dtype=np.float64):
+        super().__init__([node], capacity, value_dtype)
+        self._func = func
+
+    def _compute(self, sources, first, stable_inputs):
+        ref, _ = sources[0]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            values = self._func(ref.values[first:])
+        return ref.timestamps[first:], values, max(stable_inputs - first, 0)
+
+class BinaryNode(CalculatedStream):
+    """Combines two streams on the timestamps of the left one, interpolating the right one."""
+
+    def __init__(self, func, left, right, capacity, value_dtype=np.float64):
+        super().__init__([left, right], capacity, value_dtype)
+        self._func = func
+
+    def _compute(self, sources, first, stable_inputs):
+        (ref, _), (other, other_provisional) = sources
+        if len(other) < 2:
+            return None
+        new_times = ref.timestamps[first:]
+        # Interpolate against only the part of the other input that brackets the new samples.
+        other_times = other.timestamps
+        lo = max(int(np.searchsorted(other_times, new_times[0], side="right")) - 1, 0)
+        hi = max(int(np.searchsorted(other_times, new_times[-1], side="left")) + 1, lo + 1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            new_values = self._func(ref.values[first:], np.interp(new_times, other_times[lo:hi], other.values[lo:hi]))
+        other_stable = len(other) - other_provisional
+        covered = np.searchsorted(new_times, other_times[other_stable - 1], side="right") if other_stable > 0 else 0
+        return new_times, new_values, min(int(covered), max(stable_inputs - first, 0))
+
+class DiffNode(CalculatedStream):
+    """Time derivative (per second), second-order accurate like np.gradient(edge_order=2)."""
+
+    def __init__(self, node, capacity, value_dtype=np.float64):
+        super().__init__([node], capacity, value_dtype)
+
+    def _compute(self, sources, first, stable_inputs):
+        ref, _ = sources[0]
+        timestamps, values = ref.timestamps, ref.values
+        n = len(timestamps)
+        if n < 2:
+            return None
+        if n == 2:
+            # Too short for the second-order formula: both get the slope between them until a third sample arrives.
+            return timestamps[first:], np.gradient(values, timestamps * 1e-9)[first:], 0
+        # The gradient at i uses samples i-1 and i+1, so one sample of context is enough.
+        lo = max(min(first - 1, n - 3), 0)
+        gradient = np.gradient(values[lo:], timestamps[lo:] * 1e-9, edge_order=2)
+        # The last sample uses the one-sided edge formula, and the first one needs two samples after it.
+        stable = max(stable_inputs - 1 - first, 0)
+        if first == 0 and stable_inputs < 3:
+            stable = 0
+        return timestamps[first:], gradient[first - lo:], stable
+
+class IntegrateNode(CalculatedStream):
+    """Running trapezoidal integral over time (per second), starting at zero."""
+
+    def __init__(self, node, capacity, value_dtype=np.float64):
+        super().__init__([node], capacity, value_dtype)
+        self._reset_state()
+
+    def _reset_state(self):
+        self._last = None  # (timestamp, value, integral) of the last stable sample
+
+    def _compute(self, sources, first, stable_inputs):
+        ref, _ = sources[0]
+        times, values = ref.timestamps[first:], ref.values[first:].astype(np.float64)
+        if self._last is None:
+            start_integral = 0.0
+            steps = 0.5 * (values[1:] + values[:-1]) * (np.diff(times) * 1e-9)
+            integral = np.concatenate(([start_integral], start_integral + np.cumsum(steps)))
+        else:
+            last_time, last_value, start_integral = self._last
+            steps = 0.5 * (values + np.concatenate(([last_value], values[:-1]))) * (np.diff(times, prepend=last_time) * 1e-9)
+            integral = start_integral + np.cumsum(steps)
+        stable = max(stable_inputs - first, 0)
+        if stable:
+            self._last = (times[stable - 1], values[stable - 1], integral[stable - 1])
+        return times, integral, stable
+
+class FilterNode(CalculatedStream):
+    """
+    Butterworth low- or high-pass filter run with a stateful scipy.signal.lfilter. The
+    sample rate is estimated once from the median sample interval of the input.
+    """
+
+    def __init__(self, node, cutoff_hz, btype, order, capacity, value_dtype=np.float64):
+        super().__init__([node], capacity, value_dtype)
+        self.cutoff_hz = float(cutoff_hz)
+        self.btype = btype
+        self.order = int(order)
+        self._reset_state()
+
+    def _reset_state(self):
+        self._coefficients = None
+        self._zi = None
+
+    def _compute(self, sources, first, stable_inputs):
+        ref, _ = sources[0]
+        times, values = ref.timestamps, ref.values
+        if self._coefficients is None:
+            if len(times) < 8:
+                return None
+            sample_rate = 1e9 / max(float(np.median(np.diff(times))), 1.0)
+            cutoff = min(self.cutoff_hz, 0.45 * sample_rate)
+            self._coefficients = signal.butter(self.order, cutoff, btype=self.btype, fs=sample_rate)
+        b, a = self._coefficients
+        new_values = values[first:].astype(np.float64)
+        if self._zi is None:
+            self._zi = signal.lfilter_zi(b, a) * (new_values[0] if self.btype == "low" else 0.0)
+
+        stable = max(stable_inputs - first, 0)
+        filtered_stable, self._zi = signal.lfilter(b, a, new_values[:stable], zi=self._zi)
+        filtered_rest, _ = signal.lfilter(b, a, new_values[stable:], zi=self._zi)
+        return times[first:], np.concatenate((filtered_stable, filtered_rest)), stable
+
+class RmsWindowNode(CalculatedStream):
+    """RMS over a trailing time window (in seconds) ending at each sample."""
+
+    def __init__(self, node, window_s, capacity, value_dtype=np.float64):
+        super().__init__([node], capacity, value_dtype)
+        self.window_ns = int(float(window_s) * 1e9)
+
+    def _compute(self, sources, first, stable_inputs):
+        ref, _ = sources[0]
+        times, values = ref.timestamps, ref.values
+        lo = int(np.searchsorted(times, times[first] - self.window_ns, side="right"))
+        lo = min(lo, first)
+        seg_times = times[lo:]
+        squares = np.concatenate(([0.0], np.cumsum(values[lo:].astype(np.float64) ** 2)))
+        ends = np.arange(first - lo, len(seg_times)) + 1
+        starts = np.searchsorted(seg_times, seg_times[first - lo:] - self.window_ns, side="right")
+        rms = np.sqrt((squares[ends] - squares[starts]) / (ends - starts))
+        return times[first:], rms, max(stable_inputs - first, 0)
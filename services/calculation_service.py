@@ -1,35 +1,35 @@
 # services/calculation_service.py
 import numpy as np
+from services.stream_buffer import StreamBuffer
+from services.stream_expression import StreamExpressionCompiler
 
 class CalculationService:
-    """Performs mathematical operations on data streams."""
+    """
+    Performs mathematical operations on data streams given as
+    {"timestamps": ..., "values": ...} dicts, using the same kernels as the live
+    calculated streams in DataService (see services/stream_expression.py).
+    """
+
+    def evaluate(self, expression, streams):
+        """Evaluates `expression` once over `streams` (a dict of key -> stream). Returns a stream dict or None."""
+        buffers = {}
+        for key, stream in streams.items():
+            if not stream: return None
+            timestamps = np.asarray(stream["timestamps"], dtype=np.int64)
+            buffer = StreamBuffer(max(len(timestamps), 1))
+            buffer.append_many(timestamps, stream["values"])
+            buffers[key] = buffer
+        capacity = max((len(buffer) for buffer in buffers.values()), default=1)
+        compiler = StreamExpressionCompiler(lambda key: (buffers[key], 0), max(capacity, 1))
+        result, _ = compiler.compile(expression).update()
+        if len(result) == 0:
+            return None
+        return {"timestamps": result.timestamps.copy(), "values": result.values.copy()}
 
     def compute_subtraction(self, stream1, stream2):
         """Computes the element-wise subtraction of two data streams."""
-        if not stream1 or not stream2:
-            return None
-
-        timestamps1 = np.array(stream1["timestamps"])
-        values1 = np.array(stream1["values"])
-        timestamps2 = np.array(stream2["timestamps"])
-        values2 = np.array(stream2["values"])
-
-        if len(timestamps1) < 2 or len(timestamps2) < 2:
-            return None
-
-        interpolated_values2 = np.interp(timestamps1, timestamps2, values2)
-        result = values1 - interpolated_values2
-        
-        return {"timestamps": timestamps1, "values": result}
+        return self.evaluate("a - b", {"a": stream1, "b": stream2})
 
     def compute_derivative(self, stream):
         """Computes the numerical derivative of a stream with respect to time."""
-        if not stream or len(stream["timestamps"]) < 2:
-            return None
-
-        timestamps = np.array(stream["timestamps"])
-        values = np.array(stream["values"])
-        
-        derivative = np.gradient(values, timestamps)
-
-        return {"timestamps": timestamps, "values": derivative}
\ No newline at end of file
+        return self.evaluate("diff(a)", {"a": stream})
@@ -0,0 +1,272 @@
+# services/can_replay.py
+import os
+import threading
+import time
+import can
+import numpy as np
+from config import CAN_RX_BUFFER_SIZE, CAN_RAW_BATCH_SIZE
+from models.can_message import FrameBatch
+from services.recorder import Recorder, Recording, CAN_TABLE
+from services.ring_buffer import RingBuffer, DROP_NEWEST
+from utils import now_ns
+
+class CanCapture:
+    """
+    A captured CAN frame stream held as parallel arrays sorted by timestamp (int64 ns):
+    `timestamps`, `arbitration_ids`, `bus`, `dlcs` and `data` (n x 8 bytes).
+    `channels` names the bus indices where the source recorded them.
+    """
+
+    def __init__(self, timestamps, arbitration_ids, bus, dlcs, data, channels=None):
+        order = np.argsort(timestamps, kind="stable")
+        self.timestamps = np.asarray(timestamps, dtype=np.int64)[order]
+        self.arbitration_ids = np.asarray(arbitration_ids, dtype=np.uint32)[order]
+        self.bus = np.asarray(bus, dtype=np.uint8)[order]
+        self.dlcs = np.asarray(dlcs, dtype=np.uint8)[order]
+        self.data = np.asarray(data, dtype=np.uint8).reshape(-1, 8)[order]
+        self.channels = list(channels) if channels else [str(b) for b in range(int(self.bus.max(initial=0)) + 1)]
+        self._id_index = {}  # arbitration ID -> frame indices, built on first use
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @property
+    def start_ns(self):
+        return int(self.timestamps[0]) if len(self) else 0
+
+    @property
+    def duration_s(self):
+        return (int(self.timestamps[-1]) - self.start_ns) * 1e-9 if len(self) else 0.0
+
+    @classmethod
+    def load(cls, path):
+        """Loads a recording directory (see services/recorder.py) or any log python-can reads (.asc, candump .log, .blf, ...)."""
+        if os.path.isdir(path):
+            return cls.from_recording(path)
+        return cls.from_log(path)
+
+    @classmethod
+    def from_recording(cls, directory):
+        recording = Recording(directory)
+        if CAN_TABLE not in recording.tables():
+            raise ValueError(f"'{directory}' contains no raw CAN frames.")
+        frames = recording.read_can_frames()
+        return cls(frames["timestamps"], frames["arbitration_ids"], frames["bus"], frames["dlcs"], frames["data"])
+
+    @classmethod
+    def from_log(cls, path):
+        """Imports a text or binary log with can.LogReader. Error frames are skipped."""
+        timestamps, ids, buses, dlcs, payloads = [], [], [], [], []
+        channels = {}  # channel as written in the log -> bus index, in order of appearance
+        for msg in can.LogReader(path):
+            if msg.is_error_frame: continue
+            timestamps.append(msg.timestamp)
+            ids.append(msg.arbitration_id)
+            buses.append(channels.setdefault(msg.channel, len(channels)))
+            dlcs.append(msg.dlc)
+            payloads.append(bytes(msg.data[:8]).ljust(8, b"\0"))
+        data = np.frombuffer(b"".join(payloads), dtype=np.uint8).reshape(-1, 8)
+        timestamps = np.rint(np.asarray(timestamps, dtype=np.float64) * 1e9).astype(np.int64)
+        return cls(timestamps, ids, buses, dlcs, data, [str(channel) for channel in channels])
+
+    def save(self, directory):
+        """Writes the frames as a recording directory, the binary format from_recording() reads back."""
+        recorder = Recorder(directory)
+        recorder.start()
+        recorder.record_frames(self.timestamps, self.arbitration_ids, self.bus, self.dlcs, self.data)
+        recorder.stop()
+
+    # --- Seek index ---
+    def index_at(self, timestamp_ns):
+        """Index of the first frame at or after `timestamp_ns`."""
+        return int(np.searchsorted(self.timestamps, timestamp_ns, side="left"))
+
+    def frames_with_id(self, arbitration_id):
+        """Indices of every frame with `arbitration_id`, in time order."""
+        indices = self._id_index.get(arbitration_id)
+        if indices is None:
+            indices = self._id_index[arbitration_id] = np.flatnonzero(self.arbitration_ids == arbitration_id)
+        return indices
+
+    def find(self, arbitration_id, timestamp_ns=None):
+        """Index of the first frame with `arbitration_id` at or after `timestamp_ns`, or None if there is none."""
+        indices = self.frames_with_id(arbitration_id)
+        start = 0 if timestamp_ns is None else self.index_at(timestamp_ns)
+        k = int(np.searchsorted(indices, start))
+        return int(indices[k]) if k < len(indices) else None
+
+class CanReplayService:
+    """
+    Plays a CanCapture back with the interface of CanService, so MotorService, DataService
+    and the UI process it exactly like live traffic from the raw backend.
+
+    `speed` is the playback rate: 1.0 is real time, N plays N times faster, and 0 plays
+    as fast as the GUI loop drains the frames. Frames are restamped onto the stream time
+    base while keeping their recorded spacing, so derived streams see the original sample
+    intervals at any speed. Transmitted frames are counted and discarded.
+    """
+
+    def __init__(self, capture, speed=1.0):
+        self.capture = capture
+        self.channels = capture.channels
+        self.speed = float(speed)
+        self.is_finished = False
+        self._rx_batches = RingBuffer(max(1, CAN_RX_BUFFER_SIZE // CAN_RAW_BATCH_SIZE), DROP_NEWEST)
+        self._lock = threading.Lock()
+        self._position = 0
+        self._is_running = False
+        self._thread = None
+        self._pace_origin = None   # (monotonic ns, capture ns) that playback pacing is measured from
+        self._stamp_offset = 0     # Added to capture timestamps to put them on the stream time base
+        self._last_stamp = None
+        self._rx_listeners = ()
+        self.sent_frames = 0
+
+    @property
+    def bus_count(self):
+        return len(self.channels)
+
+    @property
+    def position_s(self):
+        """Playback position in seconds from the start of the capture."""
+        if not len(self.capture): return 0.0
+        index = min(self._position, len(self.capture) - 1)
+        return (int(self.capture.timestamps[index]) - self.capture.start_ns) * 1e-9
+
+    def connect(self):
+        if self._is_running: return True
+        if not len(self.capture):
+            print("Error starting replay: the capture contains no frames.")
+            return False
+        self._rx_batches.clear()
+        self.is_finished = False
+        with self._lock:
+            self._rebase(self._position)
+        self._is_running = True
+        self._thread = threading.Thread(target=self._play, daemon=True)
+        self._thread.start()
+        return True
+
+    def disconnect(self):
+        if self._is_running:
+            self._is_running = False
+            self._thread.join(timeout=1)
+
+    def seek(self, seconds):
+        """Continues playback from `seconds` after the start of the capture."""
+        self.seek_index(self.capture.index_at(self.capture.start_ns + int(seconds * 1e9)))
+
+    def seek_to_id(self, arbitration_id, seconds=0.0):
+        """Continues playback at the first frame with `arbitration_id` at or after `seconds`. Returns False if there is none."""
+        index = self.capture.find(arbitration_id, self.capture.start_ns + int(seconds * 1e9))
+        if index is None: return False
+        self.seek_index(index)
+        return True
+
+    def seek_index(self, index):
+        with self._lock:
+            self._position = min(max(int(index), 0), len(self.capture))
+            self.is_finished = False
+            self._rebase(self._position)
+            self._rx_batches.clear()
+
+    def set_speed(self, speed):
+        with self._lock:
+            self.speed = float(speed)
+            self._rebase(self._position, restamp=False)
+
+    def _rebase(self, index, restamp=True):
+        # Called with self._lock held. Restarts pacing at frame `index`. With `restamp`, the
+        # restamped times continue right after the last frame handed out, so they keep
+        # increasing across seeks.
+        if index >= len(self.capture): return
+        capture_ns = int(self.capture.timestamps[index])
+        self._pace_origin = (time.monotonic_ns(), capture_ns)
+        if not restamp: return
+        stamp = now_ns() if self._last_stamp is None else self._last_stamp + 1_000_000
+        self._stamp_offset = stamp - capture_ns
+
+    def _play(self):
+        capture = self.capture
+        while self._is_running:
+            with self._lock:
+                start = self._position
+                if start >= len(capture):
+                    self.is_finished = True
+                    end = start
+                elif self.speed <= 0:
+                    # As fast as possible, but never faster than the consumer drains.
+                    end = start if len(self._rx_batches) >= self._rx_batches.capacity // 2 else min(start + CAN_RAW_BATCH_SIZE, len(capture))
+                else:
+                    mono_origin, capture_origin = self._pace_origin
+                    due = capture_origin + int((time.monotonic_ns() - mono_origin) * self.speed)
+                    end = min(int(np.searchsorted(capture.timestamps, due, side="right")), start + CAN_RAW_BATCH_SIZE)
+                if end > start:
+                    self._emit(start, end)
+                    self._position = end
+            if end == start:
+                time.sleep(0.001)
+
+    def _emit(self, start, end):
+        capture = self.capture
+        timestamps = capture.timestamps[start:end] + self._stamp_offset
+        self._last_stamp = int(timestamps[-1])
+        buses = capture.bus[start:end]
+        for bus in np.unique(buses).tolist():
+            mask = buses == bus
+            batch = FrameBatch(capture.arbitration_ids[start:end][mask], capture.dlcs[start:end][mask],
+                               capture.data[start:end][mask], timestamps[mask], bus=bus)
+            self._rx_batches.put(batch)
+            for callback in self._rx_listeners:
+                try:
+                    callback(batch)
+                except Exception as e:
+                    print(f"Error in replay RX listener {callback!r}: {e}")
+
+    def add_rx_listener(self, callback):
+        """Calls `callback(batch)` on the playback thread with each FrameBatch as it is queued, like CanService.add_rx_listener()."""
+        self._rx_listeners += (callback,)
+
+    def remove_rx_listener(self, callback):
+        self._rx_listeners = tuple(c for c in self._rx_listeners if c != callback)
+
+    def wait_for_rx(self, timeout, min_items=1, linger=0.0):
+        return self._rx_batches.wait(timeout, min_items, linger)
+
+    def drain_messages(self, max_count=None):
+        return []
+
+    def drain_frame_batches(self, max_count=None):
+        return self._rx_batches.drain(max_count)
+
+    def get_rx_stats(self):
+        return self._rx_batches.get_stats()
+
+    def get_tx_stats(self):
+        return {"priority_depth": 0, "slot_depth": 0, "depth": 0, "max_priority_depth": 0, "max_slot_depth": 0,
+                "sent_priority": self.sent_frames, "sent_latest": 0, "coalesced": 0, "superseded": 0, "send_errors": 0}
+
+    def send_message(self, message, node=None):
+        self.sent_frames += 1
+
+    def send_latest(self, key, message):
+        self.sent_frames += 1
+
+    @property
+    def periodic_enabled(self):
+        return False
+
+    def start_periodic(self, key, message, period):
+        return False
+
+    def update_periodic(self, key, message):
+        return False
+
+    def stop_periodic(self, key):
+        pass
+
+    def stop_all_periodic(self):
+        pass
+
+    def is_periodic_active(self, key):
+        return False
@@ -1,15 +1,58 @@
 # services/can_service.py
 import can
-import queue
 import threading
-from config import CAN_INTERFACE, CAN_CHANNEL, CAN_BITRATE, CAN_ID_TELEMETRY_BASE, CAN_ID_RESPONSE_BASE, CAN_ID_STATUS_FEEDBACK_BASE
+from config import CAN_INTERFACE, CAN_CHANNELS, CAN_BITRATE, CAN_ID_TELEMETRY_BASE, CAN_ID_RESPONSE_BASE, CAN_ID_STATUS_FEEDBACK_BASE
+from config import CAN_RX_BUFFER_SIZE, CAN_RX_OVERFLOW_POLICY, CAN_USE_BCM, CAN_RX_BACKEND, CAN_RAW_BATCH_SIZE
+from services.raw_can_reader import RawCanReader
+from services.ring_buffer import RingBuffer
+from services.tx_scheduler import TxScheduler
+from utils import sync_receive_clock
+
+# With the raw backend the python-can bus only transmits; this filter matches no traffic we use.
+_TX_ONLY_FILTERS = [{"can_id": 0x7FF, "can_mask": 0x7FF, "extended": True}]
 
 class CanService:
-    def __init__(self):
-        self._bus = None
+    """
+    Owns one python-can bus per entry of CAN_CHANNELS, each with its own reader thread.
+    Received frames from every bus share the RX ring; each reader sets `msg.channel`
+    (or FrameBatch.bus) to its bus index. Outgoing frames are routed the same way: a
+    message whose `channel` is a bus index goes to that bus, and `channel=None`
+    (scan, SYNC) is sent on every bus.
+    """
+
+    def __init__(self, channels=None):
+        self.channels = list(channels if channels is not None else CAN_CHANNELS)
+        self._buses = []
         self._is_running = False
-        self._read_thread = None
-        self._message_queue = queue.Queue()
+        self._read_threads = []
+        self._raw_readers = []
+        self._rx_buffer = RingBuffer(CAN_RX_BUFFER_SIZE, CAN_RX_OVERFLOW_POLICY)
+        self._rx_batches = RingBuffer(max(1, CAN_RX_BUFFER_SIZE // CAN_RAW_BATCH_SIZE), CAN_RX_OVERFLOW_POLICY)
+        self._tx_scheduler = TxScheduler(self._send_now)
+        self._periodic_tasks = {}
+        self._rx_listeners = ()
+
+    def add_rx_listener(self, callback):
+        """
+        Calls `callback(frames)` on the reader threads with each received can.Message
+        (python-can backend) or FrameBatch (raw backend) as soon as it is queued.
+        Callbacks must return quickly; they delay the next read on that bus.
+        """
+        self._rx_listeners += (callback,)
+
+    def remove_rx_listener(self, callback):
+        self._rx_listeners = tuple(c for c in self._rx_listeners if c != callback)
+
+    def _notify_rx(self, frames):
+        for callback in self._rx_listeners:
+            try:
+                callback(frames)
+            except Exception as e:
+                print(f"Error in CAN RX listener {callback!r}: {e}")
+
+    @property
+    def bus_count(self):
+        return len(self._buses)
 
     def connect(self):
         try:
@@ -18,34 +61,172 @@ class CanService:
                 {"can_id": CAN_ID_RESPONSE_BASE, "can_mask": 0x700},
                 {"can_id": CAN_ID_STATUS_FEEDBACK_BASE, "can_mask": 0x700}
             ]
-            self._bus = can.interface.Bus(interface=CAN_INTERFACE, channel=CAN_CHANNEL, bitrate=CAN_BITRATE, can_filters=can_filters)
+            use_raw = CAN_RX_BACKEND == 'raw'
+            for channel in self.channels:
+                self._buses.append(can.interface.Bus(interface=CAN_INTERFACE, channel=channel, bitrate=CAN_BITRATE,
+                                                     can_filters=_TX_ONLY_FILTERS if use_raw else can_filters))
+                if use_raw:
+                    reader = RawCanReader(channel, can_filters, CAN_RAW_BATCH_SIZE)
+                    reader.open()
+                    self._raw_readers.append(reader)
+            self._rx_buffer.clear()
+            self._rx_batches.clear()
+            sync_receive_clock()
             self._is_running = True
-            self._read_thread = threading.Thread(target=self._read_messages, daemon=True)
-            self._read_thread.start()
+            for bus_index in range(len(self._buses)):
+                thread = threading.Thread(target=self._read_raw_frames if use_raw else self._read_messages, args=(bus_index,), daemon=True)
+                thread.start()
+                self._read_threads.append(thread)
+            self._tx_scheduler.start()
             return True
         except Exception as e:
             print(f"Error connecting to CAN bus: {e}")
+            self._is_running = False
+            self._close_buses()
             return False
 
     def disconnect(self):
         if self._is_running:
+            self.stop_all_periodic()
+            self._tx_scheduler.stop()
             self._is_running = False
-            if self._read_thread: self._read_thread.join(timeout=1)
-            if self._bus: self._bus.shutdown()
+            for thread in self._read_threads: thread.join(timeout=1)
+            self._close_buses()
 
-    def _read_messages(self):
+    def _close_buses(self):
+        for reader in self._raw_readers: reader.close()
+        for bus in self._buses: bus.shutdown()
+        self._read_threads, self._raw_readers, self._buses = [], [], []
+
+    def _read_messages(self, bus_index):
+        bus = self._buses[bus_index]
+        rx_buffer = self._rx_buffer
+        while self._is_running:
+            try:
+                msg = bus.recv(timeout=0.1)
+                if msg:
+                    msg.channel = bus_index
+                    rx_buffer.put(msg)
+                    if self._rx_listeners: self._notify_rx(msg)
+            except Exception as e:
+                print(f"Error in CAN read thread ({self.channels[bus_index]}): {e}")
+                break
+
+    def _read_raw_frames(self, bus_index):
+        reader = self._raw_readers[bus_index]
+        rx_batches = self._rx_batches
         while self._is_running:
             try:
-                msg = self._bus.recv(timeout=0.1)
-                if msg: self._message_queue.put(msg)
+                batch = reader.read_batch(timeout=0.1)
+                if batch is not None:
+                    batch.bus = bus_index
+                    rx_batches.put(batch)
+                    if self._rx_listeners: self._notify_rx(batch)
             except Exception as e:
-                print(f"Error in CAN read thread: {e}")
+                print(f"Error in raw CAN read thread ({self.channels[bus_index]}): {e}")
                 break
 
-    def get_message_queue(self):
-        return self._message_queue
+    def wait_for_rx(self, timeout, min_items=1, linger=0.0):
+        """
+        Blocks until received frames are pending or `timeout` seconds pass. Returns True if
+        frames are pending. `min_items` and `linger` coalesce wakeups (see RingBuffer.wait);
+        items are frames, or frame batches with the raw backend.
+        """
+        buffer = self._rx_batches if self._raw_readers else self._rx_buffer
+        return buffer.wait(timeout, min_items, linger)
+
+    def drain_messages(self, max_count=None):
+        """Returns every received frame pending since the last call (up to `max_count`), oldest first."""
+        return self._rx_buffer.drain(max_count)
+
+    def drain_frame_batches(self, max_count=None):
+        """Returns the FrameBatch objects read by the raw backend since the last call, oldest first."""
+        return self._rx_batches.drain(max_count)
+
+    def get_rx_stats(self):
+        """Returns the RX buffer counters, including dropped totals (counted in batches with the raw backend)."""
+        if self._raw_readers:
+            return self._rx_batches.get_stats()
+        return self._rx_buffer.get_stats()
+
+    def get_tx_stats(self):
+        """Returns the TX queue depth and coalescing counters."""
+        return self._tx_scheduler.get_stats()
+
+    def send_message(self, message, node=None):
+        """
+        Queues a frame on the TX priority lane (enable/disable, configuration, one-shot
+        commands). A command for motor `node` drops that motor's setpoints still waiting.
+        """
+        if self._buses and self._is_running:
+            self._tx_scheduler.submit(message, node)
+
+    def send_latest(self, key, message):
+        """Queues a setpoint frame in its latest-value slot; a newer frame with the same key replaces it."""
+        if self._buses and self._is_running:
+            self._tx_scheduler.submit_latest(key, message)
+
+    # --- Periodic Transmission (SocketCAN Broadcast Manager) ---
+    @property
+    def periodic_enabled(self):
+        """True when fixed-rate frames should be handed to the kernel instead of a Python loop."""
+        return CAN_USE_BCM and bool(self._buses) and self._is_running
+
+    def start_periodic(self, key, message, period):
+        """
+        Starts sending `message` every `period` seconds from the kernel, on one bus or on
+        all of them as routed by `message.channel`. A task already running under `key` is
+        replaced. Returns False if periodic sending is unavailable.
+        """
+        if not self.periodic_enabled: return False
+        self.stop_periodic(key)
+        buses = self._route(message)
+        if not buses: return False
+        tasks = []
+        try:
+            for bus in buses:
+                tasks.append(bus.send_periodic(message, period, store_task=False))
+        except (can.CanError, NotImplementedError) as e:
+            print(f"Error starting periodic task '{key}': {e}")
+            for task in tasks: task.stop()
+            return False
+        self._periodic_tasks[key] = tasks
+        return True
+
+    def update_periodic(self, key, message):
+        """Replaces the data of a running periodic task in place, keeping its cadence. Returns False if no task is running."""
+        tasks = self._periodic_tasks.get(key)
+        if tasks is None: return False
+        try:
+            for task in tasks: task.modify_data(message)
+            return True
+        except (can.CanError, ValueError) as e:
+            print(f"Error updating periodic task '{key}': {e}")
+            return False
+
+    def stop_periodic(self, key):
+        for task in self._periodic_tasks.pop(key, ()):
+            try: task.stop()
+            except can.CanError as e: print(f"Error stopping periodic task '{key}': {e}")
+
+    def stop_all_periodic(self):
+        for key in list(self._periodic_tasks.keys()):
+            self.stop_periodic(key)
+
+    def is_periodic_active(self, key):
+        return key in self._periodic_tasks
+
+    def _route(self, message):
+        """Returns the buses `message` should go out on, based on its `channel` (bus index or None for all)."""
+        bus_index = message.channel
+        if bus_index is None:
+            return self._buses
+        if isinstance(bus_index, int) and 0 <= bus_index < len(self._buses):
+            return self._buses[bus_index:bus_index + 1]
+        print(f"Error sending message: no CAN bus with index {bus_index!r}")
+        return []
 
-    def send_message(self, message):
-        if self._bus and self._is_running:
-            try: self._bus.send(message)
-            except can.CanError as e: print(f"Error sending message: {e}")
\ No newline at end of file
+    def _send_now(self, message):
+        for bus in self._route(message):
+            try: bus.send(message)
+            except can.CanError as e: print(f"Error sending message: {e}")
@@ -1,5 +1,4 @@
 # services/characterization_service.py
-import time
 import threading
 from config import REG_CUSTOM_CHARACTERIZE_MOTOR # <-- ADDED THIS IMPORT
 
@@ -28,16 +27,11 @@ class CharacterizationService:
             vm.characterization_status = "1/2: Running test..."
             
             # This custom command will trigger the firmware's characterization function
+            seen = vm.telemetry.sequence('char_response', motor_id)
             vm._motor_service.send_command(motor_id, REG_CUSTOM_CHARACTERIZE_MOTOR, float(voltage), 'f')
             
-            # Wait for the results to come back via CAN
-            timeout = time.time() + 15  # 15-second timeout
-            while time.time() < timeout:
-                if vm.characterization_results:
-                    break
-                time.sleep(0.1)
-            
-            if vm.characterization_results:
+            # Wait for the results to come back via CAN (15-second timeout)
+            if vm.telemetry.wait_for_event('char_response', motor_id, timeout=15, after=seen) is not None:
                 vm.characterization_status = "Done! Results received."
             else:
                 raise TimeoutError("Did not receive characterization results from motor.")
@@ -1,113 +1,434 @@
 # services/data_service.py
-import collections
+import fnmatch
+import math
+import threading
 import numpy as np
+from config import DATA_VALUE_DTYPE, PLOT_DECIMATION, STATS_ALL_STREAMS, DATA_MEMORY_BUDGET_MB, DATA_MIN_RETENTION
+from config import INGEST_DECIMATION
+from models.stream_retention import RetentionPolicy
+from services.decimation import MinMaxPyramid, lttb
+from services.stream_expression import StreamExpressionCompiler, parse_expression, expression_sources
+from services.stream_buffer import StreamBuffer
+from services.stream_decimator import StreamDecimator
+from services.stream_stats import StreamStats
+
+def configured_decimation(key):
+    """The (method, factor) of the INGEST_DECIMATION entry matching `key`, or None."""
+    for pattern, (method, factor) in INGEST_DECIMATION.items():
+        if fnmatch.fnmatchcase(key, pattern):
+            return method, factor
+    return None
 
 class DataService:
-    """Manages all real-time data streams for plotting and analysis."""
+    """
+    Manages all real-time data streams for plotting and analysis.
+    Each stream is a StreamBuffer of preallocated NumPy arrays.
+    Timestamps are int nanoseconds on the monotonic clock (see utils.now_ns).
+    """
 
-    def __init__(self):
+    def __init__(self, value_dtype=DATA_VALUE_DTYPE):
         """Initializes the DataService."""
         self._data_streams = {}
         self.history_length = 500  # Default history length
-        self._calculated_streams = {}
+        self.value_dtype = np.dtype(value_dtype)
+        self._calculated_streams = {}  # name -> root node of its expression graph
+        self._expressions = StreamExpressionCompiler(self._source_state, self.history_length, self.value_dtype)
+        self._pyramids = {}  # key -> MinMaxPyramid, created when a stream is first plotted
+        self.recorder = None  # Recorder that also receives every added sample, if set
+        self._stats = {}  # key -> StreamStats fed with every sample added while enabled
+        self._stats_positions = {}  # calculated stream key -> write_count its stats have consumed
+        self._retention = {}  # key -> RetentionPolicy; streams without one use history_length
+        self._decimators = {}  # key -> StreamDecimator applied to samples before they are stored
+        self.memory_budget_bytes = int(DATA_MEMORY_BUDGET_MB * 1024 * 1024)
+        self._lock = threading.RLock()
         print("DataService Initialized.")
 
     def register_stream(self, key):
         """
-        Registers a new data stream with a fixed-length deque based on the CURRENT history_length.
+        Registers a new data stream with a StreamBuffer sized to the CURRENT history_length
+        (or to the stream's retention policy, if one was set before it was registered).
         """
         if key not in self._data_streams:
-            print(f"Registering stream '{key}' with history length: {self.history_length}")
-            self._data_streams[key] = {
-                "timestamps": collections.deque(maxlen=self.history_length),
-                "values": collections.deque(maxlen=self.history_length)
-            }
+            policy = self._retention.get(key)
+            length = policy.samples if policy and policy.samples else self.history_length
+            print(f"Registering stream '{key}' with history length: {length}")
+            self._data_streams[key] = StreamBuffer(length, self.value_dtype)
+            self._init_ingest(key)
+
+    def _init_ingest(self, key):
+        # Default decimation and stats of a newly registered stream.
+        if key not in self._decimators:
+            self.restore_decimation(key)
+        if STATS_ALL_STREAMS:
+            self.enable_stats(key)
 
     def add_data_point(self, key, timestamp, value):
         """Adds a single data point to a stream."""
         if key not in self._data_streams:
             self.register_stream(key)
-        
-        self._data_streams[key]["timestamps"].append(timestamp)
-        self._data_streams[key]["values"].append(value)
+        if key in self._decimators:
+            self.add_data_points(key, [timestamp], [value])
+            return
+        with self._lock:
+            self._data_streams[key].append(timestamp, value)
+            stats = self._stats.get(key)
+            if stats:
+                stats.update(value)
+        if self.recorder:
+            self.recorder.record_samples(key, timestamp, value)
+
+    def add_data_points(self, key, timestamps, values):
+        """Adds a batch of data points to a stream. Accepts lists or NumPy arrays."""
+        if key not in self._data_streams:
+            self.register_stream(key)
+        with self._lock:
+            decimator = self._decimators.get(key)
+            if decimator:
+                timestamps, values = decimator.process(timestamps, values)
+                if len(timestamps) == 0: return
+            self._data_streams[key].append_many(timestamps, values)
+            stats = self._stats.get(key)
+            if stats:
+                stats.update(values)
+        if self.recorder:
+            self.recorder.record_samples(key, timestamps, values)
+
+    def clear_stream(self, key):
+        """Discards every sample of a stream, registering it if needed."""
+        if key not in self._data_streams:
+            self.register_stream(key)
+        with self._lock:
+            self._data_streams[key].clear()
+            if key in self._stats:
+                self._stats[key].reset()
+            if key in self._decimators:
+                self._decimators[key].reset()
 
     def change_history_length(self, length):
         """
-        Updates the history length for ALL existing and future streams.
-        This is the critical function that fixes the bug.
+        Updates the history length for all existing and future streams without their own
+        retention policy, keeping the most recent samples of each stream.
         """
         new_length = max(10, int(length))
         
         if self.history_length == new_length:
             return
 
-        print(f"Changing history length from {self.history_length} to {new_length} for ALL streams.")
+        print(f"Changing history length from {self.history_length} to {new_length} for all streams without a retention policy.")
         self.history_length = new_length
-        
-        # --- THIS IS THE CRITICAL FIX ---
-        # This loop iterates through every existing stream (including gui_target)
-        # and replaces its old data buffer with a new one that has the correct,
-        # updated maxlen, while preserving the recent data.
-        for key, stream in self._data_streams.items():
-            current_timestamps = list(stream["timestamps"])
-            current_values = list(stream["values"])
-            
-            stream["timestamps"] = collections.deque(current_timestamps, maxlen=self.history_length)
-            stream["values"] = collections.deque(current_values, maxlen=self.history_length)
-        # --- END OF FIX ---
-
-    def get_stream_data(self, key):
-        """Gets the data for a specific stream."""
-        if key in self._calculated_streams:
-            return self._compute_calculated_stream(key)
+        with self._lock:
+            self._expressions.reset(new_length)
+            self._pyramids.clear()
+            self.apply_retention()
 
-        if key not in self._data_streams:
-            self.register_stream(key)
-        
-        return self._data_streams.get(key)
+    # --- Ingest Decimation ---
+    def set_decimation(self, key, method=None, factor=1):
+        """
+        Stores only every `factor`-th output of `method` ('nth', 'average', 'cic' or 'fir',
+        see services/stream_decimator.py) for samples added to `key` from now on.
+        method=None or factor 1 stores every sample.
+        """
+        with self._lock:
+            if method is None or int(factor) <= 1:
+                self._decimators.pop(key, None)
+            else:
+                self._decimators[key] = StreamDecimator(method, factor)
+
+    def restore_decimation(self, key):
+        """Applies the INGEST_DECIMATION entry matching `key`, if any, or stores every sample."""
+        self.set_decimation(key, *(configured_decimation(key) or (None,)))
+
+    def get_decimation(self, key):
+        """Returns (method, factor) for `key`, or None if every sample is stored."""
+        decimator = self._decimators.get(key)
+        return (decimator.method, decimator.factor) if decimator else None
+
+    # --- Retention ---
+    def set_retention(self, key, samples=None, seconds=None, priority=1):
+        """
+        Gives `key` its own history: `samples`, or `seconds` at its measured sample rate
+        (re-evaluated by apply_retention()). With neither, the stream goes back to the
+        global history length. Streams without a policy have priority 0.
+        """
+        with self._lock:
+            if samples is None and seconds is None:
+                self._retention.pop(key, None)
+            else:
+                self._retention[key] = RetentionPolicy(samples=samples, seconds=seconds, priority=priority)
+            self.apply_retention()
+
+    def get_retention(self, key):
+        return self._retention.get(key)
+
+    def _sample_rate(self, stream):
+        if len(stream) < 2: return None
+        span_ns = int(stream.timestamps[-1]) - int(stream.timestamps[0])
+        return (len(stream) - 1) * 1e9 / span_ns if span_ns > 0 else None
+
+    def _wanted_capacity(self, key, stream):
+        policy = self._retention.get(key)
+        if policy is None:
+            return self.history_length
+        if policy.samples:
+            return max(DATA_MIN_RETENTION, int(policy.samples))
+        rate = self._sample_rate(stream)
+        if rate is None:
+            return stream.capacity  # Keep the current size until the rate is known
+        return max(DATA_MIN_RETENTION, math.ceil(policy.seconds * rate * 1.1))  # 10% margin for rate jitter
+
+    def apply_retention(self):
+        """
+        Resizes every stream to its retention policy and fits the total into the memory
+        budget: priority levels are shrunk one at a time, lowest first, each stream in
+        proportion to its size above DATA_MIN_RETENTION, dropping its oldest samples.
+        A recorded stream is charged for the calculated-stream buffers that follow it and
+        for its plot pyramids too, and those are resized along with it.
+        Call periodically so seconds-based policies follow the measured sample rates.
+        """
+        with self._lock:
+            wanted = {key: self._wanted_capacity(key, stream) for key, stream in self._data_streams.items()}
+            cost = self._bytes_per_sample()
+            excess = sum(wanted[key] * cost[key] for key in wanted) - self.memory_budget_bytes
+            over_budget = excess > 0
+            if over_budget:
+                priority = lambda key: self._retention[key].priority if key in self._retention else 0
+                for level in sorted({priority(key) for key in wanted}):
+                    keys = [key for key in wanted if priority(key) == level]
+                    reducible = sum(max(wanted[key] - DATA_MIN_RETENTION, 0) * cost[key] for key in keys)
+                    if reducible <= 0: continue
+                    fraction = min(1.0, excess / reducible)
+                    for key in keys:
+                        wanted[key] -= int(math.ceil(max(wanted[key] - DATA_MIN_RETENTION, 0) * fraction))
+                    excess -= reducible * fraction
+                    if excess <= 0: break
+
+            for key, capacity in wanted.items():
+                stream = self._data_streams[key]
+                # Seconds-based sizes follow the rate with 25% hysteresis so jitter doesn't reallocate every call.
+                policy = self._retention.get(key)
+                if (not over_budget and policy and policy.seconds and not policy.samples
+                        and capacity <= stream.capacity <= capacity * 1.25):
+                    continue
+                if capacity != stream.capacity:
+                    stream.resize(capacity)
+
+            # Calculated results have one sample per sample of the stream they follow.
+            for node in self._derived_nodes():
+                root = self._data_streams.get(self._root_key(node))
+                if root is not None and node.result.capacity != root.capacity:
+                    node.result.resize(root.capacity)
+            # Pyramids of resized streams are rebuilt at the new size when next plotted.
+            for key, pyramid in list(self._pyramids.items()):
+                if pyramid.capacity != self._stream_buffer(key).capacity:
+                    del self._pyramids[key]
+
+    def _derived_nodes(self):
+        return [node for node in self._expressions.nodes() if hasattr(node, "result")]
+
+    def _root_key(self, node):
+        """The recorded stream whose samples a calculated node (or stream key) follows one to one."""
+        while True:
+            if isinstance(node, str):
+                if node not in self._calculated_streams: return node
+                node = self._calculated_streams[node]
+            elif hasattr(node, "inputs"):
+                node = node.inputs[0]
+            else:
+                node = node.key
+
+    def _bytes_per_sample(self):
+        """Memory per retained sample of each recorded stream, counting the buffers derived from it."""
+        sample_bytes = 2 * (8 + self.value_dtype.itemsize)
+        cost = dict.fromkeys(self._data_streams, sample_bytes)
+        for node in self._derived_nodes():
+            root = self._root_key(node)
+            if root in cost:
+                cost[root] += node.result.bytes_for(1)
+        for key, pyramid in self._pyramids.items():
+            root = self._root_key(key)
+            if root in cost and pyramid.capacity:
+                cost[root] += pyramid.nbytes / pyramid.capacity
+        return cost
+
+    def memory_report(self):
+        """Returns one dict per stream (key, samples, capacity, bytes, rate_hz, policy) plus totals, largest first."""
+        with self._lock:
+            rows = []
+            for key, stream in self._data_streams.items():
+                rate = self._sample_rate(stream)
+                policy = self._retention.get(key)
+                if policy is None: policy_text = f"global ({self.history_length})"
+                elif policy.samples: policy_text = f"{policy.samples} samples, priority {policy.priority}"
+                else: policy_text = f"{policy.seconds:g} s, priority {policy.priority}"
+                decimation = self.get_decimation(key)
+                if decimation: policy_text += f", {decimation[0]} /{decimation[1]}"
+                rows.append({"key": key, "samples": len(stream), "capacity": stream.capacity, "bytes": stream.nbytes,
+                             "rate_hz": rate, "policy": policy_text})
+            calculated_bytes = sum(node.result.nbytes for node in self._derived_nodes())
+            pyramid_bytes = sum(pyramid.nbytes for pyramid in self._pyramids.values())
+            rows.sort(key=lambda row: row["bytes"], reverse=True)
+            total = sum(row["bytes"] for row in rows)
+            return {"streams": rows, "stream_bytes": total, "calculated_bytes": calculated_bytes,
+                    "pyramid_bytes": pyramid_bytes, "total_bytes": total + calculated_bytes + pyramid_bytes,
+                    "budget_bytes": self.memory_budget_bytes}
+
+    def get_stream_data(self, key, t_start=None, t_end=None):
+        """
+        Gets the data for a specific stream as {"timestamps": int64 array, "values": array},
+        optionally only the samples with t_start <= timestamp <= t_end (stream time base, ns).
+        Both arrays are zero-copy views of the stream's buffer: they are only guaranteed to
+        stay unchanged until the next append, so code running on another thread should use
+        snapshot_stream() instead.
+        """
+        with self._lock:
+            stream = self._stream_buffer(key)
+            i0, i1 = stream.index_range(t_start, t_end)
+            return {"timestamps": stream.timestamps[i0:i1], "values": stream.values[i0:i1]}
+
+    def get_window(self, key, last_seconds):
+        """Gets the samples of the last `last_seconds` before the stream's newest sample, as get_stream_data() views."""
+        with self._lock:
+            stream = self._stream_buffer(key)
+            if len(stream) == 0:
+                return {"timestamps": stream.timestamps, "values": stream.values}
+            t_end = int(stream.timestamps[-1])
+            return self.get_stream_data(key, t_end - int(last_seconds * 1e9), t_end)
+
+    def snapshot_stream(self, key, t_start=None, t_end=None):
+        """Same as get_stream_data(), but returns copies that are safe to keep and use from any thread."""
+        with self._lock:
+            data = self.get_stream_data(key, t_start, t_end)
+            return {"timestamps": data["timestamps"].copy(), "values": data["values"].copy()}
+
+    def read_since(self, key, cursor):
+        """
+        Returns (timestamps, values, new_cursor): copies of the samples of `key` appended
+        since the call that returned `cursor` (start with 0) that the stream still holds.
+        """
+        with self._lock:
+            stream = self._stream_buffer(key)
+            n = max(min(stream.write_count - cursor, len(stream)), 0)
+            return stream.timestamps[len(stream) - n:].copy(), stream.values[len(stream) - n:].copy(), stream.write_count
+
+    def get_stream_version(self, key):
+        """
+        Returns a value that changes whenever the stream's contents change (including a
+        calculated stream's provisional tail), for callers that cache anything derived from it.
+        """
+        with self._lock:
+            stream, provisional = self._source_state(key)
+            return stream.generation, stream.version, provisional
+
+    def get_plot_data(self, key, max_points, t_start=None, t_end=None, method=PLOT_DECIMATION):
+        """
+        Gets a stream reduced to at most about `max_points` points for plotting, optionally
+        limited to timestamps in [t_start, t_end]. "minmax" keeps every bucket's extremes
+        from a cached MinMaxPyramid; "lttb" further reduces that envelope with LTTB;
+        "none" returns the raw samples.
+        """
+        with self._lock:
+            stream, provisional = self._source_state(key)
+            timestamps = stream.timestamps
+            i0, i1 = stream.index_range(t_start, t_end)
+            if method == "none" or i1 - i0 <= max_points:
+                return {"timestamps": timestamps[i0:i1], "values": stream.values[i0:i1]}
+
+            pyramid = self._pyramids.get(key)
+            if pyramid is None or pyramid.capacity != stream.capacity:
+                pyramid = self._pyramids[key] = MinMaxPyramid(stream.capacity)
+            pyramid.update(stream, provisional)
+            if method == "lttb":
+                times, values = pyramid.decimate(stream, i0, i1, 4 * max_points)
+                times, values = lttb(times, values, max_points)
+            else:
+                times, values = pyramid.decimate(stream, i0, i1, max_points)
+            return {"timestamps": times, "values": values}
+
+    # --- Running Statistics ---
+    def enable_stats(self, key):
+        """Starts keeping running statistics for `key` from the next sample on."""
+        with self._lock:
+            if key in self._stats: return
+            self._stats[key] = StreamStats()
+            calculated = self._calculated_streams.get(key)
+            if calculated is not None:
+                result, provisional = calculated.update()
+                self._stats_positions[key] = result.write_count - provisional
+
+    def disable_stats(self, key):
+        with self._lock:
+            self._stats.pop(key, None)
+            self._stats_positions.pop(key, None)
+
+    def reset_stats(self, key):
+        with self._lock:
+            if key in self._stats:
+                self._stats[key].reset()
+
+    def get_stats(self, key):
+        """
+        Returns the running statistics of `key` as a dict (count, mean, std, min, max, rms,
+        peak, p50, p95, p99) covering every sample since they were enabled or reset, or
+        None if they aren't enabled.
+        """
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None: return None
+            if key in self._calculated_streams:
+                self._update_calculated_stats(key, stats)
+            return stats.as_dict()
+
+    def _update_calculated_stats(self, key, stats):
+        # Calculated streams have no add path: feed their final results since the last query.
+        # Samples that slid out of the window between two queries are not counted.
+        result, provisional = self._calculated_streams[key].update()
+        stable_end = result.write_count - provisional
+        window_start = result.write_count - len(result)
+        start = max(self._stats_positions.get(key, window_start), window_start)
+        if start < stable_end:
+            stats.update(result.values[start - window_start:stable_end - window_start])
+        self._stats_positions[key] = max(start, stable_end)
+
+    def get_all_stats(self):
+        """Returns {key: get_stats(key)} for every stream that keeps running statistics."""
+        with self._lock:
+            return {key: self.get_stats(key) for key in list(self._stats)}
 
     def get_all_stream_keys(self):
         """Returns a list of all available stream keys."""
         return sorted(list(self._data_streams.keys()) + list(self._calculated_streams.keys()))
 
     def register_calculated_stream(self, name, operation, source_keys):
-        """Registers a new stream that is calculated from source streams."""
+        """Registers a "subtract" (A - B) or "differentiate" (d/dt A) stream. See register_expression_stream()."""
+        keys = [repr(key) if not key.isidentifier() else key for key in source_keys]
+        if operation == "subtract":
+            self.register_expression_stream(name, f"{keys[0]} - {keys[1]}")
+        elif operation == "differentiate":
+            self.register_expression_stream(name, f"diff({keys[0]})")
+        else:
+            raise ValueError(f"Unknown calculated stream operation '{operation}'")
+
+    def register_expression_stream(self, name, expression):
+        """
+        Registers a stream computed from an expression over other streams (see
+        services/stream_expression.py). Raises ValueError if the expression is invalid.
+        """
         if name in self.get_all_stream_keys():
             return
-        self._calculated_streams[name] = {
-            "operation": operation,
-            "sources": source_keys
-        }
-
-    def _compute_calculated_stream(self, key):
-        """Performs the calculation for a derived stream."""
-        config = self._calculated_streams.get(key)
-        if not config: return None
-
-        source_data = [self.get_stream_data(s) for s in config["sources"]]
-        if not all(source_data) or not all(d["timestamps"] for d in source_data):
-            return {"timestamps": collections.deque(maxlen=self.history_length), "values": collections.deque(maxlen=self.history_length)}
-
-        ref_times = np.array(source_data[0]["timestamps"])
-        if len(ref_times) < 2:
-             return {"timestamps": collections.deque(maxlen=self.history_length), "values": collections.deque(maxlen=self.history_length)}
-             
-        interp_values = [np.array(source_data[0]["values"])]
-        for i in range(1, len(source_data)):
-            source_times = np.array(source_data[i]["timestamps"])
-            source_values = np.array(source_data[i]["values"])
-            if len(source_times) > 1:
-                interp_values.append(np.interp(ref_times, source_times, source_values))
-            else:
-                return {"timestamps": collections.deque(maxlen=self.history_length), "values": collections.deque(maxlen=self.history_length)}
-        
-        result_values = np.zeros_like(ref_times)
-        if config["operation"] == "subtract" and len(interp_values) == 2:
-            result_values = interp_values[0] - interp_values[1]
-        elif config["operation"] == "differentiate" and len(interp_values) == 1:
-            result_values = np.gradient(interp_values[0], ref_times, edge_order=2)
-
-        return {
-            "timestamps": collections.deque(ref_times, maxlen=self.history_length),
-            "values": collections.deque(result_values, maxlen=self.history_length)
-        }
\ No newline at end of file
+        if name in expression_sources(parse_expression(expression)):
+            raise ValueError(f"Stream '{name}' cannot refer to itself")
+        with self._lock:
+            self._calculated_streams[name] = self._expressions.compile(expression)
+
+    def _stream_buffer(self, key):
+        """Returns the StreamBuffer behind `key`, bringing a calculated stream up to date first."""
+        return self._source_state(key)[0]
+
+    def _source_state(self, key):
+        # (buffer, provisional count) for the expression nodes; recorded streams are never provisional.
+        calculated = self._calculated_streams.get(key)
+        if calculated is not None:
+            return calculated.update()
+        if key not in self._data_streams:
+            self.register_stream(key)
+        return self._data_streams[key], 0
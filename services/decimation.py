@@ -0,0 +1,191 @@
+# services/decimation.py
+import numpy as np
+from services.stream_buffer import StreamBuffer
+
+def _reduce_minmax(timestamps, values, bucket_size):
+    """
+    Splits the samples into consecutive buckets of `bucket_size` (the last one may be
+    shorter) and returns (min_times, min_values, max_times, max_values), one entry per bucket.
+    """
+    n = len(values)
+    full = n // bucket_size * bucket_size
+    parts = []
+    if full:
+        t = timestamps[:full].reshape(-1, bucket_size)
+        v = values[:full].reshape(-1, bucket_size)
+        rows = np.arange(len(v))
+        lo, hi = v.argmin(axis=1), v.argmax(axis=1)
+        parts.append((t[rows, lo], v[rows, lo], t[rows, hi], v[rows, hi]))
+    if full < n:
+        t, v = timestamps[full:], values[full:]
+        lo, hi = int(v.argmin()), int(v.argmax())
+        parts.append((t[lo:lo + 1], v[lo:lo + 1], t[hi:hi + 1], v[hi:hi + 1]))
+    if not parts:
+        empty_t, empty_v = np.empty(0, dtype=np.int64), np.empty(0, dtype=values.dtype)
+        return empty_t, empty_v, empty_t, empty_v
+    if len(parts) == 1:
+        return parts[0]
+    return tuple(np.concatenate(arrays) for arrays in zip(*parts))
+
+def _merge_minmax(min_times, min_values, max_times, max_values, factor):
+    """Combines every `factor` consecutive buckets into one (the last group may be shorter)."""
+    lows = _reduce_minmax(min_times, min_values, factor)
+    highs = _reduce_minmax(max_times, max_values, factor)
+    return lows[0], lows[1], highs[2], highs[3]
+
+def _interleave(min_times, min_values, max_times, max_values):
+    """Turns per-bucket (min, max) pairs into one time-ordered series of two points per bucket."""
+    min_first = min_times <= max_times
+    times = np.empty(2 * len(min_times), dtype=np.int64)
+    values = np.empty(2 * len(min_times), dtype=np.result_type(min_values, max_values))
+    times[0::2] = np.where(min_first, min_times, max_times)
+    times[1::2] = np.where(min_first, max_times, min_times)
+    values[0::2] = np.where(min_first, min_values, max_values)
+    values[1::2] = np.where(min_first, max_values, min_values)
+    return times, values
+
+class _Level:
+    """Min/max of every complete bucket of `bucket_size` samples, numbered by absolute sample position."""
+
+    def __init__(self, bucket_size, capacity):
+        self.bucket_size = bucket_size
+        self.mins = StreamBuffer(capacity)
+        self.maxs = StreamBuffer(capacity)
+        self._offset = 0  # Bucket number of mins.write_count == 0
+
+    @property
+    def next_bucket(self):
+        return self._offset + self.mins.write_count
+
+    @property
+    def first_bucket(self):
+        return self.next_bucket - len(self.mins)
+
+    def skip_to(self, bucket):
+        """Drops everything and continues at `bucket` (used when the source moved past a gap)."""
+        self.mins.clear()
+        self.maxs.clear()
+        self._offset = bucket - self.mins.write_count
+
+    def append(self, min_times, min_values, max_times, max_values):
+        self.mins.append_many(min_times, min_values)
+        self.maxs.append_many(max_times, max_values)
+
+class MinMaxPyramid:
+    """
+    Cached min/max envelopes of one stream at several resolutions, for plotting long
+    histories with a bounded number of points.
+
+    Level k holds the minimum and maximum (with their timestamps) of every complete
+    bucket of base * factor**k samples. Buckets are aligned to the stream's absolute
+    sample numbering, so update() only has to fold in the samples appended since the
+    last call: level 0 is reduced from the new raw samples, every further level from
+    the new buckets of the level below.
+    """
+
+    def __init__(self, capacity, base=8, factor=4):
+        self.capacity = capacity
+        self.factor = factor
+        self._levels = []
+        bucket_size = base
+        while bucket_size <= max(capacity // 2, base):
+            self._levels.append(_Level(bucket_size, capacity // bucket_size + 2))
+            bucket_size *= factor
+        self._generation = None
+
+    @property
+    def nbytes(self):
+        """Memory held by every level's buffers."""
+        return sum(level.mins.nbytes + level.maxs.nbytes for level in self._levels)
+
+    def update(self, source, provisional=0):
+        """Folds new samples of `source` (a StreamBuffer) into every level. The newest `provisional` samples are skipped."""
+        if source.generation != self._generation:
+            self._generation = source.generation
+            for level in self._levels:
+                level.skip_to(0)
+        stable_end = source.write_count - provisional
+        window_start = source.write_count - len(source)
+
+        lower = None
+        for level in self._levels:
+            if lower is None:
+                first, end = -(-window_start // level.bucket_size), stable_end // level.bucket_size
+            else:
+                first, end = -(-lower.first_bucket // self.factor), lower.next_bucket // self.factor
+            start = max(level.next_bucket, first)
+            if start < end:
+                if start > level.next_bucket:
+                    level.skip_to(start)
+                if lower is None:
+                    i0 = start * level.bucket_size - window_start
+                    i1 = end * level.bucket_size - window_start
+                    level.append(*_reduce_minmax(source.timestamps[i0:i1], source.values[i0:i1], level.bucket_size))
+                else:
+                    j0 = start * self.factor - lower.first_bucket
+                    j1 = end * self.factor - lower.first_bucket
+                    level.append(*_merge_minmax(lower.mins.timestamps[j0:j1], lower.mins.values[j0:j1],
+                                                lower.maxs.timestamps[j0:j1], lower.maxs.values[j0:j1], self.factor))
+            lower = level
+
+    def decimate(self, source, i0, i1, max_points):
+        """
+        Returns (timestamps, values) for the samples i0..i1-1 of the source window with at
+        most about `max_points` points, keeping every bucket's minimum and maximum.
+        Ranges that already fit are returned as zero-copy views.
+        """
+        timestamps, values = source.timestamps, source.values
+        n = i1 - i0
+        if n <= max_points or not self._levels:
+            return timestamps[i0:i1], values[i0:i1]
+
+        buckets_allowed = max(max_points // 2, 1)
+        level = next((lvl for lvl in self._levels if n / lvl.bucket_size <= buckets_allowed), self._levels[-1])
+        size = level.bucket_size
+        window_start = source.write_count - len(source)
+        a0, a1 = window_start + i0, window_start + i1
+
+        # Whole buckets come from the cache; the partial ones at either end are reduced from raw samples.
+        j0 = max(-(-a0 // size), level.first_bucket)
+        j1 = min(a1 // size, level.next_bucket)
+        if j0 >= j1:
+            pieces = [_reduce_minmax(timestamps[i0:i1], values[i0:i1], size)]
+        else:
+            b0, b1 = j0 - level.first_bucket, j1 - level.first_bucket
+            head_end, tail_start = j0 * size - window_start, j1 * size - window_start
+            pieces = [
+                _reduce_minmax(timestamps[i0:head_end], values[i0:head_end], size),
+                (level.mins.timestamps[b0:b1], level.mins.values[b0:b1], level.maxs.timestamps[b0:b1], level.maxs.values[b0:b1]),
+                _reduce_minmax(timestamps[tail_start:i1], values[tail_start:i1], size),
+            ]
+        return _interleave(*(np.concatenate(arrays) for arrays in zip(*pieces)))
+
+def lttb(timestamps, values, max_points):
+    """
+    Largest-Triangle-Three-Buckets downsampling: keeps the first and last samples and,
+    from each bucket in between, the sample forming the largest triangle with the
+    previously kept sample and the next bucket's average.
+    """
+    n = len(timestamps)
+    if n <= max_points or max_points < 3:
+        return timestamps, values
+    t = (timestamps - timestamps[0]).astype(np.float64)
+    v = values.astype(np.float64)
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    # Average of every bucket, used as the third triangle corner for the bucket before it.
+    counts = np.diff(edges)
+    avg_t = np.add.reduceat(t[:n - 1], edges[:-1]) / counts
+    avg_v = np.add.reduceat(v[:n - 1], edges[:-1]) / counts
+    avg_t, avg_v = np.append(avg_t[1:], t[-1]), np.append(avg_v[1:], v[-1])
+
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    prev_t, prev_v = t[0], v[0]
+    for b in range(max_points - 2):
+        lo, hi = edges[b], edges[b + 1]
+        bt, bv = t[lo:hi], v[lo:hi]
+        areas = np.abs((prev_t - avg_t[b]) * (bv - prev_v) - (prev_t - bt) * (avg_v[b] - prev_v))
+        pick = lo + int(areas.argmax())
+        selected[b + 1] = pick
+        prev_t, prev_v = t[pick], v[pick]
+    return timestamps[selected], values[selected]
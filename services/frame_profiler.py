@@ -0,0 +1,134 @@
+# services/frame_profiler.py
+import bisect
+import collections
+import time
+from config import PROFILER_HISTOGRAM_BINS, PROFILER_MIN_TIME, PROFILER_MAX_TIME, PROFILER_RECENT_FRAMES, PROFILER_REPORT_INTERVAL
+
+class FrameProfiler:
+    """
+    Times named stages of the GUI main loop into fixed-bucket histograms and keeps the
+    per-stage breakdown of recent frames so the slowest ones can be inspected.
+
+    Stages are registered with instrument(obj, name, stage), which, while the profiler is
+    enabled, replaces the attribute `name` of `obj` with a timing wrapper. disable()
+    puts the original attributes back, so a disabled profiler costs nothing: no wrapper,
+    flag check or clock read is left on any call path. The attribute registered with
+    frame=True delimits frames; it should be the call that runs one whole frame.
+
+    The histograms have `bins` logarithmically spaced buckets from `min_time` to
+    `max_time` seconds, so percentiles are accurate to one bucket's ratio
+    ((max_time / min_time) ** (1 / bins), about 20% with the defaults). Maxima are exact.
+    While enabled, `on_report(profiler)` is called after a frame at most every
+    `report_interval` seconds.
+    """
+
+    def __init__(self, on_report=None, bins=PROFILER_HISTOGRAM_BINS, min_time=PROFILER_MIN_TIME,
+                 max_time=PROFILER_MAX_TIME, recent_frames=PROFILER_RECENT_FRAMES, report_interval=PROFILER_REPORT_INTERVAL):
+        self.on_report = on_report
+        self.report_interval = report_interval
+        ratio = (max_time / min_time) ** (1.0 / bins)
+        # Bucket i holds [edges[i-1], edges[i]); the first and last buckets catch anything outside the range.
+        self._edges = [min_time * ratio ** i for i in range(bins + 1)]
+        self._targets = []  # (obj, name, stage, frame)
+        self._originals = []  # (obj, name, attribute from the instance __dict__ or None) while enabled
+        self._recent = collections.deque(maxlen=recent_frames)  # (frame seconds, {stage: seconds})
+        self._frame_stages = {}
+        self._last_report = 0.0
+        self.enabled = False
+        self.reset()
+
+    def reset(self):
+        self._counts = {}  # stage -> bucket counts
+        self._max = {}     # stage -> longest duration
+        self._recent.clear()
+
+    def instrument(self, obj, name, stage, frame=False):
+        """Registers `obj.name` (a callable attribute) to be timed as `stage` while the profiler is enabled."""
+        self._targets.append((obj, name, stage, frame))
+        if self.enabled:
+            self._patch(obj, name, stage, frame)
+
+    def enable(self):
+        if self.enabled: return
+        self.enabled = True
+        for target in self._targets:
+            self._patch(*target)
+
+    def disable(self):
+        if not self.enabled: return
+        self.enabled = False
+        for obj, name, original in reversed(self._originals):
+            if original is None:
+                delattr(obj, name)  # Uncovers the class attribute again
+            else:
+                setattr(obj, name, original)
+        self._originals.clear()
+
+    def _patch(self, obj, name, stage, frame):
+        func = getattr(obj, name)
+        self._originals.append((obj, name, vars(obj).get(name)))
+        perf_counter = time.perf_counter
+        if frame:
+            def timed(*args, **kwargs):
+                self._frame_stages = {}
+                start = perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self._end_frame(stage, perf_counter() - start)
+        else:
+            record = self.record
+            def timed(*args, **kwargs):
+                start = perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    record(stage, perf_counter() - start)
+        setattr(obj, name, timed)
+
+    def record(self, stage, seconds):
+        """Adds one duration of `stage`."""
+        counts = self._counts.get(stage)
+        if counts is None:
+            counts = self._counts[stage] = [0] * (len(self._edges) + 1)
+        counts[bisect.bisect_right(self._edges, seconds)] += 1
+        if seconds > self._max.get(stage, 0.0):
+            self._max[stage] = seconds
+        frame_stages = self._frame_stages
+        frame_stages[stage] = frame_stages.get(stage, 0.0) + seconds
+
+    def _end_frame(self, stage, seconds):
+        self.record(stage, seconds)
+        self._recent.append((seconds, self._frame_stages))
+        now = time.perf_counter()
+        if self.on_report and now - self._last_report >= self.report_interval:
+            self._last_report = now
+            try:
+                self.on_report(self)
+            except Exception as e:
+                print(f"Error in profiler report: {e}")
+
+    def percentile(self, stage, q):
+        """Approximate q-th percentile (0..100) of `stage` in seconds: the upper edge of the bucket holding it."""
+        counts = self._counts.get(stage)
+        if not counts: return 0.0
+        target = q / 100.0 * sum(counts)
+        cumulative = 0
+        for i, count in enumerate(counts):
+            cumulative += count
+            if cumulative >= target and count:
+                break
+        if i >= len(self._edges): return self._max[stage]
+        return min(self._edges[i], self._max[stage])
+
+    def summary(self):
+        """Returns {stage: {'count', 'p50', 'p99', 'max'}} with times in seconds, in order of registration."""
+        stages = [t[2] for t in self._targets if t[2] in self._counts]
+        stages += [s for s in self._counts if s not in stages]
+        return {stage: {"count": sum(self._counts[stage]), "p50": self.percentile(stage, 50),
+                        "p99": self.percentile(stage, 99), "max": self._max[stage]}
+                for stage in dict.fromkeys(stages)}
+
+    def worst_frames(self, count=5):
+        """The `count` slowest of the recent frames as (seconds, {stage: seconds}), slowest first."""
+        return sorted(self._recent, key=lambda frame: frame[0], reverse=True)[:count]
@@ -0,0 +1,88 @@
+# services/frame_scheduler.py
+import time
+from config import MAIN_LOOP_MAX_FPS, MAIN_LOOP_MIN_FPS, MAIN_LOOP_BUDGETS
+
+class FrameScheduler:
+    """
+    Cooperative scheduler for the GUI main loop. Each frame has three stages:
+
+      ingest(budget_s) -> bool  drains received traffic for at most `budget_s` seconds and
+                                returns True if a backlog remains
+      update_ui()               pushes new state to the widgets
+      render()                  draws the frame
+
+    Until the next frame is due, ingest runs in bounded slices while there is a backlog,
+    and otherwise the loop blocks in wait_for_io(timeout) until traffic arrives instead of
+    sleep-polling. Ingest always gets at least its share of the frame, even when the
+    previous frame ran late.
+
+    The frame interval adapts to load: it never drops below what UI updates and rendering
+    need to stay within their shares of the frame, it grows while ingest has a backlog
+    left at the end of a frame, and otherwise it relaxes back towards `max_fps`.
+    """
+
+    def __init__(self, ingest, update_ui, render, wait_for_io,
+                 max_fps=MAIN_LOOP_MAX_FPS, min_fps=MAIN_LOOP_MIN_FPS, budgets=MAIN_LOOP_BUDGETS):
+        self._ingest = ingest
+        self._update_ui = update_ui
+        self._render = render
+        self._wait_for_io = wait_for_io
+        self.min_interval = 1.0 / max_fps
+        self.max_interval = 1.0 / min_fps
+        self.budgets = dict(budgets)
+        self.interval = self.min_interval
+        self.backlog = False
+        self.frame_count = 0
+        self.stage_times = {"ingest": 0.0, "wait": 0.0, "ui": 0.0, "render": 0.0}  # Seconds spent in the last frame
+        self._draw_cost = 0.0  # Moving average of update_ui + render seconds
+        self._last_frame = time.perf_counter()
+
+    @property
+    def fps(self):
+        """Current target frame rate."""
+        return 1.0 / self.interval
+
+    def run_frame(self):
+        """Runs ingest until the next frame is due, then draws it."""
+        times = dict.fromkeys(self.stage_times, 0.0)
+        frame_due = self._last_frame + self.interval
+        ingest_budget = max(frame_due - time.perf_counter(), self.budgets["ingest"] * self.interval)
+        ingest_deadline = time.perf_counter() + ingest_budget
+        while True:
+            start = time.perf_counter()
+            self.backlog = self._ingest(max(ingest_deadline - start, 0.0))
+            now = time.perf_counter()
+            times["ingest"] += now - start
+            remaining = frame_due - now
+            if remaining <= 0 or now >= ingest_deadline: break
+            if not self.backlog:
+                # Idle until traffic arrives or the frame is due.
+                ready = self._wait_for_io(remaining)
+                times["wait"] += time.perf_counter() - now
+                if not ready: break
+
+        start = time.perf_counter()
+        self._last_frame = start
+        self._update_ui()
+        drawn = time.perf_counter()
+        self._render()
+        end = time.perf_counter()
+        times["ui"], times["render"] = drawn - start, end - drawn
+        self.stage_times = times
+        self.frame_count += 1
+        self._adapt(end - start)
+
+    def _adapt(self, draw_cost):
+        self._draw_cost += 0.1 * (draw_cost - self._draw_cost)
+        # The shortest interval in which drawing stays within its budget.
+        floor = max(self.min_interval, self._draw_cost / (self.budgets["ui"] + self.budgets["render"]))
+        if self.backlog:
+            self.interval *= 1.1  # Ingest fell behind: trade frames for ingest time
+        else:
+            self.interval *= 0.95
+        self.interval = min(max(self.interval, floor), self.max_interval)
+
+    def run(self, is_running):
+        """Runs frames while `is_running()` is true."""
+        while is_running():
+            self.run_frame()
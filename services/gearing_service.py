@@ -3,7 +3,7 @@ import time
 import math
 import threading
 import numpy as np
-from utils import ramp_value
+from utils import ramp_value, now_ns
 
 class GearingService:
     def __init__(self, viewmodel):
@@ -44,6 +44,7 @@ class GearingService:
         self.is_active = False
         if self._thread:
             self._thread.join(timeout=0.5)
+        self._stop_setpoint_streams()
         
         # Smoothly ramp down motor speeds to zero
         if self._viewmodel.get_motor_by_id(self.leader_id):
@@ -60,6 +61,11 @@ class GearingService:
         try:
             vm.send_control_mode_to_motor(self.leader_id, "Angle")
             vm.send_control_mode_to_motor(self.follower_id, "Angle")
+
+            # With the broadcast manager available the kernel sends both setpoints at a fixed
+            # rate and this loop only refreshes their values; otherwise each target is sent here.
+            if vm._motor_service.start_setpoint_stream(self.leader_id, self._current_pos):
+                vm._motor_service.start_setpoint_stream(self.follower_id, self._current_pos * self.follower_ratio)
             
             while self.is_active:
                 now = time.perf_counter()
@@ -68,9 +74,9 @@ class GearingService:
 
                 # UPDATED: Handle different modes
                 if self.mode == "drive_by_wire":
-                    leader_motor = vm.get_motor_by_id(self.leader_id)
-                    if leader_motor:
-                        self.target_position = leader_motor.angle
+                    leader_sample = vm.telemetry.latest('telemetry', self.leader_id)
+                    if leader_sample:
+                        self.target_position = leader_sample['angle']
                 
                 # --- Motion Profile ---
                 distance_to_target = self.target_position - self._current_pos
@@ -91,14 +97,23 @@ class GearingService:
                 vm.send_target_to_motor(self.follower_id, follower_target)
                 
                 # UPDATED: Log the target to the data service so it appears on the plot
-                now_ts = time.time()
-                vm._data_service.add_data_point("gui_target", now_ts - 0.001, self._previous_gui_target)
+                now_ts = now_ns()
+                vm._data_service.add_data_point("gui_target", now_ts - 1_000_000, self._previous_gui_target)
                 vm._data_service.add_data_point("gui_target", now_ts, leader_target)
                 self._previous_gui_target = leader_target
 
-                time.sleep(0.01)
+                if self.mode == "drive_by_wire":
+                    # Follow the leader as soon as its next sample is decoded (at most 10 ms apart).
+                    vm.telemetry.wait_for_sample(self.leader_id, timeout=0.01)
+                else:
+                    time.sleep(0.01)
 
         except Exception as e:
             vm.log_message(f"Gearing ERROR: {e}")
         finally:
-            self.is_active = False
\ No newline at end of file
+            self.is_active = False
+
+    def _stop_setpoint_streams(self):
+        motor_service = self._viewmodel._motor_service
+        motor_service.stop_setpoint_stream(getattr(self, "leader_id", None))
+        motor_service.stop_setpoint_stream(getattr(self, "follower_id", None))
\ No newline at end of file
@@ -0,0 +1,439 @@
+# services/ingest_process.py
+"""
+Runs CAN RX/TX, frame decoding and stream storage in a child process so that they don't
+compete with DearPyGui rendering for the GUI process's GIL.
+
+  child process:  CanService -> MotorService -> DataService (ingest decimation, storage,
+                  running stats, retention, Recorder) -> SharedStreamWriter
+  GUI process:    IngestProcessClient copies the samples the child stored out of
+                  shared-memory rings into a MirrorDataService, which plots, calculated
+                  streams and analysis read. Motor events and stats arrive over a pipe;
+                  commands go back over a second pipe through RemoteCanService /
+                  RemoteMotorService and the mirror.
+
+The GUI only appends snapshots of stored samples, once per stream per poll. It may fall
+up to CAN_PROCESS_RING_CAPACITY samples per stream behind before its copy skips samples;
+the child's streams, stats and recording are unaffected.
+"""
+import multiprocessing
+import threading
+import time
+from config import CAN_PROCESS_RING_CAPACITY, CAN_PROCESS_CYCLE, CAN_PROCESS_STATS_INTERVAL, STATS_ALL_STREAMS
+from services.data_service import DataService, configured_decimation
+from services.recorder import Recorder
+from services.shared_stream_ring import SharedStreamRing
+
+class SharedStreamWriter:
+    """Child side: copies what the child's DataService stored into one SharedStreamRing per stream, announced to the GUI."""
+
+    def __init__(self, event_conn, event_lock, capacity):
+        self._event_conn = event_conn
+        self._event_lock = event_lock
+        self._capacity = capacity
+        self._rings = {}    # key -> SharedStreamRing
+        self._cursors = {}  # key -> DataService.read_since() cursor
+
+    def publish(self, data_service):
+        """Writes the samples stored since the last call, announcing new streams first."""
+        for key in data_service.get_all_stream_keys():
+            ring = self._rings.get(key)
+            if ring is None:
+                ring = self._rings[key] = SharedStreamRing.create(self._capacity)
+                with self._event_lock:
+                    self._event_conn.send(("stream", key, ring.name, ring.capacity))
+            timestamps, values, self._cursors[key] = data_service.read_since(key, self._cursors.get(key, 0))
+            if len(timestamps):
+                ring.write_many(timestamps, values)
+
+    def close(self):
+        for ring in self._rings.values():
+            ring.close()
+        self._rings.clear()
+
+class _RecordingControl:
+    """Starts and stops the child's Recorder on behalf of the GUI."""
+
+    def __init__(self, data_service):
+        self._data_service = data_service
+        self.recorder = None
+
+    def start_recording(self, directory):
+        if self.recorder: return True
+        recorder = Recorder(directory, self._data_service.value_dtype)
+        recorder.start()
+        self.recorder = self._data_service.recorder = recorder
+        return True
+
+    def stop_recording(self):
+        """Returns the stopped Recorder's counters, or None if it wasn't recording."""
+        recorder = self.recorder
+        if not recorder: return None
+        self.recorder = self._data_service.recorder = None
+        recorder.stop()
+        return recorder.get_stats()
+
+def _ingest_main(cmd_conn, event_conn, ring_capacity):
+    """Entry point of the ingest process."""
+    from models.motor_registry import MotorRegistry
+    from services.can_service import CanService
+    from services.motor_service import MotorService
+
+    event_lock = threading.Lock()
+    can_service = CanService()
+    data_service = DataService()
+    streams = SharedStreamWriter(event_conn, event_lock, ring_capacity)
+    motor_service = MotorService(can_service, data_service)
+    recording = _RecordingControl(data_service)
+    motors = MotorRegistry()
+    targets = {"can": can_service, "motor": motor_service, "data": data_service, "ingest": recording}
+    stop_event = threading.Event()
+    sent_stats = {}  # key -> sample count last sent to the GUI
+    last_stats = last_retention = time.monotonic()
+
+    def command_thread_func():
+        # Commands are served on their own thread so they never wait behind a decode cycle.
+        while not stop_event.is_set():
+            try:
+                request = cmd_conn.recv()
+            except (EOFError, OSError):
+                break
+            if request[0] == "stop":
+                break
+            _, target, name, args, want_reply = request
+            if target == "motor" and name == "scan_for_motors":
+                motors.clear()
+            result, error = None, None
+            try:
+                result = getattr(targets[target], name)(*args)
+            except Exception as e:
+                error = str(e)
+            if want_reply:
+                cmd_conn.send((result, error))
+        stop_event.set()
+
+    command_thread = threading.Thread(target=command_thread_func, daemon=True)
+    command_thread.start()
+
+    try:
+        while not stop_event.is_set():
+            cycle_start = time.monotonic()
+            can_service.wait_for_rx(CAN_PROCESS_CYCLE)
+
+            messages = can_service.drain_messages()
+            frame_count = len(messages)
+            recorder = recording.recorder
+            if recorder:
+                recorder.record_messages(messages)
+            events = motor_service.process_messages(messages, motors)
+            for batch in can_service.drain_frame_batches():
+                frame_count += len(batch)
+                if recorder:
+                    recorder.record_frame_batch(batch)
+                events.extend(motor_service.process_frame_batch(batch, motors))
+            for event_type, data in events:
+                if event_type == 'new_motor' and data.id not in motors:
+                    motors.add(data)
+
+            streams.publish(data_service)
+            if frame_count:
+                with event_lock:
+                    event_conn.send(("events", events, frame_count))
+
+            if cycle_start - last_stats >= CAN_PROCESS_STATS_INTERVAL:
+                last_stats = cycle_start
+                changed = {key: stats for key, stats in data_service.get_all_stats().items()
+                           if stats and sent_stats.get(key) != stats["count"]}
+                if changed:
+                    sent_stats.update((key, stats["count"]) for key, stats in changed.items())
+                    with event_lock:
+                        event_conn.send(("stats", changed))
+            if cycle_start - last_retention >= 1.0:
+                last_retention = cycle_start
+                data_service.apply_retention()
+
+            # Bound the number of pipe messages per second; frames keep collecting in the RX ring meanwhile.
+            remaining = CAN_PROCESS_CYCLE - (time.monotonic() - cycle_start)
+            if remaining > 0:
+                time.sleep(remaining)
+    except (BrokenPipeError, EOFError, OSError):
+        pass
+    finally:
+        stop_event.set()
+        can_service.disconnect()
+        recording.stop_recording()
+        streams.close()
+
+class IngestProcessClient:
+    """GUI-side handle on the ingest process."""
+
+    def __init__(self):
+        self._context = multiprocessing.get_context("spawn")
+        self._process = None
+        self._cmd_conn = None
+        self._event_conn = None
+        self._cmd_lock = threading.Lock()
+        self._readers = {}  # key -> [SharedStreamRing, cursor]
+        self.can_service = RemoteCanService(self)
+        self.motor_service = RemoteMotorService(self)
+
+    @property
+    def is_running(self):
+        return self._process is not None and self._process.is_alive()
+
+    def start(self):
+        if self.is_running: return
+        cmd_parent, cmd_child = self._context.Pipe(duplex=True)
+        event_parent, event_child = self._context.Pipe(duplex=False)
+        self._process = self._context.Process(target=_ingest_main, args=(cmd_child, event_child, CAN_PROCESS_RING_CAPACITY), daemon=True)
+        self._process.start()
+        cmd_child.close()
+        event_child.close()
+        self._cmd_conn = cmd_parent
+        self._event_conn = event_parent
+
+    def stop(self):
+        if self._process is None: return
+        try:
+            with self._cmd_lock:
+                self._cmd_conn.send(("stop",))
+        except (BrokenPipeError, OSError):
+            pass
+        self._process.join(timeout=2)
+        if self._process.is_alive():
+            self._process.terminate()
+        for ring, _ in self._readers.values():
+            ring.close()
+        self._readers.clear()
+        self._cmd_conn.close()
+        self._event_conn.close()
+        self._process = self._cmd_conn = self._event_conn = None
+
+    def call(self, target, name, *args, reply=False):
+        """Invokes `name` on the child's CanService ("can") or MotorService ("motor")."""
+        if not self.is_running:
+            return None
+        try:
+            with self._cmd_lock:
+                self._cmd_conn.send(("call", target, name, args, reply))
+                if not reply:
+                    return None
+                result, error = self._cmd_conn.recv()
+        except (BrokenPipeError, EOFError, OSError) as e:
+            print(f"Error talking to ingest process: {e}")
+            return None
+        if error:
+            print(f"Error in ingest process {target}.{name}: {error}")
+        return result
+
+    def wait(self, timeout):
+        """Blocks until the ingest process has sent something or `timeout` seconds pass. Returns True if there is something to poll."""
+        if self._event_conn is None:
+            time.sleep(timeout)
+            return False
+        try:
+            return self._event_conn.poll(timeout)
+        except (EOFError, OSError):
+            return False
+
+    def poll(self, data_service):
+        """
+        Collects everything the child produced since the last call: copies the samples it
+        stored from the shared rings into `data_service` (a MirrorDataService), hands it the
+        latest stats and returns (events, frame_count).
+        """
+        events, frame_count = [], 0
+        if self._event_conn is None:
+            return events, frame_count
+        try:
+            while self._event_conn.poll():
+                message = self._event_conn.recv()
+                if message[0] == "stream":
+                    _, key, shm_name, capacity = message
+                    old = self._readers.pop(key, None)
+                    if old: old[0].close()
+                    self._readers[key] = [SharedStreamRing.attach(shm_name, capacity), 0]
+                    data_service.add_remote_stream(key)
+                elif message[0] == "events":
+                    events.extend(message[1])
+                    frame_count += message[2]
+                elif message[0] == "stats":
+                    data_service.update_remote_stats(message[1])
+        except (EOFError, OSError):
+            pass
+
+        for key, reader in self._readers.items():
+            timestamps, values, reader[1] = reader[0].read_since(reader[1])
+            if len(timestamps):
+                data_service.append_remote(key, timestamps, values)
+        return events, frame_count
+
+class MirrorDataService(DataService):
+    """
+    The GUI's DataService in CAN_PROCESS_MODE. Streams that the ingest process records
+    ("remote" streams) are decimated, counted in running stats, recorded and kept under
+    retention there; this copy holds the samples the child stored, for plots, calculated
+    streams and analysis, and forwards stats, decimation, retention and clearing of remote
+    streams to the child. Streams the GUI adds itself (e.g. gui_target) and calculated
+    streams are handled locally as usual.
+    """
+
+    def __init__(self, client):
+        super().__init__()
+        self._client = client
+        self._remote = set()
+        self._remote_stats = {}       # key -> latest stats dict sent by the child
+        self._stats_wanted = set()    # remote keys the GUI enabled stats for
+        self._remote_decimation = {}  # key -> (method, factor) or None, set by the GUI
+
+    def _forward(self, name, *args):
+        self._client.call("data", name, *args)
+
+    def sync_remote(self):
+        """Sends the GUI's history length and retention policies to a newly started ingest process."""
+        self._forward("change_history_length", self.history_length)
+        for key, policy in self._retention.items():
+            self._forward("set_retention", key, policy.samples, policy.seconds, policy.priority)
+
+    def add_remote_stream(self, key):
+        """Marks `key` as stored by the ingest process and sends it the GUI's settings for it."""
+        with self._lock:
+            self._remote.add(key)
+            self._stats.pop(key, None)
+            self._decimators.pop(key, None)
+        self.register_stream(key)
+        if key in self._stats_wanted:
+            self._forward("enable_stats", key)
+        if key in self._remote_decimation:
+            self._forward("set_decimation", key, *(self._remote_decimation[key] or (None,)))
+
+    def append_remote(self, key, timestamps, values):
+        """Appends samples the child already stored: no decimation, stats or recording here."""
+        if key not in self._data_streams:
+            self.register_stream(key)
+        with self._lock:
+            self._data_streams[key].append_many(timestamps, values)
+
+    def update_remote_stats(self, stats):
+        with self._lock:
+            self._remote_stats.update((key, value) for key, value in stats.items() if key in self._stats_wanted or STATS_ALL_STREAMS)
+
+    def _init_ingest(self, key):
+        if key not in self._remote:
+            super()._init_ingest(key)
+
+    def clear_stream(self, key):
+        super().clear_stream(key)
+        if key in self._remote:
+            self._forward("clear_stream", key)
+
+    def change_history_length(self, length):
+        super().change_history_length(length)
+        self._forward("change_history_length", length)
+
+    def set_retention(self, key, samples=None, seconds=None, priority=1):
+        super().set_retention(key, samples, seconds, priority)
+        self._forward("set_retention", key, samples, seconds, priority)
+
+    def enable_stats(self, key):
+        if key not in self._remote:
+            return super().enable_stats(key)
+        self._stats_wanted.add(key)
+        self._forward("enable_stats", key)
+
+    def disable_stats(self, key):
+        if key not in self._remote:
+            return super().disable_stats(key)
+        self._stats_wanted.discard(key)
+        with self._lock:
+            self._remote_stats.pop(key, None)
+        self._forward("disable_stats", key)
+
+    def reset_stats(self, key):
+        if key not in self._remote:
+            return super().reset_stats(key)
+        self._forward("reset_stats", key)
+
+    def get_stats(self, key):
+        if key not in self._remote:
+            return super().get_stats(key)
+        with self._lock:
+            return self._remote_stats.get(key)
+
+    def get_all_stats(self):
+        with self._lock:
+            stats = {key: self.get_stats(key) for key in list(self._stats)}
+            stats.update(self._remote_stats)
+            return stats
+
+    def set_decimation(self, key, method=None, factor=1):
+        if key not in self._remote:
+            return super().set_decimation(key, method, factor)
+        self._remote_decimation[key] = None if method is None or int(factor) <= 1 else (method, int(factor))
+        self._forward("set_decimation", key, method, factor)
+
+    def get_decimation(self, key):
+        if key not in self._remote:
+            return super().get_decimation(key)
+        if key in self._remote_decimation:
+            return self._remote_decimation[key]
+        return configured_decimation(key)
+
+class RemoteCanService:
+    """The subset of the CanService API the GUI uses, forwarded to the ingest process."""
+
+    def __init__(self, client):
+        self._client = client
+
+    def connect(self):
+        self._client.start()
+        if self._client.call("can", "connect", reply=True):
+            return True
+        self._client.stop()
+        return False
+
+    def disconnect(self):
+        self._client.call("can", "disconnect", reply=True)
+        self._client.stop()
+
+    def get_rx_stats(self):
+        return self._client.call("can", "get_rx_stats", reply=True) or {"dropped": 0}
+
+    def get_tx_stats(self):
+        return self._client.call("can", "get_tx_stats", reply=True) or {
+            "depth": 0, "max_priority_depth": 0, "max_slot_depth": 0, "coalesced": 0}
+
+class RemoteMotorService:
+    """The MotorService command API, forwarded to the ingest process."""
+
+    def __init__(self, client):
+        self._client = client
+
+    def scan_for_motors(self):
+        self._client.call("motor", "scan_for_motors")
+
+    def send_sync(self):
+        self._client.call("motor", "send_sync")
+
+    def send_command(self, motor_id, register, value, fmt):
+        self._client.call("motor", "send_command", motor_id, register, value, fmt)
+
+    def send_trajectory_command(self, motor_id, pos, vel, acc):
+        self._client.call("motor", "send_trajectory_command", motor_id, pos, vel, acc)
+
+    def request_parameter(self, motor_id, register):
+        self._client.call("motor", "request_parameter", motor_id, register)
+
+    def start_sync_stream(self, *args):
+        return bool(self._client.call("motor", "start_sync_stream", *args, reply=True))
+
+    def stop_sync_stream(self):
+        self._client.call("motor", "stop_sync_stream")
+
+    def start_setpoint_stream(self, motor_id, value, *args):
+        return bool(self._client.call("motor", "start_setpoint_stream", motor_id, value, *args, reply=True))
+
+    def update_setpoint_stream(self, motor_id, value):
+        self._client.call("motor", "update_setpoint_stream", motor_id, value)
+
+    def stop_setpoint_stream(self, motor_id):
+        self._client.call("motor", "stop_setpoint_stream", motor_id)
@@ -1,14 +1,24 @@
 # services/motor_service.py
 import can
 import struct
-import time
+import numpy as np
 from config import *
-from models.motor import Motor
+from models.motor import Motor, bus_index, split_motor_id
+from models.can_message import CanMessage, FrameBatch
+from utils import receive_time_to_ns, receive_times_to_ns
+
+# Telemetry payload layout: 32-bit angle, 16-bit velocity, 16-bit current (little-endian)
+TELEMETRY_DTYPE = np.dtype([("angle", "<i4"), ("velocity", "<i2"), ("current_q", "<i2")])
+
+def _telemetry_values(records):
+    """Scales TELEMETRY_DTYPE records to (angle rad, velocity rad/s, current A) arrays."""
+    return records["angle"] * 0.0001, records["velocity"] * 0.01, records["current_q"] * 0.001
 
 class MotorService:
     def __init__(self, can_service, data_service):
         self._can_service = can_service
         self._data_service = data_service
+        self._dispatch_table = self._build_dispatch_table()
 
     def scan_for_motors(self):
         message = can.Message(arbitration_id=CAN_ID_SCAN_BROADCAST, is_extended_id=False)
@@ -18,46 +28,256 @@ class MotorService:
         message = can.Message(arbitration_id=CAN_ID_SYNC, is_extended_id=False, dlc=0)
         self._can_service.send_message(message)
 
+    # --- Kernel-Timed Streams (require CAN_USE_BCM) ---
+    def start_sync_stream(self, period=CAN_SYNC_PERIOD):
+        """Broadcasts SYNC every `period` seconds from the kernel. Returns False if unavailable."""
+        message = can.Message(arbitration_id=CAN_ID_SYNC, is_extended_id=False, dlc=0)
+        return self._can_service.start_periodic("sync", message, period)
+
+    def stop_sync_stream(self):
+        self._can_service.stop_periodic("sync")
+
+    def start_setpoint_stream(self, motor_id, value, period=CAN_SETPOINT_PERIOD):
+        """
+        Sends REG_TARGET to `motor_id` every `period` seconds from the kernel. While it runs,
+        send_command(REG_TARGET) only updates the streamed value. Returns False if unavailable.
+        """
+        message = self._build_command_message(motor_id, REG_TARGET, float(value), 'f')
+        return self._can_service.start_periodic(("setpoint", motor_id), message, period)
+
+    def update_setpoint_stream(self, motor_id, value):
+        message = self._build_command_message(motor_id, REG_TARGET, float(value), 'f')
+        return self._can_service.update_periodic(("setpoint", motor_id), message)
+
+    def stop_setpoint_stream(self, motor_id):
+        self._can_service.stop_periodic(("setpoint", motor_id))
+
+    def _build_dispatch_table(self):
+        """
+        Precomputes a handler and motor ID for every 11-bit arbitration ID so that
+        routing a frame is a single list index instead of a walk over ID ranges.
+        """
+        table = [None] * 2048
+        ranges = [
+            (CAN_ID_TELEMETRY_BASE, self._handle_telemetry),
+            (CAN_ID_STATUS_FEEDBACK_BASE, self._handle_status_feedback),
+            (CAN_ID_RESPONSE_BASE, self._handle_response),
+            (CAN_ID_RESPONSE_BASE + 0x80, self._handle_char_response),
+        ]
+        for base, handler in ranges:
+            for motor_id in range(128):
+                table[base + motor_id] = (handler, motor_id)
+        return table
+
     def process_message(self, msg, existing_motors):
-        # --- Telemetry Messages ---
-        if CAN_ID_TELEMETRY_BASE <= msg.arbitration_id < (CAN_ID_TELEMETRY_BASE + 128):
-            motor_id = msg.arbitration_id - CAN_ID_TELEMETRY_BASE
-            if motor_id not in [m.id for m in existing_motors]:
-                self._data_service.register_stream(f"motor_{motor_id}_angle")
-                self._data_service.register_stream(f"motor_{motor_id}_velocity")
-                self._data_service.register_stream(f"motor_{motor_id}_current_q")
-                return ('new_motor', Motor(id=motor_id))
-            return self._unpack_telemetry(motor_id, msg.data)
-
-        # --- Status Feedback Messages ---
-        elif CAN_ID_STATUS_FEEDBACK_BASE <= msg.arbitration_id < (CAN_ID_STATUS_FEEDBACK_BASE + 128):
-            motor_id = msg.arbitration_id - CAN_ID_STATUS_FEEDBACK_BASE
-            return self._unpack_status_feedback(motor_id, msg.data)
-        
-        # --- Standard Parameter Responses ---
-        elif CAN_ID_RESPONSE_BASE <= msg.arbitration_id < (CAN_ID_RESPONSE_BASE + 128):
-            motor_id = msg.arbitration_id - CAN_ID_RESPONSE_BASE
-            if not msg.data: return None
-            reg_id = msg.data[0]
-            
-            if reg_id == REG_STATUS and len(msg.data) >= 2:
-                is_enabled = msg.data[1] > 0
-                return ('status_response', {'motor_id': motor_id, 'is_enabled': is_enabled})
-            
-            if len(msg.data) >= 5:
-                value = struct.unpack('<f', msg.data[1:5])[0]
-                return ('param_response', {'motor_id': motor_id, 'reg_id': reg_id, 'value': value})
-        
-        # --- Special Characterization Response ---
-        elif (CAN_ID_RESPONSE_BASE + 0x80) <= msg.arbitration_id < (CAN_ID_RESPONSE_BASE + 0x80 + 128):
-            motor_id = msg.arbitration_id - (CAN_ID_RESPONSE_BASE + 0x80)
-            if len(msg.data) == 8:
-                resistance, inductance = struct.unpack('<ff', msg.data)
-                return ('char_response', {'motor_id': motor_id, 'R': resistance, 'L': inductance})
+        """
+        Routes a single frame to its handler. `existing_motors` is the MotorRegistry and
+        `msg.channel` the bus the frame arrived on (see bus_index()).
+        """
+        if not 0 <= msg.arbitration_id < 2048: return None
+        entry = self._dispatch_table[msg.arbitration_id]
+        if entry is None: return None
+        handler, node_id = entry
+        return handler(node_id + bus_index(msg.channel) * CAN_MOTORS_PER_BUS, msg, existing_motors)
+
+    def decode_events(self, frames):
+        """
+        Decodes received frames into events without storing samples or registering motors,
+        so they can be published straight from the RX threads. `frames` is one received
+        message or a FrameBatch. Every event gets one entry per frame (telemetry included),
+        and its data carries 'timestamp_ns', the frame's receive time on the stream time base.
+        """
+        if isinstance(frames, FrameBatch):
+            return self._decode_batch_events(frames)
+        msg = frames
+        if not 0 <= msg.arbitration_id < 2048: return []
+        entry = self._dispatch_table[msg.arbitration_id]
+        if entry is None: return []
+        handler, node_id = entry
+        motor_id = node_id + bus_index(msg.channel) * CAN_MOTORS_PER_BUS
+        if handler == self._handle_telemetry:
+            if len(msg.data) < 8: return []
+            angle_raw, vel_raw, cur_q_raw = struct.unpack_from('<ihh', msg.data)
+            event = ('telemetry', {'motor_id': motor_id, 'angle': angle_raw * 0.0001, 'velocity': vel_raw * 0.01, 'current_q': cur_q_raw * 0.001})
+        else:
+            event = handler(motor_id, msg, None)  # The other handlers don't look at the registry
+            if not event: return []
+        event[1]['timestamp_ns'] = receive_time_to_ns(msg.timestamp)
+        return [event]
+
+    def _decode_batch_events(self, batch):
+        ids = batch.arbitration_ids.astype(np.int64)
+        node_ids = ids - CAN_ID_TELEMETRY_BASE
+        is_telemetry = (node_ids >= 0) & (node_ids < 128)
+        id_offset = batch.bus * CAN_MOTORS_PER_BUS
+        events = []
+        for i in np.flatnonzero(~is_telemetry).tolist():
+            entry = self._dispatch_table[ids[i]] if 0 <= ids[i] < 2048 else None
+            if entry is None: continue
+            handler, node_id = entry
+            msg = CanMessage(arbitration_id=int(ids[i]), data=bytearray(batch.data[i, :batch.dlcs[i]].tobytes()), channel=batch.bus)
+            event = handler(node_id + id_offset, msg, None)
+            if event:
+                event[1]['timestamp_ns'] = int(batch.timestamps_ns[i])
+                events.append(event)
+
+        mask = is_telemetry & (batch.dlcs >= 8)
+        if mask.any():
+            records = np.ascontiguousarray(batch.data[mask]).view(TELEMETRY_DTYPE).ravel()
+            angles, velocities, currents = _telemetry_values(records)
+            for motor_id, angle, velocity, current_q, ts in zip((node_ids[mask] + id_offset).tolist(), angles.tolist(), velocities.tolist(),
+                                                               currents.tolist(), batch.timestamps_ns[mask].tolist()):
+                events.append(('telemetry', {'motor_id': motor_id, 'angle': angle, 'velocity': velocity, 'current_q': current_q, 'timestamp_ns': ts}))
+        return events
+
+    # --- Telemetry Messages ---
+    def _handle_telemetry(self, motor_id, msg, existing_motors):
+        if motor_id not in existing_motors:
+            return self._register_motor(motor_id, existing_motors)
+        return self._unpack_telemetry(motor_id, msg.data, receive_time_to_ns(msg.timestamp))
+
+    def _register_motor(self, motor_id, existing_motors):
+        """Registers the streams of a motor not in `existing_motors` and returns its 'new_motor' event."""
+        if motor_id in existing_motors: return None
+        self._data_service.register_stream(f"motor_{motor_id}_angle")
+        self._data_service.register_stream(f"motor_{motor_id}_velocity")
+        self._data_service.register_stream(f"motor_{motor_id}_current_q")
+        return ('new_motor', Motor(id=motor_id))
+
+    # --- Status Feedback Messages ---
+    def _handle_status_feedback(self, motor_id, msg, existing_motors):
+        return self._unpack_status_feedback(motor_id, msg.data)
+
+    # --- Standard Parameter Responses ---
+    def _handle_response(self, motor_id, msg, existing_motors):
+        if not msg.data: return None
+        reg_id = msg.data[0]
+
+        if reg_id == REG_STATUS and len(msg.data) >= 2:
+            is_enabled = msg.data[1] > 0
+            return ('status_response', {'motor_id': motor_id, 'is_enabled': is_enabled})
 
+        if len(msg.data) >= 5:
+            value = struct.unpack('<f', msg.data[1:5])[0]
+            return ('param_response', {'motor_id': motor_id, 'reg_id': reg_id, 'value': value})
         return None
 
-    def _unpack_telemetry(self, motor_id, data):
+    # --- Special Characterization Response ---
+    def _handle_char_response(self, motor_id, msg, existing_motors):
+        if len(msg.data) == 8:
+            resistance, inductance = struct.unpack('<ff', msg.data)
+            return ('char_response', {'motor_id': motor_id, 'R': resistance, 'L': inductance})
+        return None
+
+    def process_messages(self, messages, existing_motors):
+        """
+        Processes every frame drained in one tick. Telemetry frames from known motors are
+        decoded together in a single vectorized pass; all other frames go through
+        process_message(). Returns a list of events in the same form as process_message(),
+        with one 'telemetry' event per motor carrying its latest sample.
+        """
+        results = []
+        discovered_ids = set()
+        dispatch_table = self._dispatch_table
+        telemetry_handler = dispatch_table[CAN_ID_TELEMETRY_BASE][0]
+        telemetry_ids, telemetry_payloads, telemetry_times = [], [], []
+
+        for msg in messages:
+            entry = dispatch_table[msg.arbitration_id] if 0 <= msg.arbitration_id < 2048 else None
+            if entry is None: continue
+            handler, motor_id = entry
+            motor_id += bus_index(msg.channel) * CAN_MOTORS_PER_BUS
+            if handler is telemetry_handler and (motor_id in existing_motors or motor_id in discovered_ids):
+                data = msg.data
+                if len(data) >= 8:
+                    telemetry_ids.append(motor_id)
+                    telemetry_payloads.append(data if len(data) == 8 else data[:8])
+                    telemetry_times.append(msg.timestamp)
+                continue
+
+            result = handler(motor_id, msg, existing_motors)
+            if not result: continue
+            if result[0] == 'new_motor':
+                discovered_ids.add(motor_id)
+            results.append(result)
+
+        if telemetry_ids:
+            results.extend(self.decode_telemetry_batch(
+                np.array(telemetry_ids, dtype=np.int16),
+                b"".join(telemetry_payloads),
+                receive_times_to_ns(telemetry_times)
+            ))
+        return results
+
+    def process_frame_batch(self, batch, existing_motors):
+        """
+        Processes a FrameBatch from the raw reader. Telemetry is selected and decoded with
+        array operations; only the remaining (infrequent) frames are routed one at a time.
+        Returns events in the same form as process_messages().
+        """
+        if len(batch) == 0: return []
+        results = []
+        ids = batch.arbitration_ids.astype(np.int64)
+        node_ids = ids - CAN_ID_TELEMETRY_BASE
+        is_telemetry = (node_ids >= 0) & (node_ids < 128)
+        id_offset = batch.bus * CAN_MOTORS_PER_BUS
+
+        known = np.zeros(128, dtype=bool)
+        for motor_id in existing_motors.ids():
+            if 0 <= motor_id - id_offset < 128: known[motor_id - id_offset] = True
+        telemetry_ids = np.where(is_telemetry, node_ids, 0)
+
+        # Announce motors seen for the first time, then decode their samples with everyone else's.
+        for node_id in np.unique(telemetry_ids[is_telemetry & ~known[telemetry_ids]]).tolist():
+            result = self._register_motor(node_id + id_offset, existing_motors)
+            if result: results.append(result)
+            known[node_id] = True
+
+        decode_mask = is_telemetry & known[telemetry_ids] & (batch.dlcs >= 8)
+        for i in np.flatnonzero(~is_telemetry).tolist():
+            entry = self._dispatch_table[ids[i]] if 0 <= ids[i] < 2048 else None
+            if entry is None: continue
+            handler, node_id = entry
+            msg = CanMessage(arbitration_id=int(ids[i]), data=bytearray(batch.data[i, :batch.dlcs[i]].tobytes()), channel=batch.bus)
+            result = handler(node_id + id_offset, msg, existing_motors)
+            if result: results.append(result)
+
+        if decode_mask.any():
+            results.extend(self.decode_telemetry_batch(
+                (node_ids[decode_mask] + id_offset).astype(np.int16),
+                np.ascontiguousarray(batch.data[decode_mask]),
+                batch.timestamps_ns[decode_mask]
+            ))
+        return results
+
+    def decode_telemetry_batch(self, motor_ids, payload, timestamps):
+        """
+        Decodes a batch of 8-byte telemetry payloads at once and appends the samples to
+        each motor's streams. `motor_ids` and `timestamps` (int64 ns on the stream time
+        base) hold one entry per frame and `payload` is the frames' data concatenated in
+        the same order.
+        """
+        records = np.frombuffer(payload, dtype=TELEMETRY_DTYPE)
+        angles, velocities, currents = _telemetry_values(records)
+
+        # Group the frames by motor while keeping each motor's samples in arrival order.
+        order = np.argsort(motor_ids, kind="stable")
+        unique_ids, starts = np.unique(motor_ids[order], return_index=True)
+        ends = np.append(starts[1:], len(order))
+
+        results = []
+        for motor_id, start, end in zip(unique_ids.tolist(), starts.tolist(), ends.tolist()):
+            idx = order[start:end]
+            ts = timestamps[idx]
+            self._data_service.add_data_points(f"motor_{motor_id}_angle", ts, angles[idx])
+            self._data_service.add_data_points(f"motor_{motor_id}_velocity", ts, velocities[idx])
+            self._data_service.add_data_points(f"motor_{motor_id}_current_q", ts, currents[idx])
+            last = idx[-1]
+            results.append(('telemetry', {'motor_id': motor_id, 'angle': float(angles[last]), 'velocity': float(velocities[last]),
+                                          'current_q': float(currents[last]), 'timestamp_ns': int(timestamps[last])}))
+        return results
+
+    def _unpack_telemetry(self, motor_id, data, ts):
         if len(data) < 8: return None
         try:
             # Data format is 32-bit angle, 16-bit velocity, 16-bit current
@@ -65,12 +285,11 @@ class MotorService:
             angle = angle_raw * 0.0001
             velocity = vel_raw * 0.01
             current_q = cur_q_raw * 0.001
-            
-            ts = time.time()
+
             self._data_service.add_data_point(f"motor_{motor_id}_angle", ts, angle)
             self._data_service.add_data_point(f"motor_{motor_id}_velocity", ts, velocity)
             self._data_service.add_data_point(f"motor_{motor_id}_current_q", ts, current_q)
-            return ('telemetry', {'motor_id': motor_id, 'angle': angle, 'velocity': velocity, 'current_q': current_q})
+            return ('telemetry', {'motor_id': motor_id, 'angle': angle, 'velocity': velocity, 'current_q': current_q, 'timestamp_ns': ts})
         except (struct.error): 
             return None
             
@@ -84,17 +303,29 @@ class MotorService:
         except (struct.error):
             return None
 
-    def send_command(self, motor_id, register, value, fmt):
-        if motor_id is None: return
-        command_id = CAN_ID_COMMAND_BASE + motor_id
+    def _build_command_message(self, motor_id, register, value, fmt):
+        bus, node_id = split_motor_id(motor_id)
+        command_id = CAN_ID_COMMAND_BASE + node_id
         data = [register]
         if fmt == 'b': data.append(value)
         elif fmt == 'f': data.extend(list(struct.pack('<f', value)))
         elif fmt == 'L': data.extend(list(struct.pack('<L', value)))
         elif fmt == 'none': pass
-        else: return
-        message = can.Message(arbitration_id=command_id, data=data, is_extended_id=False)
-        self._can_service.send_message(message)
+        else: return None
+        return can.Message(arbitration_id=command_id, data=data, is_extended_id=False, channel=bus)
+
+    def send_command(self, motor_id, register, value, fmt):
+        if motor_id is None: return
+        # While a setpoint stream is running the kernel owns the cadence; just refresh its data.
+        if register == REG_TARGET and self._can_service.is_periodic_active(("setpoint", motor_id)):
+            self.update_setpoint_stream(motor_id, value)
+            return
+        message = self._build_command_message(motor_id, register, value, fmt)
+        if message is None: return
+        if register in CAN_TX_LATEST_VALUE_REGISTERS:
+            self._can_service.send_latest((motor_id, register), message)
+        else:
+            self._can_service.send_message(message, motor_id)
     
     def send_trajectory_command(self, motor_id, pos, vel, acc):
         """
@@ -110,21 +341,23 @@ class MotorService:
         # Pack the data as '<ihh' (signed int, signed short, signed short) which is 4 + 2 + 2 = 8 bytes.
         data = struct.pack('<ihh', pos_raw, vel_raw, acc_raw)
 
+        bus, node_id = split_motor_id(motor_id)
         try:
             # Use the DEDICATED CAN ID for motion commands, not the general one.
             # This ID is specifically for our 8-byte trajectory message.
             message = can.Message(
-                arbitration_id=(CAN_ID_MOTION_COMMAND_BASE + motor_id),
+                arbitration_id=(CAN_ID_MOTION_COMMAND_BASE + node_id),
                 data=list(data),
                 is_extended_id=False,
+                channel=bus,
                 dlc=8  # Data Length Code must be 8
             )
-            self._can_service.send_message(message)
+            self._can_service.send_message(message, motor_id)
         except Exception as e:
             print(f"Error sending trajectory command: {e}")
 
     def request_parameter(self, motor_id, register):
         if motor_id is None: return
-        command_id = CAN_ID_COMMAND_BASE + motor_id
-        message = can.Message(arbitration_id=command_id, data=[register], is_extended_id=False)
+        bus, node_id = split_motor_id(motor_id)
+        message = can.Message(arbitration_id=CAN_ID_COMMAND_BASE + node_id, data=[register], is_extended_id=False, channel=bus)
         self._can_service.send_message(message)
\ No newline at end of file
@@ -2,6 +2,7 @@
 import time
 import threading
 import numpy as np
+from utils import now_ns
 
 class PerformanceService:
     def __init__(self, viewmodel):
@@ -36,14 +37,10 @@ class PerformanceService:
         vm.send_control_mode_to_motor(motor_id, "Angle")
         time.sleep(0.1)
 
-        target_stream = vm._data_service.get_stream_data("gui_target")
-        target_stream["timestamps"].clear()
-        target_stream["values"].clear()
+        vm._data_service.clear_stream("gui_target")
 
         angle_stream_key = f"motor_{motor_id}_angle"
-        angle_stream = vm._data_service.get_stream_data(angle_stream_key)
-        angle_stream["timestamps"].clear()
-        angle_stream["values"].clear()
+        vm._data_service.clear_stream(angle_stream_key)
         
         motor = vm.get_motor_by_id(motor_id)
         if motor:
@@ -57,6 +54,7 @@ class PerformanceService:
         motor_id = vm.active_motor_id
         try:
             angle_stream_key = self._prepare_for_test(motor_id)
+            test_start_ns = now_ns()
             motor = vm.get_motor_by_id(motor_id)
             start_pos = motor.angle
 
@@ -68,8 +66,8 @@ class PerformanceService:
             
             vm.log_message("Step Response Test finished. Analyzing...")
             
-            target_data = vm._data_service.get_stream_data("gui_target")
-            angle_data = vm._data_service.get_stream_data(angle_stream_key)
+            target_data = vm._data_service.snapshot_stream("gui_target", t_start=test_start_ns)
+            angle_data = vm._data_service.snapshot_stream(angle_stream_key, t_start=test_start_ns)
             
             results = vm._analysis_service.analyze_step_response_performance(
                 target_data, angle_data, target_pos
@@ -87,6 +85,7 @@ class PerformanceService:
         motor_id = vm.active_motor_id
         try:
             angle_stream_key = self._prepare_for_test(motor_id)
+            test_start_ns = now_ns()
             motor = vm.get_motor_by_id(motor_id)
             start_pos = motor.angle
             
@@ -117,8 +116,8 @@ class PerformanceService:
             time.sleep(0.5)
 
             vm.log_message("Constant Velocity Test finished. Analyzing...")
-            target_data = vm._data_service.get_stream_data("gui_target")
-            angle_data = vm._data_service.get_stream_data(angle_stream_key)
+            target_data = vm._data_service.snapshot_stream("gui_target", t_start=test_start_ns)
+            angle_data = vm._data_service.snapshot_stream(angle_stream_key, t_start=test_start_ns)
             
             results = vm._analysis_service.analyze_tracking_error(target_data, angle_data)
             vm.performance_test_results = results
@@ -134,6 +133,7 @@ class PerformanceService:
         motor_id = vm.active_motor_id
         try:
             angle_stream_key = self._prepare_for_test(motor_id)
+            test_start_ns = now_ns()
             motor = vm.get_motor_by_id(motor_id)
             start_pos = motor.angle
 
@@ -176,8 +176,8 @@ class PerformanceService:
             time.sleep(0.5)
 
             vm.log_message("Reversing Move Test finished. Analyzing...")
-            target_data = vm._data_service.get_stream_data("gui_target")
-            angle_data = vm._data_service.get_stream_data(angle_stream_key)
+            target_data = vm._data_service.snapshot_stream("gui_target", t_start=test_start_ns)
+            angle_data = vm._data_service.snapshot_stream(angle_stream_key, t_start=test_start_ns)
 
             results = vm._analysis_service.analyze_tracking_error(target_data, angle_data)
             vm.performance_test_results = results
@@ -0,0 +1,169 @@
+# services/raw_can_reader.py
+import ctypes
+import errno
+import select
+import socket
+import struct
+import time
+import numpy as np
+from models.can_message import FrameBatch
+from utils import receive_wall_ns_to_ns
+
+# Linux socket constants not exposed by every Python build
+SO_TIMESTAMPNS = getattr(socket, "SO_TIMESTAMPNS", 35)
+MSG_DONTWAIT = getattr(socket, "MSG_DONTWAIT", 0x40)
+
+CAN_EFF_FLAG = 0x80000000
+CAN_RTR_FLAG = 0x40000000
+CAN_ERR_FLAG = 0x20000000
+CAN_EFF_MASK = 0x1FFFFFFF
+
+# struct can_frame: u32 can_id, u8 len, u8 __pad, u8 __res0, u8 len8_dlc, u8 data[8] (16 bytes)
+CAN_FRAME_DTYPE = np.dtype([
+    ("can_id", "=u4"), ("dlc", "u1"), ("pad", "u1"), ("res0", "u1"), ("len8_dlc", "u1"), ("data", "u1", (8,))
+])
+
+class _IoVec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p), ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(_IoVec)), ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p), ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", _MsgHdr), ("msg_len", ctypes.c_uint)]
+
+class _CMsgHdr(ctypes.Structure):
+    _fields_ = [("cmsg_len", ctypes.c_size_t), ("cmsg_level", ctypes.c_int), ("cmsg_type", ctypes.c_int)]
+
+class _TimeSpec(ctypes.Structure):
+    _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+
+def _cmsg_align(length):
+    align = ctypes.sizeof(ctypes.c_size_t)
+    return (length + align - 1) & ~(align - 1)
+
+_CMSG_DATA_OFFSET = _cmsg_align(ctypes.sizeof(_CMsgHdr))
+_CONTROL_SIZE = _CMSG_DATA_OFFSET + _cmsg_align(ctypes.sizeof(_TimeSpec))
+_TIMESPEC_DTYPE = np.dtype([("sec", f"=i{ctypes.sizeof(ctypes.c_long)}"), ("nsec", f"=i{ctypes.sizeof(ctypes.c_long)}")])
+
+def _load_recvmmsg():
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        func = libc.recvmmsg
+    except (OSError, AttributeError):
+        return None
+    func.argtypes = [ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint, ctypes.c_int, ctypes.c_void_p]
+    func.restype = ctypes.c_int
+    return func
+
+_recvmmsg = _load_recvmmsg()
+
+class RawCanReader:
+    """
+    Reads classic CAN frames from a raw AF_CAN socket in batches.
+
+    One recvmmsg() call pulls up to `batch_size` frames, together with their kernel
+    receive timestamps, straight into preallocated NumPy buffers. No per-frame Python
+    objects are created; each wakeup produces a single FrameBatch of arrays.
+    """
+
+    def __init__(self, channel, can_filters=None, batch_size=256):
+        if not hasattr(socket, "AF_CAN"):
+            raise OSError("Raw CAN sockets are only available on Linux.")
+        if _recvmmsg is None:
+            raise OSError("recvmmsg() is not available from the C library.")
+        self.channel = channel
+        self.batch_size = int(batch_size)
+        self._socket = None
+        self._poller = None
+
+        # Preallocated receive buffers, reused for every batch
+        self._frames = np.zeros(self.batch_size, dtype=CAN_FRAME_DTYPE)
+        self._control = np.zeros((self.batch_size, _CONTROL_SIZE), dtype=np.uint8)
+        self._iovecs = (_IoVec * self.batch_size)()
+        self._msgs = (_MMsgHdr * self.batch_size)()
+        frame_base = self._frames.ctypes.data
+        control_base = self._control.ctypes.data
+        for i in range(self.batch_size):
+            self._iovecs[i].iov_base = frame_base + i * CAN_FRAME_DTYPE.itemsize
+            self._iovecs[i].iov_len = CAN_FRAME_DTYPE.itemsize
+            hdr = self._msgs[i].msg_hdr
+            hdr.msg_iov = ctypes.pointer(self._iovecs[i])
+            hdr.msg_iovlen = 1
+            hdr.msg_control = control_base + i * _CONTROL_SIZE
+            hdr.msg_controllen = _CONTROL_SIZE
+
+        # The kernel rewrites msg_controllen on every receive; this strided view resets them all in one step.
+        controllen_offset = _MMsgHdr.msg_hdr.offset + _MsgHdr.msg_controllen.offset
+        self._controllen = np.ndarray(
+            shape=(self.batch_size,), dtype=np.uintp,
+            buffer=(ctypes.c_char * ctypes.sizeof(self._msgs)).from_buffer(self._msgs),
+            offset=controllen_offset, strides=(ctypes.sizeof(_MMsgHdr),)
+        )
+        self._can_filters = can_filters
+
+    def open(self):
+        sock = socket.socket(socket.AF_CAN, socket.SOCK_RAW, socket.CAN_RAW)
+        try:
+            if self._can_filters:
+                filter_data = []
+                for can_filter in self._can_filters:
+                    filter_data.extend((can_filter["can_id"], can_filter["can_mask"]))
+                sock.setsockopt(socket.SOL_CAN_RAW, socket.CAN_RAW_FILTER,
+                                struct.pack(f"={len(filter_data)}I", *filter_data))
+            sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPNS, 1)
+            sock.bind((self.channel,))
+        except OSError:
+            sock.close()
+            raise
+        self._socket = sock
+        self._poller = select.poll()
+        self._poller.register(sock.fileno(), select.POLLIN)
+
+    def close(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+            self._poller = None
+
+    def read_batch(self, timeout=0.1):
+        """
+        Waits up to `timeout` seconds for traffic, then reads every frame that is pending
+        (up to `batch_size`). Returns a FrameBatch that owns its arrays, or None on timeout.
+        """
+        if self._socket is None: return None
+        if not self._poller.poll(int(timeout * 1000)):
+            return None
+
+        self._controllen[:] = _CONTROL_SIZE
+        count = _recvmmsg(self._socket.fileno(), self._msgs, self.batch_size, MSG_DONTWAIT, None)
+        if count < 0:
+            err = ctypes.get_errno()
+            if err in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return None
+            raise OSError(err, f"recvmmsg failed on {self.channel}: {errno.errorcode.get(err, err)}")
+        if count == 0:
+            return None
+
+        frames = self._frames[:count]
+        can_ids = frames["can_id"]
+        valid = (can_ids & CAN_ERR_FLAG) == 0
+        timespecs = np.ascontiguousarray(self._control[:count, _CMSG_DATA_OFFSET:_CMSG_DATA_OFFSET + _TIMESPEC_DTYPE.itemsize]).view(_TIMESPEC_DTYPE)[:, 0]
+        wall_ns = timespecs["sec"].astype(np.int64) * 1_000_000_000 + timespecs["nsec"]
+        unstamped = wall_ns == 0
+        if unstamped.any():
+            wall_ns[unstamped] = time.time_ns()
+
+        if not valid.all():
+            frames, can_ids, wall_ns = frames[valid], can_ids[valid], wall_ns[valid]
+        return FrameBatch(
+            arbitration_ids=(can_ids & CAN_EFF_MASK).astype(np.uint32),
+            dlcs=frames["dlc"].copy(),
+            data=frames["data"].copy(),
+            timestamps_ns=receive_wall_ns_to_ns(wall_ns),
+        )
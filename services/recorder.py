@@ -0,0 +1,320 @@
+# services/recorder.py
+"""
+Recording of streams and raw CAN frames to disk.
+
+A recording is a directory:
+
+    index.jsonl           one JSON line per table and per chunk, appended as chunks land
+    <table>/<seq>.<column>.npy[.zlib|.xz]
+
+Each table (one per stream, plus "can" for raw frames) is stored column by column in
+chunks of up to RECORD_CHUNK_SAMPLES rows. Chunks are only ever added, and a chunk is
+listed in the index only after all its files are written, so a recording cut short by a
+crash is still readable up to its last indexed chunk. Uncompressed chunks are plain .npy
+files that Recording opens with np.load(mmap_mode="r"), i.e. as np.memmap views.
+"""
+import io
+import json
+import lzma
+import os
+import queue
+import re
+import threading
+import time
+import zlib
+import numpy as np
+from config import RECORD_CHUNK_SAMPLES, RECORD_COMPRESSION, RECORD_MAX_PENDING_MB, RECORD_FLUSH_INTERVAL
+from models.motor import bus_index
+from utils import receive_times_to_ns
+
+INDEX_FILE = "index.jsonl"
+CAN_TABLE = "can"
+COMPRESSIONS = {None: "", "zlib": ".zlib", "lzma": ".xz"}
+
+def _stream_columns(value_dtype):
+    return {"timestamps": (np.int64, ()), "values": (np.dtype(value_dtype), ())}
+
+CAN_COLUMNS = {
+    "timestamps": (np.int64, ()),
+    "arbitration_ids": (np.uint32, ()),
+    "bus": (np.uint8, ()),
+    "dlcs": (np.uint8, ()),
+    "data": (np.uint8, (8,)),
+}
+
+class _ChunkStager:
+    """Collects rows of one table in preallocated column arrays and hands them out one full chunk at a time."""
+
+    def __init__(self, columns, chunk_rows):
+        self.columns = columns
+        self.chunk_rows = chunk_rows
+        self._new_chunk()
+
+    def _new_chunk(self):
+        self._arrays = {name: np.empty((self.chunk_rows,) + shape, dtype=dtype)
+                        for name, (dtype, shape) in self.columns.items()}
+        self.rows = 0
+
+    def append(self, arrays):
+        """Copies the rows of `arrays` (column name -> array). Returns the chunks that became full."""
+        n = len(arrays["timestamps"])
+        full, done = [], 0
+        while done < n:
+            take = min(n - done, self.chunk_rows - self.rows)
+            for name, column in self._arrays.items():
+                column[self.rows:self.rows + take] = arrays[name][done:done + take]
+            self.rows += take
+            done += take
+            if self.rows == self.chunk_rows:
+                full.append(self.take())
+        return full
+
+    def take(self):
+        """Returns the rows collected so far as a chunk (a dict of arrays) and starts a new one."""
+        full = self.rows == self.chunk_rows
+        # A partial chunk is copied so the queue doesn't hold on to the whole preallocated arrays.
+        chunk = {name: column if full else column[:self.rows].copy() for name, column in self._arrays.items()}
+        self._new_chunk()
+        return chunk
+
+class Recorder:
+    """
+    Streams samples and raw CAN frames to a recording directory from a background thread.
+
+    record_samples()/record_frames() only copy rows into per-table staging arrays; full
+    chunks (and, every RECORD_FLUSH_INTERVAL seconds, partial ones) are queued for the
+    writer thread, which does the compression and file I/O. At most
+    RECORD_MAX_PENDING_MB of chunks wait in the queue: if the disk can't keep up, further
+    chunks are dropped and counted in `dropped_rows` instead of growing memory or
+    stalling the caller.
+    """
+
+    def __init__(self, directory, value_dtype=np.float64, chunk_rows=RECORD_CHUNK_SAMPLES,
+                 compression=RECORD_COMPRESSION, max_pending_mb=RECORD_MAX_PENDING_MB,
+                 flush_interval=RECORD_FLUSH_INTERVAL):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression '{compression}'. Expected one of {tuple(COMPRESSIONS)}.")
+        self.directory = directory
+        self.value_dtype = np.dtype(value_dtype)
+        self.chunk_rows = int(chunk_rows)
+        self.compression = compression
+        self.flush_interval = flush_interval
+        self._max_pending_bytes = int(max_pending_mb * 1024 * 1024)
+        self._pending_bytes = 0
+        self._stagers = {}        # table name -> _ChunkStager
+        self._table_dirs = {}     # table name -> directory name (written by the writer thread)
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._writer = None
+        self._last_flush = time.monotonic()
+        self.is_recording = False
+
+        # Counters
+        self.written_rows = 0
+        self.written_bytes = 0
+        self.dropped_rows = 0
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._index = open(os.path.join(self.directory, INDEX_FILE), "a", encoding="utf-8")
+        self._write_index({"type": "recording", "version": 1, "created": time.time(),
+                           "chunk_rows": self.chunk_rows, "compression": self.compression})
+        self.is_recording = True
+        self._writer = threading.Thread(target=self._write_loop, name="Recorder", daemon=True)
+        self._writer.start()
+        print(f"Recording to '{self.directory}'.")
+
+    def stop(self):
+        """Writes out every staged row, waits for the writer to finish and closes the recording."""
+        if not self.is_recording: return
+        self.flush()
+        self.is_recording = False
+        self._queue.put(None)
+        self._writer.join()
+        self._index.close()
+        print(f"Recording stopped: {self.written_rows} rows, {self.written_bytes / 1e6:.1f} MB, {self.dropped_rows} rows dropped.")
+
+    def record_samples(self, key, timestamps, values):
+        """Records samples of the stream `key`. Scalars are accepted for a single sample."""
+        self._record(key, _stream_columns(self.value_dtype), {
+            "timestamps": np.atleast_1d(np.asarray(timestamps, dtype=np.int64)),
+            "values": np.atleast_1d(np.asarray(values, dtype=self.value_dtype)),
+        })
+
+    def record_frame_batch(self, batch):
+        """Records the raw frames of a FrameBatch."""
+        self.record_frames(batch.timestamps_ns, batch.arbitration_ids, batch.bus, batch.dlcs, batch.data)
+
+    def record_messages(self, messages):
+        """Records received python-can messages (receive timestamps are mapped to the stream time base)."""
+        if not messages: return
+        data = np.zeros((len(messages), 8), dtype=np.uint8)
+        for row, msg in zip(data, messages):
+            row[:len(msg.data)] = msg.data[:8]
+        self.record_frames(receive_times_to_ns([msg.timestamp for msg in messages]),
+                           [msg.arbitration_id for msg in messages],
+                           [bus_index(msg.channel) for msg in messages],
+                           [msg.dlc for msg in messages], data)
+
+    def record_frames(self, timestamps_ns, arbitration_ids, bus, dlcs, data):
+        """Records raw CAN frames given as parallel arrays (`bus` may be a single index for all of them)."""
+        timestamps_ns = np.asarray(timestamps_ns, dtype=np.int64)
+        self._record(CAN_TABLE, CAN_COLUMNS, {
+            "timestamps": timestamps_ns,
+            "arbitration_ids": np.asarray(arbitration_ids, dtype=np.uint32),
+            "bus": np.broadcast_to(np.asarray(bus, dtype=np.uint8), timestamps_ns.shape),
+            "dlcs": np.asarray(dlcs, dtype=np.uint8),
+            "data": np.asarray(data, dtype=np.uint8).reshape(-1, 8),
+        })
+
+    def flush(self):
+        """Queues every partially filled chunk for writing."""
+        with self._lock:
+            for table, stager in self._stagers.items():
+                if stager.rows:
+                    self._enqueue(table, stager.take())
+            self._last_flush = time.monotonic()
+
+    def get_stats(self):
+        return {"written_rows": self.written_rows, "written_bytes": self.written_bytes,
+                "dropped_rows": self.dropped_rows, "pending_bytes": self._pending_bytes}
+
+    def _record(self, table, columns, arrays):
+        if not self.is_recording or len(arrays["timestamps"]) == 0: return
+        with self._lock:
+            stager = self._stagers.get(table)
+            if stager is None:
+                stager = self._stagers[table] = _ChunkStager(columns, self.chunk_rows)
+            for chunk in stager.append(arrays):
+                self._enqueue(table, chunk)
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def _enqueue(self, table, chunk):
+        # Called with self._lock held.
+        size = sum(column.nbytes for column in chunk.values())
+        if self._pending_bytes + size > self._max_pending_bytes:
+            self.dropped_rows += len(chunk["timestamps"])
+            return
+        self._pending_bytes += size
+        self._queue.put((table, chunk, size))
+
+    # --- Writer thread ---
+    def _write_loop(self):
+        sequence = {}
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            table, chunk, size = job
+            try:
+                self._write_chunk(table, chunk, sequence.get(table, 0))
+                sequence[table] = sequence.get(table, 0) + 1
+            except OSError as e:
+                print(f"Error writing recording chunk for '{table}': {e}")
+                self.dropped_rows += len(chunk["timestamps"])
+            with self._lock:
+                self._pending_bytes -= size
+
+    def _write_chunk(self, table, chunk, seq):
+        table_dir = self._table_dirs.get(table)
+        if table_dir is None:
+            table_dir = self._table_dirs[table] = f"{len(self._table_dirs):04d}_{re.sub(r'[^A-Za-z0-9_.-]', '_', table)}"
+            os.makedirs(os.path.join(self.directory, table_dir), exist_ok=True)
+            self._write_index({"type": "table", "table": table, "dir": table_dir,
+                               "columns": {name: [np.dtype(column.dtype).str, list(column.shape[1:])]
+                                           for name, column in chunk.items()}})
+        suffix = COMPRESSIONS[self.compression]
+        files = {}
+        for name, column in chunk.items():
+            file_name = f"{seq:06d}.{name}.npy{suffix}"
+            path = os.path.join(self.directory, table_dir, file_name)
+            if self.compression is None:
+                np.save(path, np.ascontiguousarray(column))
+            else:
+                buffer = io.BytesIO()
+                np.save(buffer, np.ascontiguousarray(column))
+                raw = buffer.getvalue()
+                with open(path, "wb") as f:
+                    f.write(zlib.compress(raw, 6) if self.compression == "zlib" else lzma.compress(raw))
+            files[name] = file_name
+            self.written_bytes += os.path.getsize(path)
+        timestamps = chunk["timestamps"]
+        self._write_index({"type": "chunk", "table": table, "rows": len(timestamps),
+                           "t0": int(timestamps[0]), "t1": int(timestamps[-1]), "files": files})
+        self.written_rows += len(timestamps)
+
+    def _write_index(self, entry):
+        self._index.write(json.dumps(entry) + "\n")
+        self._index.flush()
+
+class Recording:
+    """
+    Read access to a recording directory. Chunks are loaded lazily: uncompressed columns
+    are memory-mapped, compressed ones are decompressed one chunk at a time when read.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.info = {}
+        self._tables = {}  # table name -> {"dir", "columns", "chunks": [index entries]}
+        with open(os.path.join(directory, INDEX_FILE), encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # A line cut short by a crash ends the usable part of the index.
+                if entry["type"] == "recording":
+                    self.info = entry
+                elif entry["type"] == "table":
+                    self._tables[entry["table"]] = {"dir": entry["dir"], "columns": entry["columns"], "chunks": []}
+                elif entry["type"] == "chunk":
+                    self._tables[entry["table"]]["chunks"].append(entry)
+
+    def tables(self):
+        return sorted(self._tables)
+
+    def stream_keys(self):
+        return sorted(table for table in self._tables if table != CAN_TABLE)
+
+    def row_count(self, table):
+        return sum(chunk["rows"] for chunk in self._tables[table]["chunks"])
+
+    def iter_chunks(self, table, t_start=None, t_end=None):
+        """Yields each chunk of `table` overlapping [t_start, t_end] as a dict of column arrays."""
+        info = self._tables[table]
+        for chunk in info["chunks"]:
+            if t_start is not None and chunk["t1"] < t_start: continue
+            if t_end is not None and chunk["t0"] > t_end: continue
+            yield {name: self._load(info["dir"], file_name) for name, file_name in chunk["files"].items()}
+
+    def read_table(self, table, t_start=None, t_end=None):
+        """Returns the rows of `table` with timestamps in [t_start, t_end] as a dict of column arrays."""
+        parts = []
+        for chunk in self.iter_chunks(table, t_start, t_end):
+            timestamps = chunk["timestamps"]
+            i0 = 0 if t_start is None else int(np.searchsorted(timestamps, t_start, side="left"))
+            i1 = len(timestamps) if t_end is None else int(np.searchsorted(timestamps, t_end, side="right"))
+            parts.append({name: column[i0:i1] for name, column in chunk.items()})
+        if not parts:
+            columns = self._tables[table]["columns"]
+            return {name: np.empty((0, *shape), dtype=np.dtype(dtype)) for name, (dtype, shape) in columns.items()}
+        if len(parts) == 1:
+            return parts[0]
+        return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+    def read_stream(self, key, t_start=None, t_end=None):
+        """Returns {"timestamps", "values"} of a recorded stream, like DataService.get_stream_data()."""
+        return self.read_table(key, t_start, t_end)
+
+    def read_can_frames(self, t_start=None, t_end=None):
+        return self.read_table(CAN_TABLE, t_start, t_end)
+
+    def _load(self, table_dir, file_name):
+        path = os.path.join(self.directory, table_dir, file_name)
+        if file_name.endswith(".npy"):
+            return np.load(path, mmap_mode="r")
+        with open(path, "rb") as f:
+            raw = f.read()
+        raw = zlib.decompress(raw) if file_name.endswith(".zlib") else lzma.decompress(raw)
+        return np.load(io.BytesIO(raw))
@@ -0,0 +1,142 @@
+# services/ring_buffer.py
+import threading
+import time
+
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+OVERFLOW_POLICIES = (DROP_OLDEST, DROP_NEWEST)
+
+class RingBuffer:
+    """
+    A bounded, thread-safe FIFO for handing items from a producer thread to a consumer.
+    The producer adds items one at a time (or in batches) and the consumer takes
+    everything that is pending in a single call, so the lock is taken once per drain
+    instead of once per item.
+    """
+
+    def __init__(self, capacity, overflow_policy=DROP_OLDEST):
+        if int(capacity) < 1:
+            raise ValueError("RingBuffer capacity must be at least 1.")
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy '{overflow_policy}'. Expected one of {OVERFLOW_POLICIES}.")
+        self._capacity = int(capacity)
+        self._items = [None] * self._capacity
+        self._head = 0   # Index of the oldest pending item
+        self._count = 0  # Number of pending items
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._wake_at = 1  # Pending count at which producers wake the consumer
+        self.overflow_policy = overflow_policy
+
+        # Counters
+        self.total_put = 0
+        self.dropped_oldest = 0
+        self.dropped_newest = 0
+        self.high_watermark = 0
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    def __len__(self):
+        return self._count
+
+    def put(self, item):
+        """Adds one item. Returns False if the item itself was dropped."""
+        with self._lock:
+            stored = self._put_locked(item)
+            if self._count == self._wake_at:
+                self._not_empty.notify()
+            return stored
+
+    def put_many(self, items):
+        """Adds several items under a single lock acquisition. Returns the number stored."""
+        stored = 0
+        with self._lock:
+            before = self._count
+            for item in items:
+                if self._put_locked(item):
+                    stored += 1
+            if before < self._wake_at <= self._count:
+                self._not_empty.notify()
+        return stored
+
+    def _put_locked(self, item):
+        self.total_put += 1
+        if self._count == self._capacity:
+            if self.overflow_policy == DROP_NEWEST:
+                self.dropped_newest += 1
+                return False
+            # DROP_OLDEST: overwrite the oldest slot and advance the head past it.
+            self._items[self._head] = item
+            self._head = (self._head + 1) % self._capacity
+            self.dropped_oldest += 1
+            return True
+
+        self._items[(self._head + self._count) % self._capacity] = item
+        self._count += 1
+        if self._count > self.high_watermark:
+            self.high_watermark = self._count
+        return True
+
+    def drain(self, max_items=None):
+        """Removes and returns up to `max_items` pending items (all of them by default), oldest first."""
+        with self._lock:
+            n = self._count if max_items is None else min(self._count, max(0, int(max_items)))
+            if n == 0:
+                return []
+            start = self._head
+            end = start + n
+            if end <= self._capacity:
+                out = self._items[start:end]
+                self._items[start:end] = [None] * n
+            else:
+                wrap = end - self._capacity
+                out = self._items[start:] + self._items[:wrap]
+                self._items[start:] = [None] * (self._capacity - start)
+                self._items[:wrap] = [None] * wrap
+            self._head = end % self._capacity
+            self._count -= n
+            return out
+
+    def wait(self, timeout=None, min_items=1, linger=0.0):
+        """
+        Blocks until at least one item is pending or `timeout` expires. Returns True if items
+        are pending. With `linger`, once the first item is in, it keeps waiting up to `linger`
+        more seconds (never past `timeout`) for `min_items` to collect, so a consumer at a high
+        frame rate drains bursts instead of waking for every item. Producers only notify when
+        the pending count reaches the level a waiter is waiting for.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._not_empty:
+            if self._count == 0:
+                self._not_empty.wait(timeout)
+            if 0 < self._count < min_items and linger > 0:
+                if deadline is not None:
+                    linger = min(linger, deadline - time.monotonic())
+                if linger > 0:
+                    self._wake_at = min(min_items, self._capacity)
+                    try:
+                        self._not_empty.wait(linger)
+                    finally:
+                        self._wake_at = 1
+            return self._count > 0
+
+    def clear(self):
+        with self._lock:
+            self._items = [None] * self._capacity
+            self._head = 0
+            self._count = 0
+
+    def get_stats(self):
+        """Returns a snapshot of the buffer's counters."""
+        with self._lock:
+            return {
+                "pending": self._count,
+                "capacity": self._capacity,
+                "high_watermark": self.high_watermark,
+                "total_put": self.total_put,
+                "dropped_oldest": self.dropped_oldest,
+                "dropped_newest": self.dropped_newest,
+                "dropped": self.dropped_oldest + self.dropped_newest,
+            }
@@ -0,0 +1,112 @@
+# services/shared_stream_ring.py
+import time
+import numpy as np
+from multiprocessing import shared_memory
+
+_HEADER_BYTES = 64  # int64 write counter and int64 sequence, padded to a cache line
+_READ_ATTEMPTS = 50  # read_since() tries before giving up until the next call
+_READ_SPINS = 5      # Of those, how many only yield the CPU; later ones sleep _READ_BACKOFF
+_READ_BACKOFF = 0.0001
+
+class SharedStreamRing:
+    """
+    A single-writer, multi-reader ring of (int64 timestamp, float64 value) samples that
+    lives in a multiprocessing.shared_memory block.
+
+    Writes are guarded by a seqlock: the writer makes the sequence odd before it touches
+    any slot, stores the samples, advances the write counter and makes the sequence even
+    again. A reader notes the sequence before copying and retries if it was odd or has
+    changed by the end of the copy, so it never returns samples that a concurrent write
+    overwrote mid-copy. Readers keep their own cursor (the counter value they last read
+    up to) and copy out only what is new. A reader that keeps meeting writes backs off
+    and, after _READ_ATTEMPTS tries, returns nothing new rather than spinning on.
+    """
+
+    def __init__(self, shm, capacity, owner):
+        self._shm = shm
+        self.capacity = int(capacity)
+        self._owner = owner
+        buf = shm.buf
+        self._counter = np.ndarray((1,), dtype=np.int64, buffer=buf, offset=0)
+        self._sequence = np.ndarray((1,), dtype=np.int64, buffer=buf, offset=8)
+        self._timestamps = np.ndarray((self.capacity,), dtype=np.int64, buffer=buf, offset=_HEADER_BYTES)
+        self._values = np.ndarray((self.capacity,), dtype=np.float64, buffer=buf, offset=_HEADER_BYTES + 8 * self.capacity)
+
+    @classmethod
+    def create(cls, capacity):
+        size = _HEADER_BYTES + 16 * int(capacity)
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        ring = cls(shm, capacity, owner=True)
+        ring._counter[0] = 0
+        ring._sequence[0] = 0
+        return ring
+
+    @classmethod
+    def attach(cls, name, capacity):
+        # Processes started by multiprocessing share one resource tracker, so registering the
+        # block again here is a no-op and only the owner's unlink() releases it.
+        shm = shared_memory.SharedMemory(name=name)
+        return cls(shm, capacity, owner=False)
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    @property
+    def write_count(self):
+        return int(self._counter[0])
+
+    def write_many(self, timestamps, values):
+        """Appends samples. Only the most recent `capacity` samples of a large batch are kept."""
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        n = len(timestamps)
+        if n == 0: return
+        count = int(self._counter[0])
+        if n > self.capacity:
+            count += n - self.capacity
+            timestamps, values = timestamps[-self.capacity:], values[-self.capacity:]
+            n = self.capacity
+        start = count % self.capacity
+        first = min(n, self.capacity - start)
+        self._sequence[0] += 1  # Odd: slots are being overwritten
+        self._timestamps[start:start + first] = timestamps[:first]
+        self._values[start:start + first] = values[:first]
+        if first < n:
+            self._timestamps[:n - first] = timestamps[first:]
+            self._values[:n - first] = values[first:]
+        self._counter[0] = count + n
+        self._sequence[0] += 1
+
+    def read_since(self, cursor):
+        """
+        Returns (timestamps, values, new_cursor) for every sample written after `cursor`.
+        Samples the writer has already overwritten are skipped. If no consistent copy could
+        be made, no samples are returned and the cursor is kept, so the next call reads them.
+        """
+        for attempt in range(_READ_ATTEMPTS):
+            if attempt:
+                time.sleep(0 if attempt < _READ_SPINS else _READ_BACKOFF)
+            sequence = int(self._sequence[0])
+            if sequence & 1:
+                continue  # A write is in progress
+            end = int(self._counter[0])
+            start = max(cursor, end - self.capacity)
+            n = end - start
+            if n <= 0:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64), end
+            pos = start % self.capacity
+            first = min(n, self.capacity - pos)
+            timestamps = np.concatenate((self._timestamps[pos:pos + first], self._timestamps[:n - first]))
+            values = np.concatenate((self._values[pos:pos + first], self._values[:n - first]))
+            # A write during the copy may have overwritten part of it; retry from the newer position.
+            if int(self._sequence[0]) == sequence:
+                return timestamps, values, end
+            cursor = start
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64), cursor
+
+    def close(self):
+        self._counter = self._timestamps = self._values = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
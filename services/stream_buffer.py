@@ -0,0 +1,136 @@
+# services/stream_buffer.py
+import numpy as np
+
+class StreamBuffer:
+    """
+    A fixed-capacity history of (int64 timestamp, value) samples stored as two
+    preallocated NumPy arrays (struct of arrays).
+
+    The arrays hold twice the capacity. New samples are written after the newest one,
+    and only when the end of the storage is reached are the most recent samples moved
+    back to the front in a single slice copy. The live window is therefore always one
+    contiguous slice: `timestamps` and `values` are ordered views, never copies, and a
+    view stays unchanged until the next compaction (at most once per `capacity` appends).
+
+    `version` changes on every modification, so readers can cache anything derived from
+    the buffer. `write_count` is the number of samples ever appended: the window holds
+    the samples numbered write_count - len(self) up to write_count - 1. `generation`
+    changes when the contents are discarded by clear().
+    """
+
+    def __init__(self, capacity, value_dtype=np.float64):
+        self._capacity = max(1, int(capacity))
+        self._timestamps = np.empty(2 * self._capacity, dtype=np.int64)
+        self._values = np.empty(2 * self._capacity, dtype=value_dtype)
+        self._start = 0  # Index of the oldest sample in the window
+        self._end = 0    # One past the newest sample
+        self.version = 0
+        self.write_count = 0
+        self.generation = 0
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    @property
+    def value_dtype(self):
+        return self._values.dtype
+
+    @property
+    def nbytes(self):
+        """Memory held by the preallocated arrays."""
+        return self._timestamps.nbytes + self._values.nbytes
+
+    def bytes_for(self, capacity):
+        """Memory the arrays would hold at `capacity`."""
+        return 2 * int(capacity) * (8 + self._values.itemsize)
+
+    def __len__(self):
+        return self._end - self._start
+
+    @property
+    def timestamps(self):
+        return self._timestamps[self._start:self._end]
+
+    @property
+    def values(self):
+        return self._values[self._start:self._end]
+
+    def index_range(self, t_start=None, t_end=None):
+        """
+        Returns (i0, i1) such that timestamps[i0:i1] are the samples with t_start <= t <= t_end
+        (None leaves that side open). Timestamps must be non-decreasing, which holds for the
+        monotonic stream time base, so this is two binary searches.
+        """
+        timestamps = self.timestamps
+        i0 = 0 if t_start is None else int(np.searchsorted(timestamps, t_start, side="left"))
+        i1 = len(timestamps) if t_end is None else int(np.searchsorted(timestamps, t_end, side="right"))
+        return i0, max(i0, i1)
+
+    def append(self, timestamp, value):
+        if self._end == len(self._timestamps):
+            self._compact(1)
+        self._timestamps[self._end] = timestamp
+        self._values[self._end] = value
+        self._end += 1
+        if self._end - self._start > self._capacity:
+            self._start += 1
+        self.write_count += 1
+        self.version += 1
+
+    def append_many(self, timestamps, values):
+        """Appends a batch of samples. Only the most recent `capacity` samples of a large batch are kept."""
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        values = np.asarray(values, dtype=self._values.dtype)
+        n = len(timestamps)
+        if n == 0: return
+        if n >= self._capacity:
+            self._timestamps[:self._capacity] = timestamps[-self._capacity:]
+            self._values[:self._capacity] = values[-self._capacity:]
+            self._start, self._end = 0, self._capacity
+            self.write_count += n
+            self.version += 1
+            return
+        if self._end + n > len(self._timestamps):
+            self._compact(n)
+        self._timestamps[self._end:self._end + n] = timestamps
+        self._values[self._end:self._end + n] = values
+        self._end += n
+        self._start = max(self._start, self._end - self._capacity)
+        self.write_count += n
+        self.version += 1
+
+    def _compact(self, incoming):
+        # Keep only the samples that will still be inside the window once `incoming` more arrive.
+        keep = min(len(self), self._capacity - incoming)
+        if keep > 0:
+            self._timestamps[:keep] = self._timestamps[self._end - keep:self._end]
+            self._values[:keep] = self._values[self._end - keep:self._end]
+        self._start, self._end = 0, max(keep, 0)
+
+    def truncate(self, count):
+        """Removes the `count` newest samples; their numbers are reused by the next appends."""
+        count = min(int(count), len(self))
+        if count <= 0: return
+        self._end -= count
+        self.write_count -= count
+        self.version += 1
+
+    def clear(self):
+        self._start = self._end = 0
+        self.generation += 1
+        self.version += 1
+
+    def resize(self, capacity):
+        """Changes the capacity, keeping the most recent samples that still fit."""
+        capacity = max(1, int(capacity))
+        if capacity == self._capacity: return
+        keep = min(len(self), capacity)
+        timestamps = np.empty(2 * capacity, dtype=np.int64)
+        values = np.empty(2 * capacity, dtype=self._values.dtype)
+        timestamps[:keep] = self._timestamps[self._end - keep:self._end]
+        values[:keep] = self._values[self._end - keep:self._end]
+        self._timestamps, self._values = timestamps, values
+        self._capacity = capacity
+        self._start, self._end = 0, keep
+        self.version += 1
@@ -0,0 +1,83 @@
+# services/stream_decimator.py
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy import signal
+
+DECIMATION_METHODS = ("nth", "average", "cic", "fir")
+
+def decimation_taps(method, factor, cic_stages=3):
+    """
+    FIR taps (unity DC gain) for decimating by `factor`:
+      "nth"      keep every Nth sample (no filtering)
+      "average"  mean of each block of N samples
+      "cic"      cascaded integrator-comb response: `cic_stages` boxcars of length N
+      "fir"      windowed-sinc low-pass at 80% of the new Nyquist frequency
+    """
+    if method == "nth":
+        return np.ones(1)
+    if method == "average":
+        return np.full(factor, 1.0 / factor)
+    if method == "cic":
+        taps = np.ones(1)
+        for _ in range(cic_stages):
+            taps = np.convolve(taps, np.ones(factor))
+        return taps / taps.sum()
+    if method == "fir":
+        return signal.firwin(8 * factor + 1, 0.8 / factor)
+    raise ValueError(f"Unknown decimation method '{method}'. Expected one of {DECIMATION_METHODS}.")
+
+class StreamDecimator:
+    """
+    Streaming decimate-by-`factor` of (timestamp, value) batches with an FIR filter that is
+    only evaluated at the kept output positions, so the cost is one dot product of
+    len(taps) per output sample. The last len(taps)-1 inputs are carried between batches,
+    so the output is the same however the input is split. Each output is stamped with the
+    time at the centre of its filter window (the FIR group delay), keeping it aligned with
+    the raw stream. Before the window first fills, it is padded with the first sample.
+    """
+
+    def __init__(self, method, factor):
+        self.method = method
+        self.factor = max(1, int(factor))
+        self.taps = decimation_taps(method, self.factor)
+        self._reversed_taps = self.taps[::-1].copy()
+        self._history_times = None    # The last len(taps)-1 inputs
+        self._history_values = None
+        self._phase = 0               # Inputs still to skip before the next output
+
+    def reset(self):
+        self._history_times = self._history_values = None
+        self._phase = 0
+
+    def process(self, timestamps, values):
+        """Returns the decimated (timestamps, values) produced by this batch (possibly empty)."""
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        n = len(timestamps)
+        if n == 0 or self.factor == 1 and len(self.taps) == 1:
+            return timestamps, values
+        history = len(self.taps) - 1
+        if self._history_times is None:
+            self._history_times = np.full(history, timestamps[0], dtype=np.int64)
+            self._history_values = np.full(history, values[0])
+            # The first output uses the first block, like a block average starting at sample 0.
+            self._phase = self.factor - 1
+
+        ext_times = np.concatenate((self._history_times, timestamps))
+        ext_values = np.concatenate((self._history_values, values))
+        # Outputs end at the inputs numbered phase, phase + factor, ... of this batch.
+        ends = np.arange(self._phase, n, self.factor) + history
+        self._phase = (self._phase - n) % self.factor
+        if history:
+            self._history_times = ext_times[-history:]
+            self._history_values = ext_values[-history:]
+        if len(ends) == 0:
+            return timestamps[:0], values[:0]
+
+        windows = sliding_window_view(ext_values, len(self.taps))[ends - history]
+        out_values = windows @ self._reversed_taps
+        # Centre of each window; for an even length, halfway between the two middle samples.
+        lo = ends - history + history // 2
+        hi = ends - history + (history + 1) // 2
+        out_times = ext_times[lo] + (ext_times[hi] - ext_times[lo]) // 2
+        return out_times, out_values
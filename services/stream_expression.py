@@ -0,0 +1,177 @@
+# services/stream_expression.py
+"""
+A small expression language for derived streams, e.g.
+
+    motor_1_angle - 2.5*motor_2_angle
+    lowpass(diff(motor_3_velocity), 50Hz)
+    rms_window(motor_1_current_q, 100ms)
+
+Names are stream keys (a key that isn't a valid identifier can be written as a quoted
+string). Numbers may carry a unit: Hz/kHz for frequencies, s/ms/us for durations.
+Functions: diff, integrate, abs, lowpass(x, cutoff[, order]), highpass(x, cutoff[, order]),
+rms_window(x, seconds). Binary operators + - * / align the right operand to the left
+operand's timestamps.
+
+An expression is parsed once into a tree of canonical keys, and StreamExpressionCompiler
+turns it into CalculatedStream nodes. Identical subexpressions, within one expression or
+across expressions, map to the same node and are computed once.
+"""
+import ast
+import operator
+import re
+import numpy as np
+from services.calculated_stream import (SourceNode, ElementwiseNode, BinaryNode, DiffNode, IntegrateNode,
+                                        FilterNode, RmsWindowNode)
+
+_UNIT_SCALE = {"kHz": 1e3, "Hz": 1.0, "s": 1.0, "ms": 1e-3, "us": 1e-6}
+_UNIT_PATTERN = re.compile(r"(?<![\w.])(\d+\.?\d*(?:[eE][-+]?\d+)?|\.\d+(?:[eE][-+]?\d+)?)\s*(kHz|Hz|ms|us|s)\b")
+
+_BINARY_OPERATORS = {ast.Add: "+", ast.Sub: "-", ast.Mult: "*", ast.Div: "/"}
+_BINARY_FUNCS = {"+": np.add, "-": np.subtract, "*": np.multiply, "/": np.divide}
+_CONST_FUNCS = {"+": operator.add, "-": operator.sub, "*": operator.mul, "/": operator.truediv}
+
+# name -> (stream arguments, constant arguments (required, optional))
+_FUNCTIONS = {
+    "diff": (1, 0, 0),
+    "integrate": (1, 0, 0),
+    "abs": (1, 0, 0),
+    "lowpass": (1, 1, 1),
+    "highpass": (1, 1, 1),
+    "rms_window": (1, 1, 0),
+}
+
+def _replace_units(text):
+    return _UNIT_PATTERN.sub(lambda m: repr(float(m.group(1)) * _UNIT_SCALE[m.group(2)]), text)
+
+def parse_expression(text):
+    """
+    Parses `text` into a canonical tree of tuples:
+      ("src", key) | ("const", value) | ("bin", op, left, right) | ("call", name, arg, *constants)
+    Constant subexpressions are folded. Raises ValueError for anything outside the language.
+    """
+    try:
+        tree = ast.parse(_replace_units(text.strip()), mode="eval").body
+    except SyntaxError as e:
+        raise ValueError(f"Invalid expression '{text}': {e.msg}") from None
+    return _convert(tree)
+
+def _convert(node):
+    if isinstance(node, ast.Name):
+        return ("src", node.id)
+    if isinstance(node, ast.Constant):
+        if isinstance(node.value, str):
+            return ("src", node.value)
+        if isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+            return ("const", float(node.value))
+        raise ValueError(f"Unsupported constant {node.value!r}")
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        operand = _convert(node.operand)
+        if isinstance(node.op, ast.UAdd):
+            return operand
+        if operand[0] == "const":
+            return ("const", -operand[1])
+        return ("bin", "*", ("const", -1.0), operand)
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPERATORS:
+        op = _BINARY_OPERATORS[type(node.op)]
+        left, right = _convert(node.left), _convert(node.right)
+        if left[0] == "const" and right[0] == "const":
+            try:
+                return ("const", _CONST_FUNCS[op](left[1], right[1]))
+            except ZeroDivisionError:
+                raise ValueError("Division by zero in constant expression") from None
+        return ("bin", op, left, right)
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+        name = node.func.id
+        if name not in _FUNCTIONS or node.keywords:
+            raise ValueError(f"Unknown function '{name}'. Available: {', '.join(sorted(_FUNCTIONS))}")
+        streams, required, optional = _FUNCTIONS[name]
+        if not streams + required <= len(node.args) <= streams + required + optional:
+            raise ValueError(f"Wrong number of arguments for {name}()")
+        arg = _convert(node.args[0])
+        if arg[0] == "const":
+            raise ValueError(f"The first argument of {name}() must be a stream")
+        constants = []
+        for extra in node.args[1:]:
+            value = _convert(extra)
+            if value[0] != "const":
+                raise ValueError(f"Argument {len(constants) + 2} of {name}() must be a number")
+            constants.append(value[1])
+        return ("call", name, arg, *constants)
+    raise ValueError(f"Unsupported syntax in expression: '{ast.unparse(node)}'")
+
+def expression_sources(tree):
+    """Returns the set of stream keys an expression tree reads."""
+    if tree[0] == "src":
+        return {tree[1]}
+    if tree[0] == "bin":
+        return expression_sources(tree[2]) | expression_sources(tree[3])
+    if tree[0] == "call":
+        return expression_sources(tree[2])
+    return set()
+
+class StreamExpressionCompiler:
+    """
+    Builds and owns the node graph for every compiled expression. `resolve(key)` must
+    return (StreamBuffer, provisional count) for a stream key.
+    """
+
+    def __init__(self, resolve, capacity, value_dtype=np.float64):
+        self._resolve = resolve
+        self.capacity = capacity
+        self.value_dtype = value_dtype
+        self._nodes = {}  # canonical tree -> node
+
+    def compile(self, text):
+        """Parses `text` and returns the root node (shared with any identical subexpression)."""
+        tree = parse_expression(text)
+        if tree[0] == "const":
+            raise ValueError("An expression must read at least one stream")
+        return self._build(tree)
+
+    def nodes(self):
+        """Every node built so far (sources and calculated nodes)."""
+        return list(self._nodes.values())
+
+    def reset(self, capacity):
+        self.capacity = capacity
+        for node in self._nodes.values():
+            node.reset(capacity)
+
+    def _build(self, tree):
+        node = self._nodes.get(tree)
+        if node is not None:
+            return node
+        kind = tree[0]
+        args = (self.capacity, self.value_dtype)
+        if kind == "src":
+            node = SourceNode(tree[1], self._resolve)
+        elif kind == "bin":
+            op, left, right = tree[1], tree[2], tree[3]
+            func = _BINARY_FUNCS[op]
+            if left[0] == "const":
+                const = left[1]
+                node = ElementwiseNode(lambda v, f=func, c=const: f(c, v), self._build(right), *args)
+            elif right[0] == "const":
+                const = right[1]
+                node = ElementwiseNode(lambda v, f=func, c=const: f(v, c), self._build(left), *args)
+            else:
+                node = BinaryNode(func, self._build(left), self._build(right), *args)
+        elif kind == "call":
+            name, source, constants = tree[1], self._build(tree[2]), tree[3:]
+            if name == "diff":
+                node = DiffNode(source, *args)
+            elif name == "integrate":
+                node = IntegrateNode(source, *args)
+            elif name == "abs":
+                node = ElementwiseNode(np.abs, source, *args)
+            elif name in ("lowpass", "highpass"):
+                order = int(constants[1]) if len(constants) > 1 else 2
+                if constants[0] <= 0 or order < 1:
+                    raise ValueError(f"{name}() needs a positive cutoff and order")
+                node = FilterNode(source, constants[0], "low" if name == "lowpass" else "high", order, *args)
+            elif name == "rms_window":
+                if constants[0] <= 0:
+                    raise ValueError("rms_window() needs a positive window length")
+                node = RmsWindowNode(source, constants[0], *args)
+        self._nodes[tree] = node
+        return node
@@ -0,0 +1,129 @@
+# services/stream_stats.py
+import math
+import numpy as np
+from config import STATS_HISTOGRAM_BINS
+
+_MAX_DOUBLINGS = 64  # Bucket-width doublings per update, i.e. a range growth of up to 2**64
+
+class StreamStats:
+    """
+    Running statistics of every sample fed to update(), independent of any history length:
+    count, mean and variance (Welford, merged batch by batch with Chan's formula), min,
+    max, RMS and percentiles from a fixed-size histogram.
+
+    The histogram has `bins` equal-width buckets. Its range starts at the first samples
+    and, whenever a sample falls outside it, doubles its bucket width by merging bucket
+    pairs until the sample fits, so memory stays constant and percentiles stay within one
+    bucket width of the exact value. A single update widens it at most _MAX_DOUBLINGS
+    times; samples still outside go to the edge buckets. Non-finite samples (NaN, ±inf)
+    are ignored.
+    """
+
+    def __init__(self, bins=STATS_HISTOGRAM_BINS):
+        self.bins = int(bins) - int(bins) % 2  # Merging pairs needs an even count
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self._counts = np.zeros(self.bins, dtype=np.int64)
+        self._lo = 0.0      # Lower edge of the first bucket
+        self._width = 0.0   # Bucket width, 0 until the first sample
+
+    def update(self, values):
+        """Adds one sample or an array of samples."""
+        if isinstance(values, (float, int)):
+            self._update_one(float(values))
+            return
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[np.isfinite(values)]
+        n = len(values)
+        if n == 0: return
+
+        batch_mean = float(values.mean())
+        batch_m2 = float(((values - batch_mean) ** 2).sum()) if n > 1 else 0.0
+        total = self.count + n
+        delta = batch_mean - self.mean
+        self.mean += delta * n / total
+        self._m2 += batch_m2 + delta * delta * self.count * n / total
+        self.count = total
+        batch_min, batch_max = float(values.min()), float(values.max())
+        self.min, self.max = min(self.min, batch_min), max(self.max, batch_max)
+
+        self._fit_range(batch_min, batch_max)
+        # Clipped before the cast: samples beyond the histogram range can overflow int64.
+        indices = np.clip((values - self._lo) / self._width, 0, self.bins - 1).astype(np.int64)
+        self._counts += np.bincount(indices, minlength=self.bins)
+
+    def _update_one(self, value):
+        # Plain-Python path for single samples, which are too small for NumPy to pay off.
+        if not math.isfinite(value): return
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        if value < self.min: self.min = value
+        if value > self.max: self.max = value
+        self._fit_range(value, value)
+        index = int((value - self._lo) / self._width)
+        self._counts[min(max(index, 0), self.bins - 1)] += 1
+
+    def _fit_range(self, low, high):
+        if self._width == 0.0:
+            span = high / (self.bins - 1) - low / (self.bins - 1)  # Divided first so huge ranges don't overflow
+            self._lo = low
+            self._width = span if span > 0 else max(abs(low) * 1e-6, 1e-12)
+            return
+        for _ in range(_MAX_DOUBLINGS):
+            if self._lo <= low and high < self._lo + self._width * self.bins: break
+            # Merge bucket pairs into the half of the array facing away from the new sample.
+            merged = self._counts.reshape(-1, 2).sum(axis=1)
+            self._counts[:] = 0
+            if low < self._lo:
+                self._counts[self.bins // 2:] = merged
+                self._lo -= self._width * self.bins
+            else:
+                self._counts[:self.bins // 2] = merged
+            self._width *= 2
+
+    @property
+    def variance(self):
+        """Sample variance (ddof=1)."""
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    @property
+    def rms(self):
+        if not self.count: return 0.0
+        return math.sqrt(self._m2 / self.count + self.mean * self.mean)
+
+    @property
+    def peak(self):
+        """Largest absolute value."""
+        return max(abs(self.min), abs(self.max)) if self.count else 0.0
+
+    def percentile(self, q):
+        """Approximate q-th percentile (0..100), interpolated linearly inside the histogram bucket."""
+        if not self.count: return math.nan
+        target = q / 100.0 * self.count
+        cumulative = np.cumsum(self._counts)
+        index = int(np.searchsorted(cumulative, target, side="left"))
+        index = min(index, self.bins - 1)
+        below = cumulative[index - 1] if index else 0
+        in_bucket = self._counts[index]
+        fraction = (target - below) / in_bucket if in_bucket else 0.0
+        value = self._lo + (index + fraction) * self._width
+        return min(max(value, self.min), self.max)
+
+    def as_dict(self):
+        return {
+            "count": self.count, "mean": self.mean, "std": self.std, "min": self.min, "max": self.max,
+            "rms": self.rms, "peak": self.peak,
+            "p50": self.percentile(50), "p95": self.percentile(95), "p99": self.percentile(99),
+        }
@@ -4,6 +4,7 @@ import threading
 import numpy as np
 import math
 from scipy.optimize import curve_fit
+from utils import now_ns, ns_to_seconds
 
 class SysIdTunerService:
     def __init__(self, viewmodel):
@@ -45,25 +46,22 @@ class SysIdTunerService:
             time.sleep(0.2)
             
             velocity_stream_key = f"motor_{motor_id}_velocity"
-            velocity_stream = vm._data_service.get_stream_data(velocity_stream_key)
-            velocity_stream["timestamps"].clear()
-            velocity_stream["values"].clear()
+            vm._data_service.clear_stream(velocity_stream_key)
 
             # --- ADD THIS: Clear the gui_target stream ---
-            gui_target_stream = vm._data_service.get_stream_data("gui_target")
-            gui_target_stream["timestamps"].clear()
-            gui_target_stream["values"].clear()
+            vm._data_service.clear_stream("gui_target")
             # --- END ADD ---
 
+            # Commands and telemetry share the stream time base, so both are measured from the same origin.
             sent_commands = []
-            start_time = time.perf_counter()
+            start_ns = now_ns()
             
             duration = config["duration"]
             f0, f1 = config["start_freq"], config["end_freq"]
             amplitude = config["amplitude"]
             
-            while time.perf_counter() - start_time < duration and self.is_active:
-                t = time.perf_counter() - start_time
+            while (now_ns() - start_ns) * 1e-9 < duration and self.is_active:
+                t = (now_ns() - start_ns) * 1e-9
                 k = (f1 / f0)**(t / duration)
                 instantaneous_phase = 2 * np.pi * duration * f0 * (k - 1) / np.log(f1 / f0)
                 torque_cmd = amplitude * np.sin(instantaneous_phase)
@@ -77,14 +75,13 @@ class SysIdTunerService:
             
             vm.sysid_status = "2/4: Aligning data..."
             
-            history = vm._data_service.get_stream_data(velocity_stream_key)
-            measured_times = np.array(list(history["timestamps"]))
-            measured_velocities = np.array(list(history["values"]))
+            history = vm._data_service.snapshot_stream(velocity_stream_key, t_start=start_ns)
+            measured_times = ns_to_seconds(history["timestamps"], start_ns)
+            measured_velocities = history["values"]
             
             if len(measured_times) < 50:
                 raise ValueError("Not enough telemetry data for analysis.")
                 
-            measured_times -= measured_times[0]
             cmd_times, cmd_torques = zip(*sent_commands)
             aligned_velocities = np.interp(cmd_times, measured_times, measured_velocities)
             
@@ -0,0 +1,105 @@
+# services/telemetry_events.py
+import threading
+
+class TelemetryEvents:
+    """
+    Publishes the events decoded from received frames ('telemetry', 'status_feedback',
+    'param_response', 'char_response', ...) to subscribers as soon as they are decoded,
+    so control loops and test sequencers can react to a frame instead of polling.
+
+    - subscribe(callback, event_type, motor_id) calls `callback(event_type, data)` on the
+      publishing thread for every matching event. Callbacks must return quickly.
+    - wait_for(predicate, timeout) blocks on a threading.Condition until `predicate()`
+      is true, re-checking it after every published batch.
+    - wait_for_event()/wait_for_sample() block until a newer event of one type (and
+      motor) than a given sequence number arrives. Take `sequence()` before sending a
+      request so a response that arrives before the wait starts isn't missed.
+
+    Where events come from, and how late they are:
+    - Local CAN (and replay): the viewmodel publishes from the CAN reader threads as each
+      message or raw FrameBatch is queued, decoded by MotorService.decode_events(). A
+      waiter wakes within a thread switch of the frame being read (tens of microseconds
+      plus any GIL wait), and subscriber callbacks run on the reader thread. Every event
+      carries 'timestamp_ns', the frame's receive time on the stream time base. Each
+      telemetry frame is one event. The Motor objects and DataService streams are updated
+      later by the GUI loop, so read the sample from the event (or latest()), not from them.
+    - CAN_PROCESS_MODE: the child sends its events once per CAN_PROCESS_CYCLE, and the GUI
+      loop publishes them after applying them to the Motor objects. Latency is then up to
+      CAN_PROCESS_CYCLE plus one main-loop frame, and there is one telemetry event per motor
+      per cycle.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._subscribers = {}  # token -> (callback, event_type or None, motor_id or None)
+        self._next_token = 0
+        self._latest = {}  # (event_type, motor_id) -> (sequence, data); motor_id None covers any motor
+
+    def subscribe(self, callback, event_type=None, motor_id=None):
+        """Registers `callback(event_type, data)`. None matches any event type or motor. Returns a token for unsubscribe()."""
+        with self._condition:
+            token = self._next_token
+            self._next_token += 1
+            self._subscribers[token] = (callback, event_type, motor_id)
+            return token
+
+    def unsubscribe(self, token):
+        with self._condition:
+            self._subscribers.pop(token, None)
+
+    def publish(self, events):
+        """Delivers a batch of (event_type, data) tuples to subscribers and wakes every waiter once."""
+        if not events: return
+        with self._condition:
+            for event_type, data in events:
+                motor_id = _motor_id(data)
+                for key in ((event_type, motor_id), (event_type, None)):
+                    sequence = self._latest.get(key, (0, None))[0]
+                    self._latest[key] = (sequence + 1, data)
+            subscribers = list(self._subscribers.values())
+            self._condition.notify_all()
+        for event_type, data in events:
+            motor_id = _motor_id(data)
+            for callback, wanted_type, wanted_motor in subscribers:
+                if (wanted_type is None or wanted_type == event_type) and (wanted_motor is None or wanted_motor == motor_id):
+                    try:
+                        callback(event_type, data)
+                    except Exception as e:
+                        print(f"Error in telemetry subscriber {callback!r}: {e}")
+
+    def sequence(self, event_type, motor_id=None):
+        """Number of `event_type` events published so far (for `motor_id`, or for any motor)."""
+        with self._condition:
+            return self._latest.get((event_type, motor_id), (0, None))[0]
+
+    def latest(self, event_type, motor_id=None):
+        """Returns the data of the newest `event_type` event (for `motor_id`, or any motor), or None."""
+        with self._condition:
+            return self._latest.get((event_type, motor_id), (0, None))[1]
+
+    def wait_for(self, predicate, timeout=None):
+        """Blocks until `predicate()` is true or `timeout` seconds pass. Returns the last result of `predicate()`."""
+        with self._condition:
+            return self._condition.wait_for(predicate, timeout)
+
+    def wait_for_event(self, event_type, motor_id=None, timeout=None, after=None):
+        """
+        Blocks until an `event_type` event newer than sequence number `after` arrives (by
+        default, newer than the one current at the call) and returns its data, or None on timeout.
+        """
+        key = (event_type, motor_id)
+        with self._condition:
+            if after is None:
+                after = self._latest.get(key, (0, None))[0]
+            if not self._condition.wait_for(lambda: self._latest.get(key, (0, None))[0] > after, timeout):
+                return None
+            return self._latest[key][1]
+
+    def wait_for_sample(self, motor_id, timeout=None, after=None):
+        """Blocks until a new telemetry sample of `motor_id` arrives and returns it ({'angle', 'velocity', 'current_q', ...}), or None on timeout."""
+        return self.wait_for_event('telemetry', motor_id, timeout, after)
+
+def _motor_id(data):
+    if isinstance(data, dict):
+        return data.get('motor_id')
+    return getattr(data, 'id', None)
@@ -3,6 +3,7 @@ import time
 import threading
 import numpy as np
 from services.analysis_service import AnalysisService
+from utils import now_ns
 
 class TuningService:
     def __init__(self, viewmodel):
@@ -35,30 +36,30 @@ class TuningService:
             time.sleep(0.2)
 
             # --- ADD THIS: Clear the gui_target stream ---
-            gui_target_stream = vm._data_service.get_stream_data("gui_target")
-            gui_target_stream["timestamps"].clear()
-            gui_target_stream["values"].clear()
+            vm._data_service.clear_stream("gui_target")
             # --- END ADD ---
 
-            relay_data = []
-            start_time = time.time()
+            relay_data = []  # (seconds since start on the stream time base, velocity)
+            start_ns = now_ns()
             last_output = 0
+            seen = vm.telemetry.sequence('telemetry', motor_id)
 
-            while time.time() - start_time < duration and vm.autotune_active:
-                motor_state = vm.get_motor_by_id(motor_id)
-                if not motor_state:
-                    time.sleep(0.01)
+            # The relay switches on each telemetry sample as it is decoded.
+            while now_ns() - start_ns < duration * 1e9 and vm.autotune_active:
+                sample = vm.telemetry.wait_for_sample(motor_id, timeout=0.1, after=seen)
+                if sample is None:
                     continue
+                seen = vm.telemetry.sequence('telemetry', motor_id)
                 
-                current_velocity = motor_state.velocity
+                current_velocity = sample['velocity']
                 output = relay_amplitude if current_velocity <= 0 else -relay_amplitude
                 
                 if output != last_output:
                     vm.send_target_to_motor(motor_id, output)
                     last_output = output
                     
-                relay_data.append((time.time(), current_velocity))
-                time.sleep(0.01)
+                # Stamp with the frame's receive time so decode and wakeup latency don't skew the period.
+                relay_data.append(((sample['timestamp_ns'] - start_ns) * 1e-9, current_velocity))
 
             if not vm.autotune_active:
                 vm.autotune_status = "Canceled."
@@ -68,7 +69,10 @@ class TuningService:
             vm.autotune_status = "2/3: Analyzing response..."
             vm.send_target_to_motor(motor_id, 0.0)
 
-            stable_data = np.array([d for d in relay_data if d[0] > start_time + (duration / 4)])
+            # Skip the first quarter of the test while the oscillation builds up; samples are in time order.
+            relay_data = np.array(relay_data)
+            if len(relay_data) < 20: raise ValueError("Not enough stable data.")
+            stable_data = relay_data[np.searchsorted(relay_data[:, 0], duration / 4, side="right"):]
             if len(stable_data) < 20: raise ValueError("Not enough stable data.")
                 
             velocities = stable_data[:, 1]
@@ -110,16 +114,14 @@ class TuningService:
         vm = self._viewmodel
         try:
             stream_key = f"motor_{motor_id}_current_q"
-            vm._data_service.get_stream_data(stream_key)["timestamps"].clear()
-            vm._data_service.get_stream_data(stream_key)["values"].clear()
+            vm._data_service.clear_stream(stream_key)
             
             # --- ADD THIS: Clear the gui_target stream ---
-            gui_target_stream = vm._data_service.get_stream_data("gui_target")
-            gui_target_stream["timestamps"].clear()
-            gui_target_stream["values"].clear()
+            vm._data_service.clear_stream("gui_target")
             # --- END ADD ---
             
             vm.log_message("Current Test: Starting...")
+            start_ns = now_ns()
             vm.send_control_mode_to_motor(motor_id, "Torque")
             time.sleep(0.1)
             vm.send_target_to_motor(motor_id, amplitude)
@@ -128,9 +130,9 @@ class TuningService:
             time.sleep(0.2)
             vm.log_message("Current Test: Finished.")
 
-            stream_data = vm._data_service.get_stream_data(stream_key)
-            timestamps = list(stream_data["timestamps"])
-            currents = list(stream_data["values"])
+            stream_data = vm._data_service.snapshot_stream(stream_key, t_start=start_ns)
+            timestamps = stream_data["timestamps"]
+            currents = stream_data["values"]
             
             stats = self._analysis_service.analyze_step_response(timestamps, currents, amplitude)
             vm.current_test_results = stats
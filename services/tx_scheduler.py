@@ -0,0 +1,127 @@
+# services/tx_scheduler.py
+import collections
+import threading
+from config import CAN_TX_PRIORITY_BURST
+
+class TxScheduler:
+    """
+    Owns the transmit side of the bus on a dedicated thread.
+
+    Frames arrive through two lanes:
+      - The priority lane is a FIFO for enable/disable, configuration and any other
+        frame whose every instance matters. It is served first, but after
+        `priority_burst` priority frames in a row one waiting slot goes out, so a
+        steady stream of commands can't starve the setpoints.
+      - Latest-value slots hold one frame per key, normally (motor ID, register).
+        A new setpoint overwrites the one still waiting in its slot, so a stale
+        setpoint is never sent after a fresher one and the backlog can't grow beyond
+        one frame per slot.
+
+    A priority frame submitted for a node drops the frames still waiting in that node's
+    slots (keys whose first element is the node), so a setpoint queued before a
+    command can't go out after it.
+    """
+
+    def __init__(self, send_func, priority_burst=CAN_TX_PRIORITY_BURST):
+        self._send = send_func
+        self.priority_burst = priority_burst
+        self._priority_run = 0  # Priority frames sent in a row while slots were waiting
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._priority = collections.deque()
+        self._slots = {}  # key -> pending message, served in insertion order
+        self._thread = None
+        self._is_running = False
+
+        # Metrics
+        self.sent_priority = 0
+        self.sent_latest = 0
+        self.coalesced = 0
+        self.superseded = 0
+        self.send_errors = 0
+        self.max_priority_depth = 0
+        self.max_slot_depth = 0
+
+    def start(self):
+        if self._is_running: return
+        self._is_running = True
+        self._thread = threading.Thread(target=self._tx_thread_func, daemon=True)
+        self._thread.start()
+
+    def stop(self, flush_timeout=0.5):
+        """Stops the TX thread after giving pending frames up to `flush_timeout` seconds to go out."""
+        if not self._is_running: return
+        with self._wakeup:
+            if flush_timeout:
+                self._wakeup.wait_for(lambda: not self._priority and not self._slots, timeout=flush_timeout)
+            self._is_running = False
+            self._wakeup.notify_all()
+        if self._thread: self._thread.join(timeout=1)
+        with self._lock:
+            self._priority.clear()
+            self._slots.clear()
+
+    def submit(self, message, node=None):
+        """Queues a frame on the priority lane, dropping the frames waiting in the slots of `node` if given."""
+        with self._wakeup:
+            if node is not None and self._slots:
+                stale = [key for key in self._slots if isinstance(key, tuple) and key[0] == node]
+                for key in stale:
+                    del self._slots[key]
+                self.superseded += len(stale)
+            self._priority.append(message)
+            if len(self._priority) > self.max_priority_depth:
+                self.max_priority_depth = len(self._priority)
+            self._wakeup.notify_all()
+
+    def submit_latest(self, key, message):
+        """Places a frame in the latest-value slot for `key`, replacing any frame still waiting there."""
+        with self._wakeup:
+            if key in self._slots:
+                self.coalesced += 1
+            self._slots[key] = message
+            if len(self._slots) > self.max_slot_depth:
+                self.max_slot_depth = len(self._slots)
+            self._wakeup.notify_all()
+
+    def _tx_thread_func(self):
+        while True:
+            with self._wakeup:
+                while self._is_running and not self._priority and not self._slots:
+                    self._wakeup.wait(timeout=0.1)
+                if not self._is_running:
+                    return
+                if self._priority and not (self._slots and self._priority_run >= self.priority_burst):
+                    message = self._priority.popleft()
+                    is_priority = True
+                    self._priority_run = self._priority_run + 1 if self._slots else 0
+                else:
+                    key = next(iter(self._slots))
+                    message = self._slots.pop(key)
+                    is_priority = False
+                    self._priority_run = 0
+                self._wakeup.notify_all()
+
+            try:
+                self._send(message)
+                if is_priority: self.sent_priority += 1
+                else: self.sent_latest += 1
+            except Exception as e:
+                self.send_errors += 1
+                print(f"Error in CAN TX thread: {e}")
+
+    def get_stats(self):
+        """Returns a snapshot of the TX queue metrics."""
+        with self._lock:
+            return {
+                "priority_depth": len(self._priority),
+                "slot_depth": len(self._slots),
+                "depth": len(self._priority) + len(self._slots),
+                "max_priority_depth": self.max_priority_depth,
+                "max_slot_depth": self.max_slot_depth,
+                "sent_priority": self.sent_priority,
+                "sent_latest": self.sent_latest,
+                "coalesced": self.coalesced,
+                "superseded": self.superseded,
+                "send_errors": self.send_errors,
+            }
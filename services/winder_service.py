@@ -86,7 +86,9 @@ class WinderService:
                     time.sleep(0.01)
                     continue
 
-                current_bobbin_angle = bobbin_motor.angle
+                # The newest decoded sample; the Motor object only catches up on the next GUI frame.
+                sample = vm.telemetry.latest('telemetry', bobbin_id)
+                current_bobbin_angle = sample['angle'] if sample else bobbin_motor.angle
                 dyn["progress_angle"] = abs(current_bobbin_angle - dyn["start_angle"])
                 
                 target_velocity = 0.0
@@ -133,7 +135,8 @@ class WinderService:
                     vm.send_target_to_motor(tension_id, config.get("holding_torque", 0))
                     vm.winder_status = "Finished. Holding tension."
 
-                time.sleep(0.01)
+                # Re-check progress as soon as the bobbin reports a new angle, and at least every 10 ms.
+                vm.telemetry.wait_for_sample(bobbin_id, timeout=0.01)
 
         except Exception as e:
             vm.log_message(f"Winder FATAL ERROR: {e}")
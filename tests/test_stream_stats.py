@@ -0,0 +1,45 @@
+# tests/test_stream_stats.py
+import math
+import numpy as np
+from services.data_service import DataService
+from services.stream_stats import StreamStats
+
+def test_infinite_samples_are_ignored():
+    stats = StreamStats()
+    stats.update([1.0, 2.0])
+    stats.update([math.inf])
+    stats.update(-math.inf)
+    stats.update(np.array([3.0, -np.inf, np.nan]))
+    assert stats.count == 3
+    assert (stats.min, stats.max) == (1.0, 3.0)
+    assert 1.0 <= stats.percentile(50) <= 3.0
+
+def test_only_infinite_samples_leave_stats_empty():
+    stats = StreamStats()
+    stats.update([math.inf, -math.inf])
+    assert stats.count == 0
+    assert stats.as_dict()["mean"] == 0.0
+
+def test_huge_finite_range_terminates():
+    stats = StreamStats()
+    stats.update([0.0, 1e-9])
+    stats.update([1e100, -1e100])  # Further than _MAX_DOUBLINGS can reach
+    assert (stats.min, stats.max) == (-1e100, 1e100)
+
+def test_division_by_zero_stream_stats():
+    data = DataService()
+    data.register_expression_stream("r", "a / b")
+    data.enable_stats("r")
+    for i in range(5):
+        data.add_data_point("a", i * 1_000_000, 1.0)
+        data.add_data_point("b", i * 1_000_000, float(i % 2))
+    stats = data.get_stats("r")
+    assert stats["count"] > 0
+    assert math.isfinite(stats["max"])
+
+def test_samples_beyond_the_range_land_in_the_edge_buckets():
+    stats = StreamStats()
+    stats.update([0.0, 1e-9])
+    stats.update([1e100, 1e100, 1e100])
+    assert stats._counts[-1] == 3
+    assert stats.max == 1e100
@@ -2,11 +2,18 @@
 import dearpygui.dearpygui as dpg
 from config import *
 import numpy as np
+import time
+from utils import ns_to_seconds
 
 class UIManager:
     def __init__(self, viewmodel):
         self._viewmodel = viewmodel
         self._ui_needs_rebuild = False
+        self._plotted_versions = {}  # series dpg tag -> (stream version, max_points, time origin) last drawn
+        self._series_bounds = {}     # series dpg tag -> (x_min, x_max, y_min, y_max) of the data last drawn
+        self._axis_bounds = {}       # (plot id, 'x' or Y-axis index) -> (min, max) the axis was last fitted to
+        self._panel_refreshed = {}   # plot id -> time.perf_counter() of its last refresh
+        self._stats_counts = {}      # stats text dpg tag -> sample count it last showed
 
     def create_all_ui_panels(self):
         # The main window now has the correct tag for the set_primary_window call in main.py
@@ -41,6 +48,8 @@ class UIManager:
                     self.create_plots_area(parent="right_panel")
                     self._create_log_panel()
 
+        self._create_profiler_window()
+
     def rebuild_dynamic_ui(self):
         self._ui_needs_rebuild = True
 
@@ -53,6 +62,11 @@ class UIManager:
             
             self._build_plot_manager_content(parent="plot_manager_content")
             self._build_plots_area_content(parent="plots_area_content")
+            # The series were recreated: draw them all again on the next update.
+            self._plotted_versions.clear()
+            self._series_bounds.clear()
+            self._axis_bounds.clear()
+            self._stats_counts.clear()
 
             # --- FIX: Moved this logic inside the rebuild block ---
             if dpg.does_item_exist("sync_motor_list_window"):
@@ -252,6 +266,7 @@ class UIManager:
             with dpg.group(horizontal=True):
                 dpg.add_button(label="Plan and Execute Move", width=190, callback=self._viewmodel.plan_and_execute_trajectory)
                 dpg.add_button(label="Broadcast SYNC", width=190, callback=self._viewmodel.send_sync)
+            dpg.add_checkbox(label="Periodic SYNC (kernel-timed)", tag="periodic_sync_checkbox", callback=lambda s, a: self._viewmodel.set_periodic_sync(a))
             
             dpg.add_separator()
             dpg.add_text("Status Feedback (from selected motor):")
@@ -644,6 +659,14 @@ class UIManager:
                     dpg.add_button(label="Create", callback=lambda: self._viewmodel.create_derivative_signal(dpg.get_value("deriv_name"), dpg.get_value("deriv_combo")))
                     dpg.add_button(label="Cancel", callback=lambda: self.close_popups())
 
+            with dpg.window(label="Create Expression Signal", modal=True, show=False, tag="modal_expression", width=500):
+                dpg.add_input_text(label="Signal Name", tag="expr_name")
+                dpg.add_input_text(label="Expression", tag="expr_text", hint="e.g. lowpass(diff(motor_1_velocity), 50Hz)")
+                dpg.add_text("Functions: diff, integrate, abs, lowpass(x, Hz), highpass(x, Hz), rms_window(x, s)", color=[150, 150, 150])
+                with dpg.group(horizontal=True):
+                    dpg.add_button(label="Create", callback=lambda: self._viewmodel.create_expression_signal(dpg.get_value("expr_name"), dpg.get_value("expr_text")))
+                    dpg.add_button(label="Cancel", callback=lambda: self.close_popups())
+
     def _create_general_settings_panel(self):
         with dpg.collapsing_header(label="General Settings", default_open=False):
             with dpg.table(header_row=False):
@@ -656,15 +679,60 @@ class UIManager:
                 with dpg.table_row():
                     dpg.add_text("Packet Rate")
                     dpg.add_text("--", tag="actual_freq_text")
+                with dpg.table_row():
+                    dpg.add_text("Dropped Frames")
+                    dpg.add_text("0", tag="dropped_frames_text")
+                with dpg.table_row():
+                    dpg.add_text("TX Queue")
+                    dpg.add_text("--", tag="tx_queue_text")
                 with dpg.table_row():
                     dpg.add_text("Plot FPS")
                     dpg.add_text("--", tag="plot_fps_text")
+                with dpg.table_row():
+                    dpg.add_text("Profiler")
+                    dpg.add_checkbox(label="Show Frame Profiler", default_value=False, tag="profiler_checkbox",
+                                     callback=lambda s, a: self._viewmodel.set_profiler_state(a))
                 with dpg.table_row():
                     dpg.add_text("Plot Controls")
                     dpg.add_checkbox(label="Pause Plots", default_value=False, callback=lambda s, a: self._viewmodel.set_plot_pause_state(a))
+                with dpg.table_row():
+                    dpg.add_text("Recording")
+                    dpg.add_checkbox(label="Record to Disk", default_value=False, callback=lambda s, a: self._viewmodel.set_recording_state(a))
+                with dpg.table_row():
+                    dpg.add_text("Replay")
+                    dpg.add_input_text(tag="replay_path_input", hint="recording dir or .asc/.log file", width=-1)
+                with dpg.table_row():
+                    dpg.add_text("Replay Speed")
+                    with dpg.group(horizontal=True):
+                        dpg.add_combo(("1x", "2x", "10x", "Max"), default_value="1x", width=60, tag="replay_speed_combo",
+                                      callback=lambda s, a: self._viewmodel.set_replay_speed(self._replay_speed(a)))
+                        dpg.add_button(label="Start", callback=lambda: self._viewmodel.start_replay(
+                            dpg.get_value("replay_path_input"), self._replay_speed(dpg.get_value("replay_speed_combo"))))
+                        dpg.add_button(label="Stop", callback=self._viewmodel.stop_replay)
+                with dpg.table_row():
+                    dpg.add_text("Replay Seek (s)")
+                    dpg.add_input_float(default_value=0.0, width=-1, on_enter=True, callback=lambda s, a: self._viewmodel.seek_replay(a))
+                with dpg.table_row():
+                    dpg.add_text("Stream Memory")
+                    with dpg.group(horizontal=True):
+                        dpg.add_text("--", tag="stream_memory_text")
+                        dpg.add_button(label="Report", small=True, callback=lambda: self._viewmodel.log_memory_report())
                 with dpg.table_row():
                     dpg.add_text("History (points)")
-                    dpg.add_slider_int(default_value=1000, min_value=100, max_value=10000, width=-1, callback=lambda s, a: self._viewmodel.set_plot_history_length(a))
+                    dpg.add_slider_int(default_value=1000, min_value=100, max_value=1000000, width=-1, callback=lambda s, a: self._viewmodel.set_plot_history_length(a))
+
+    @staticmethod
+    def _replay_speed(label):
+        # "Max" plays as fast as frames are drained (speed 0).
+        return 0.0 if label == "Max" else float(label.rstrip("x"))
+
+    def _create_profiler_window(self):
+        with dpg.window(label="Frame Profiler", show=False, tag="profiler_window", width=460, height=420, pos=(1000, 60),
+                        on_close=lambda: self._viewmodel.set_profiler_state(False)):
+            dpg.add_button(label="Reset", small=True, callback=lambda: self._viewmodel.reset_profiler())
+            dpg.add_text("", tag="profiler_stages_text")
+            dpg.add_separator()
+            dpg.add_text("", tag="profiler_worst_text")
 
     def _create_log_panel(self):
         with dpg.child_window(height=150, border=True):
@@ -678,61 +746,143 @@ class UIManager:
         self.rebuild_dynamic_ui()
 
     def _build_plot_manager_content(self, parent):
-        with dpg.table(header_row=False, parent=parent):
-            dpg.add_table_column(width_fixed=True)
-            dpg.add_table_column(width_stretch=True)
-            with dpg.table_row():
-                dpg.add_text("Add Plottable Signal")
-                dpg.add_combo(self._viewmodel.get_available_data_keys(), tag="combo_add_series", width=-1,
-                              callback=lambda s, a: self._viewmodel.add_series_to_plot(a))
-        
+        all_keys = self._viewmodel.get_available_data_keys()
+        axis_names = [f"Y{i + 1}" for i in range(PLOT_Y_AXES)]
+        for plot in self._viewmodel.plots:
+            with dpg.group(horizontal=True, parent=parent):
+                dpg.add_text(plot.name)
+                dpg.add_combo(("60 Hz", "30 Hz", "10 Hz", "5 Hz", "1 Hz"), default_value=f"{plot.refresh_hz:g} Hz", width=70,
+                              callback=lambda s, a, u: self._viewmodel.set_plot_refresh_rate(u, float(a.replace(" Hz", ""))), user_data=plot.id)
+                if len(self._viewmodel.plots) > 1:
+                    dpg.add_button(label="Remove Panel", small=True, callback=lambda s, a, u: self._viewmodel.remove_plot_panel(u), user_data=plot.id)
+            with dpg.table(header_row=False, parent=parent):
+                dpg.add_table_column(width_fixed=True)
+                dpg.add_table_column(width_stretch=True)
+                with dpg.table_row():
+                    dpg.add_text("Add Plottable Signal")
+                    dpg.add_combo(all_keys, width=-1, callback=lambda s, a, u: self._viewmodel.add_series_to_plot(a, u), user_data=plot.id)
+            for series in plot.series_list:
+                with dpg.group(horizontal=True, parent=parent):
+                    dpg.add_text(f" - {series.data_key}")
+                    dpg.add_combo(axis_names, default_value=axis_names[series.y_axis], width=45,
+                                  callback=lambda s, a, u: self._viewmodel.set_series_axis(u, int(a[1:]) - 1), user_data=series.id)
+                    dpg.add_button(label="x", small=True, callback=lambda s, a, u: self._viewmodel.remove_series(u), user_data=series.id)
+                    dpg.add_button(label="reset", small=True, callback=lambda s, a, u: self._viewmodel.reset_stream_stats(u), user_data=series.data_key)
+                    policy = self._viewmodel.get_stream_retention(series.data_key)
+                    dpg.add_input_float(label="s kept", width=70, step=0, format="%.1f", on_enter=True,
+                                        default_value=float(policy.seconds) if policy and policy.seconds else 0.0,
+                                        callback=lambda s, a, u: self._viewmodel.set_stream_retention_seconds(u, a), user_data=series.data_key)
+                dpg.add_text("", tag=f"stats_{series.id}", parent=parent, color=(180, 180, 180))
+            dpg.add_separator(parent=parent)
+        dpg.add_button(label="Add Plot Panel", width=-1, parent=parent, callback=lambda: self._viewmodel.add_plot_panel())
+
         dpg.add_separator(parent=parent)
         dpg.add_text("Calculated Signals", parent=parent)
         dpg.add_button(label="Following Error (A - B)", width=-1, parent=parent, 
                        callback=lambda: dpg.configure_item("modal_following_error", show=True))
         dpg.add_button(label="Derivative (d/dt)", width=-1, parent=parent,
                        callback=lambda: dpg.configure_item("modal_derivative", show=True))
-        dpg.add_separator(parent=parent)
+        dpg.add_button(label="Expression...", width=-1, parent=parent,
+                       callback=lambda: dpg.configure_item("modal_expression", show=True))
 
-        dpg.add_text("Active Series", parent=parent)
-        for series in self._viewmodel.the_plot.series_list:
-            with dpg.group(horizontal=True, parent=parent):
-                dpg.add_text(f" - {series.data_key}")
-                dpg.add_button(label="x", small=True, callback=lambda s, a, u: self._viewmodel.remove_series(u), user_data=series.id)
-        
-        all_keys = self._viewmodel.get_available_data_keys()
         if dpg.does_item_exist("fe_combo1"):
             dpg.configure_item("fe_combo1", items=all_keys)
             dpg.configure_item("fe_combo2", items=all_keys)
             dpg.configure_item("deriv_combo", items=all_keys)
 
     def _build_plots_area_content(self, parent):
-        plot_config = self._viewmodel.the_plot
-        plot_config.dpg_tag = dpg.add_plot(label=plot_config.name, height=-1, width=-1, parent=parent)
-        dpg.add_plot_legend(parent=plot_config.dpg_tag)
-        dpg.add_plot_axis(dpg.mvXAxis, label="Time (s)", parent=plot_config.dpg_tag)
-        
-        y_axis_tag = dpg.add_plot_axis(dpg.mvYAxis, label="Value", parent=plot_config.dpg_tag)
-        
-        for series_config in plot_config.series_list:
-            series_config.dpg_tag = dpg.add_line_series([], [], label=series_config.data_key, parent=y_axis_tag)
-    
+        # One subplot row per panel; linking the X axes keeps every panel on the same time window.
+        plots = self._viewmodel.plots
+        y_axes = (dpg.mvYAxis, dpg.mvYAxis2, dpg.mvYAxis3)[:PLOT_Y_AXES]
+        with dpg.subplots(len(plots), 1, link_all_x=True, height=-1, width=-1, parent=parent):
+            for plot_config in plots:
+                plot_config.dpg_tag = dpg.add_plot(label=plot_config.name, height=-1, width=-1)
+                dpg.add_plot_legend(parent=plot_config.dpg_tag)
+                plot_config.x_axis_tag = dpg.add_plot_axis(dpg.mvXAxis, label="Time (s)", parent=plot_config.dpg_tag)
+
+                # Axes beyond the first only exist while a series uses them.
+                axis_count = max((s.y_axis for s in plot_config.series_list), default=0) + 1
+                plot_config.y_axis_tags = []
+                for axis in range(axis_count):
+                    keys = [s.data_key for s in plot_config.series_list if s.y_axis == axis]
+                    plot_config.y_axis_tags.append(dpg.add_plot_axis(y_axes[axis], label=", ".join(keys) or "Value", parent=plot_config.dpg_tag))
+
+                for series_config in plot_config.series_list:
+                    series_config.dpg_tag = dpg.add_line_series([], [], label=series_config.data_key,
+                                                                parent=plot_config.y_axis_tags[series_config.y_axis])
+
     def update_plots_data(self):
+        """
+        Pushes new data to the plot panels. Each panel refreshes at most refresh_hz times a
+        second. Series whose stream hasn't changed since they were last drawn are skipped,
+        arrays go to DearPyGui as contiguous float64 buffers instead of lists, and axes are
+        refitted only when their data bounds move.
+        """
         if self._viewmodel.is_plot_paused: return
-        plot = self._viewmodel.the_plot
-
-        if not dpg.does_item_exist(plot.dpg_tag): return
-        
+        plots = self._viewmodel.plots
+        now = time.perf_counter()
+        # The fastest panel with data fits the shared time axis; the others follow through the link.
+        time_panel = max((p for p in plots if any(s.dpg_tag in self._series_bounds for s in p.series_list)),
+                         key=lambda p: p.refresh_hz, default=None)
+        changed = False
+        for plot in plots:
+            if not dpg.does_item_exist(plot.dpg_tag): continue
+            if now - self._panel_refreshed.get(plot.id, 0.0) < 1.0 / plot.refresh_hz: continue
+            self._panel_refreshed[plot.id] = now
+            changed |= self._update_panel(plot, fit_time=plot is time_panel)
+        if changed:
+            self._viewmodel.plot_update_counter += 1
+
+    def _update_panel(self, plot, fit_time):
+        """Redraws the changed series of one panel. Returns True if anything was redrawn."""
+        # Never send DearPyGui more points per series than the plot has pixels to show them.
+        max_points = max(int(dpg.get_item_rect_size(plot.dpg_tag)[0]), 200) * PLOT_POINTS_PER_PIXEL
+        origin = self._viewmodel.start_time_ns
+        changed = False
         for series in plot.series_list:
-            data = self._viewmodel.get_stream_data(series.data_key)
-            if data and dpg.does_item_exist(series.dpg_tag):
-                timestamps = np.array(data["timestamps"]) - self._viewmodel.start_time
-                values = data["values"]
-                dpg.set_value(series.dpg_tag, [list(timestamps), list(values)])
-        
-        if not dpg.get_plot_query_rects(plot.dpg_tag):
-             dpg.fit_axis_data(dpg.get_item_children(plot.dpg_tag, 1)[0]) # X-axis
-             dpg.fit_axis_data(dpg.get_item_children(plot.dpg_tag, 1)[1]) # Y-axis
+            if not dpg.does_item_exist(series.dpg_tag): continue
+            state = (self._viewmodel.get_stream_version(series.data_key), max_points, origin)
+            if self._plotted_versions.get(series.dpg_tag) == state: continue
+            data = self._viewmodel.get_plot_data(series.data_key, max_points)
+            if not data: continue
+            timestamps = ns_to_seconds(data["timestamps"], origin)
+            values = np.ascontiguousarray(data["values"], dtype=np.float64)
+            dpg.set_value(series.dpg_tag, [timestamps, values])
+            self._plotted_versions[series.dpg_tag] = state
+            if len(values):
+                self._series_bounds[series.dpg_tag] = (timestamps[0], timestamps[-1], np.nanmin(values), np.nanmax(values))
+            changed = True
+        if not changed or dpg.get_plot_query_rects(plot.dpg_tag): return changed
+
+        drawn = [(s, self._series_bounds[s.dpg_tag]) for s in plot.series_list if s.dpg_tag in self._series_bounds]
+        for axis, axis_tag in enumerate(plot.y_axis_tags):
+            self._fit_axis((plot.id, axis), axis_tag, [b[2:] for s, b in drawn if s.y_axis == axis])
+        if fit_time:
+            self._fit_axis((plot.id, 'x'), plot.x_axis_tag, [b[:2] for s, b in drawn])
+        return True
+
+    def _fit_axis(self, key, axis_tag, bounds):
+        # Refits `axis_tag` to its data when the combined (min, max) of `bounds` moved since the last fit.
+        if not bounds: return
+        bounds = (min(b[0] for b in bounds), max(b[1] for b in bounds))
+        if self._axis_bounds.get(key) == bounds: return
+        self._axis_bounds[key] = bounds
+        dpg.fit_axis_data(axis_tag)
+
+    def update_series_stats(self):
+        """Shows the running statistics of every plotted series under its entry in the plot manager."""
+        for series in (s for plot in self._viewmodel.plots for s in plot.series_list):
+            tag = f"stats_{series.id}"
+            if not dpg.does_item_exist(tag): continue
+            stats = self._viewmodel.get_stream_stats(series.data_key)
+            count = stats["count"] if stats else 0
+            if self._stats_counts.get(tag) == count: continue
+            self._stats_counts[tag] = count
+            if not count:
+                dpg.set_value(tag, "   no samples yet")
+                continue
+            dpg.set_value(tag, f"   n={stats['count']}  mean={stats['mean']:.4g}  std={stats['std']:.4g}  rms={stats['rms']:.4g}\n"
+                               f"   min={stats['min']:.4g}  max={stats['max']:.4g}  p50={stats['p50']:.4g}  p95={stats['p95']:.4g}")
 
     def update_live_data(self):
         motor = self._viewmodel.active_motor
@@ -750,16 +900,49 @@ class UIManager:
         if dpg.does_item_exist("log_box"):
             dpg.set_value("log_box", log_text)
 
-    def update_data_rate_display(self, packet_rate, plot_rate=0):
+    def update_data_rate_display(self, packet_rate, plot_rate=0, dropped_frames=0):
         if dpg.does_item_exist("actual_freq_text"):
             dpg.set_value("actual_freq_text", f"{packet_rate} Hz")
+        if dpg.does_item_exist("dropped_frames_text"):
+            dpg.set_value("dropped_frames_text", f"{dropped_frames}")
         if dpg.does_item_exist("plot_fps_text"):
             dpg.set_value("plot_fps_text", f"{plot_rate} FPS")
 
+    def update_tx_stats_display(self, stats):
+        if dpg.does_item_exist("tx_queue_text"):
+            dpg.set_value("tx_queue_text", f"{stats['depth']} pending (max {stats['max_priority_depth'] + stats['max_slot_depth']}), {stats['coalesced']} coalesced")
+
+    def show_profiler_overlay(self, show):
+        if dpg.does_item_exist("profiler_window"):
+            dpg.configure_item("profiler_window", show=show)
+        if dpg.does_item_exist("profiler_checkbox"):
+            dpg.set_value("profiler_checkbox", show)
+
+    def update_profiler_overlay(self, profiler):
+        """Shows p50/p99/max per stage and the slowest recent frames. Called by the profiler while it is enabled."""
+        if not dpg.does_item_exist("profiler_stages_text"): return
+        lines = [f"{'stage':<12}{'count':>8}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}"]
+        for stage, s in profiler.summary().items():
+            lines.append(f"{stage:<12}{s['count']:>8}{s['p50'] * 1e3:>9.2f}{s['p99'] * 1e3:>9.2f}{s['max'] * 1e3:>9.2f}")
+        dpg.set_value("profiler_stages_text", "\n".join(lines))
+        lines = ["Slowest recent frames (ms):"]
+        for seconds, stages in profiler.worst_frames():
+            breakdown = ", ".join(f"{stage} {t * 1e3:.1f}" for stage, t in sorted(stages.items(), key=lambda i: -i[1]) if stage != "frame")
+            lines.append(f"{seconds * 1e3:7.1f}: {breakdown}")
+        dpg.set_value("profiler_worst_text", "\n".join(lines))
+
+    def update_memory_display(self, report):
+        if dpg.does_item_exist("stream_memory_text"):
+            dpg.set_value("stream_memory_text", f"{report['total_bytes'] / 1e6:.1f} / {report['budget_bytes'] / 1e6:.0f} MB")
+
     def update_enable_checkbox(self, is_enabled):
         if dpg.does_item_exist("enable_motor_checkbox"):
             dpg.set_value("enable_motor_checkbox", is_enabled)
 
+    def update_periodic_sync_checkbox(self, is_enabled):
+        if dpg.does_item_exist("periodic_sync_checkbox"):
+            dpg.set_value("periodic_sync_checkbox", is_enabled)
+
     def update_can_id_input(self, motor_id):
         if dpg.does_item_exist("new_can_id_input"):
             dpg.set_value("new_can_id_input", motor_id)
@@ -809,4 +992,6 @@ class UIManager:
         if dpg.does_item_exist("modal_following_error"):
             dpg.configure_item("modal_following_error", show=False)
         if dpg.does_item_exist("modal_derivative"):
-            dpg.configure_item("modal_derivative", show=False)
\ No newline at end of file
+            dpg.configure_item("modal_derivative", show=False)
+        if dpg.does_item_exist("modal_expression"):
+            dpg.configure_item("modal_expression", show=False)
\ No newline at end of file
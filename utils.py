@@ -1,4 +1,7 @@
 # utils.py
+import time
+import numpy as np
+
 def ramp_value(current_val, target_val, rate, dt):
     """
     Linearly ramps a value towards a target at a given rate.
@@ -13,4 +16,50 @@ def ramp_value(current_val, target_val, rate, dt):
     if abs(error) < step:
         return target_val
     
-    return current_val + (step if error > 0 else -step)
\ No newline at end of file
+    return current_val + (step if error > 0 else -step)
+
+# --- Time Base ---
+# Every DataService stream is stamped in int64 nanoseconds on the monotonic clock.
+# SocketCAN receive timestamps (can.Message.timestamp) are wall-clock seconds, so they
+# are mapped onto the monotonic clock through a reference pair sampled at the same instant.
+# The wall-clock reference is a whole number of seconds so that subtracting it from a
+# receive timestamp is exact and keeps sub-microsecond resolution.
+_clock_ref_wall_s = 0.0
+_clock_ref_mono_ns = 0
+
+def sync_receive_clock():
+    """Re-samples the wall-clock to monotonic mapping. Call after connecting to a bus."""
+    global _clock_ref_wall_s, _clock_ref_mono_ns
+    mono_ns = time.monotonic_ns()
+    wall_ns = time.time_ns()
+    _clock_ref_wall_s = float(wall_ns // 1_000_000_000)
+    _clock_ref_mono_ns = mono_ns - (wall_ns - int(_clock_ref_wall_s) * 1_000_000_000)
+
+def now_ns():
+    """Returns the current time on the stream time base (monotonic int nanoseconds)."""
+    return time.monotonic_ns()
+
+def receive_time_to_ns(timestamp_s):
+    """Converts a wall-clock receive timestamp in seconds to the stream time base."""
+    if not timestamp_s:
+        return time.monotonic_ns()
+    return _clock_ref_mono_ns + round((timestamp_s - _clock_ref_wall_s) * 1e9)
+
+def receive_times_to_ns(timestamps_s):
+    """Vectorized receive_time_to_ns() for an array of wall-clock timestamps in seconds."""
+    timestamps_s = np.asarray(timestamps_s, dtype=np.float64)
+    ns = _clock_ref_mono_ns + np.rint((timestamps_s - _clock_ref_wall_s) * 1e9).astype(np.int64)
+    missing = timestamps_s == 0
+    if missing.any():
+        ns[missing] = time.monotonic_ns()
+    return ns
+
+def receive_wall_ns_to_ns(wall_ns):
+    """Converts wall-clock receive timestamps in integer nanoseconds (e.g. SO_TIMESTAMPNS) to the stream time base."""
+    return _clock_ref_mono_ns + (np.asarray(wall_ns, dtype=np.int64) - int(_clock_ref_wall_s) * 1_000_000_000)
+
+def ns_to_seconds(timestamps_ns, origin_ns=0):
+    """Converts stream timestamps (int nanoseconds) to float seconds relative to `origin_ns`."""
+    return (np.asarray(timestamps_ns, dtype=np.int64) - origin_ns) * 1e-9
+
+sync_receive_clock()
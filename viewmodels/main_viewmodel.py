@@ -1,10 +1,11 @@
 # viewmodels/main_viewmodel.py
 import dearpygui.dearpygui as dpg
-import queue
 import time
 import math
+import os
 import collections
 import numpy as np
+import can
 from services.can_service import CanService
 from services.motor_service import MotorService
 from services.data_service import DataService
@@ -15,18 +16,36 @@ from services.sysid_tuner_service import SysIdTunerService
 from services.characterization_service import CharacterizationService
 from services.performance_service import PerformanceService
 from services.analysis_service import AnalysisService
-from models.motor import Motor
+from services.ingest_process import IngestProcessClient, MirrorDataService
+from services.recorder import Recorder
+from services.telemetry_events import TelemetryEvents
+from services.can_replay import CanCapture, CanReplayService
+from services.frame_profiler import FrameProfiler
+from models.motor import Motor, split_motor_id
+from models.motor_registry import MotorRegistry
 from models.plot_config import PlotConfig, SeriesConfig
 from config import *
 from ui_manager import UIManager
+from utils import now_ns
 
 class MainViewModel:
     def __init__(self):
         # Services
-        self._can_service = CanService()
-        self._data_service = DataService()
+        self.telemetry = TelemetryEvents()
         self._analysis_service = AnalysisService()
-        self._motor_service = MotorService(self._can_service, self._data_service)
+        if CAN_PROCESS_MODE:
+            # CAN I/O, decoding and stream storage run in a child process; these are proxies to it.
+            self._ingest_client = IngestProcessClient()
+            self._data_service = MirrorDataService(self._ingest_client)
+            self._can_service = self._ingest_client.can_service
+            self._motor_service = self._ingest_client.motor_service
+        else:
+            self._ingest_client = None
+            self._data_service = DataService()
+            self._can_service = CanService()
+            self._motor_service = MotorService(self._can_service, self._data_service)
+            # Telemetry events are published from the RX threads, as each frame arrives.
+            self._can_service.add_rx_listener(self._publish_received)
         self._tuning_service = TuningService(self)
         self._winder_service = WinderService(self)
         self._gearing_service = GearingService(self)
@@ -35,22 +54,25 @@ class MainViewModel:
         self._performance_service = PerformanceService(self)
         
         self.ui_manager = UIManager(self)
+        self.profiler = FrameProfiler(on_report=self.ui_manager.update_profiler_overlay)
 
         # State
         self.is_connected = False
         self.status_text = "Status: Disconnected"
-        self.motors = []
+        self.motors = MotorRegistry()
         self.active_motor_id = None
         self.active_motor = None
-        self.start_time = time.time()
+        self.start_time_ns = now_ns()
         self.sync_motors = []
         
         # This flag now simply prevents sending new commands while a move is active
         self.is_moving = False
         
         # Plotting State
-        self.the_plot = PlotConfig()
+        self.plots = [PlotConfig(name="Plot 1")]
         self.is_plot_paused = False
+        self.recorder = None
+        self.replay = None  # CanReplayService standing in for the CAN bus while a capture plays
         
         # Event Log
         self.log_messages = collections.deque(maxlen=100)
@@ -61,6 +83,7 @@ class MainViewModel:
         self.last_freq_calc_time = 0
         self.telemetry_rate_hz = 0.0
         self.plot_rate_fps = 0.0
+        self.dropped_frame_count = 0
         
         # Telemetry Rate Synchronization
         self.active_telemetry_rate_hz = 100.0
@@ -104,6 +127,9 @@ class MainViewModel:
             self.ui_manager.update_log()
     
     def connect_disconnect(self):
+        if self.replay:
+            self.stop_replay()
+            return
         if self.is_connected:
             self.stop_winder()
             self.stop_gearing()
@@ -115,9 +141,11 @@ class MainViewModel:
         else:
             self.log_message("Connecting to CAN bus...")
             if self._can_service.connect():
+                if self._ingest_client:
+                    self._data_service.sync_remote()
                 self.is_connected = True
                 self.status_text = "Status: Connected"
-                self.start_time = time.time()
+                self.start_time_ns = now_ns()
                 self.log_message("Connection successful.")
             else:
                 self.log_message("ERROR: Connection failed.")
@@ -154,7 +182,7 @@ class MainViewModel:
                 
                 self.request_motor_params(self.active_motor_id)
                 self._motor_service.request_parameter(self.active_motor_id, REG_STATUS)
-                self.ui_manager.update_can_id_input(self.active_motor_id)
+                self.ui_manager.update_can_id_input(split_motor_id(self.active_motor_id)[1])
         except (ValueError, IndexError):
             self.active_motor_id = None
             self.active_motor = None
@@ -163,7 +191,7 @@ class MainViewModel:
                 dpg.set_value("new_can_id_input", 1)
 
     def get_motor_by_id(self, motor_id):
-        return next((m for m in self.motors if m.id == motor_id), None)
+        return self.motors.get(motor_id)
 
     def send_target_to_motor(self, motor_id, target):
         self._motor_service.send_command(motor_id, REG_TARGET, float(target), 'f')
@@ -252,68 +280,124 @@ class MainViewModel:
             self._motor_service.request_parameter(motor_id, param)
             time.sleep(0.02)
             
-    def update(self):
+    def update(self, budget_s=None):
+        """
+        Ingests pending CAN traffic and applies the resulting events. Without `budget_s`
+        everything pending is drained at once; with it, the queues are drained in slices of
+        MAIN_LOOP_DRAIN_SLICE batches until they are empty or `budget_s` seconds are spent.
+        Returns True if received frames are still pending.
+        """
         now = time.time()
+        backlog = False
         if self.is_connected:
             period = 1.0 / self.active_telemetry_rate_hz if self.active_telemetry_rate_hz > 0 else 0.01
             if now - self.last_gui_target_update_time >= period:
-                self._data_service.add_data_point("gui_target", now, self._previous_gui_target)
+                self._data_service.add_data_point("gui_target", now_ns(), self._previous_gui_target)
                 self.last_gui_target_update_time = now
 
-            message_queue = self._can_service.get_message_queue()
-            try:
-                while not message_queue.empty():
-                    msg = message_queue.get_nowait()
-                    self.telemetry_packet_counter += 1
-                    result = self._motor_service.process_message(msg, self.motors)
-                    
-                    if not result: continue
-                    event_type, data = result
-                    if event_type == 'new_motor':
-                        if data.id not in [m.id for m in self.motors]:
-                            self.motors.append(data)
-                            self.log_message(f"Discovered new motor with ID: {data.id}")
-                            self.ui_manager.rebuild_dynamic_ui()
-                    elif event_type == 'telemetry':
-                        motor = self.get_motor_by_id(data['motor_id'])
-                        if motor:
-                            motor.angle, motor.velocity, motor.current_q = data['angle'], data['velocity'], data['current_q']
-                    elif event_type == 'status_feedback':
-                        motor = self.get_motor_by_id(data['motor_id'])
-                        if motor:
-                            motor.status_angle, motor.status_velocity, motor.state = data['angle'], data['velocity'], data['state']
-                    elif event_type == 'param_response':
-                        motor = self.get_motor_by_id(data['motor_id'])
-                        if motor:
-                            if data['reg_id'] == REG_PHASE_RESISTANCE: motor.phase_resistance = data['value']
-                            elif data['reg_id'] == REG_INDUCTANCE: motor.phase_inductance = data['value']
-                        self.ui_manager.update_parameter_widgets(reg_id=data['reg_id'], value=data['value'])
-                    elif event_type == 'status_response':
-                        motor = self.get_motor_by_id(data['motor_id'])
-                        if motor:
-                            motor.is_enabled = data['is_enabled']
-                            if motor.id == self.active_motor_id: self.ui_manager.update_enable_checkbox(motor.is_enabled)
-                    elif event_type == 'char_response':
-                        self.characterization_results = {'R': data['R'], 'L': data['L']}
-                        if self.active_motor:
-                            self.active_motor.phase_resistance = data['R']
-                            self.active_motor.phase_inductance = data['L']
-                        self.ui_manager.update_parameter_widgets(REG_PHASE_RESISTANCE, data['R'])
-                        self.ui_manager.update_parameter_widgets(REG_INDUCTANCE, data['L'])
-            except queue.Empty: pass
-        
+            deadline = None if budget_s is None else time.perf_counter() + budget_s
+            while True:
+                events, backlog = self._ingest_slice(None if deadline is None else MAIN_LOOP_DRAIN_SLICE)
+                self._apply_events(events)
+                if not backlog or deadline is None or time.perf_counter() >= deadline: break
+
         if now - self.last_freq_calc_time > 1.0:
             self.telemetry_rate_hz = self.telemetry_packet_counter
             self.plot_rate_fps = self.plot_update_counter
-            self.ui_manager.update_data_rate_display(self.telemetry_rate_hz, self.plot_rate_fps)
+            self.dropped_frame_count = self._can_service.get_rx_stats()["dropped"]
+            self.ui_manager.update_data_rate_display(self.telemetry_rate_hz, self.plot_rate_fps, self.dropped_frame_count)
+            self.ui_manager.update_tx_stats_display(self._can_service.get_tx_stats())
+            self._data_service.apply_retention()
+            self.ui_manager.update_memory_display(self._data_service.memory_report())
             self.telemetry_packet_counter = 0
             self.plot_update_counter = 0
             self.last_freq_calc_time = now
 
-        if self.active_motor_id is not None and self.active_motor_id not in [m.id for m in self.motors]:
+        if self.active_motor_id is not None and self.active_motor_id not in self.motors:
             self.select_motor(None, None, None)
+        return backlog
+
+    def wait_for_io(self, timeout):
+        """Blocks until received frames are ready to ingest or `timeout` seconds pass. Returns True if there is something to ingest."""
+        if not self.is_connected:
+            time.sleep(timeout)
+            return False
+        if self._ingest_client:
+            return self._ingest_client.wait(timeout)
+        return self._can_service.wait_for_rx(timeout, MAIN_LOOP_WAKE_ITEMS, MAIN_LOOP_WAKE_LINGER)
+
+    def _ingest_slice(self, max_count):
+        # Drains up to `max_count` frame batches (or as many frames' worth of python-can
+        # messages), everything if None. Returns (events, True if more may be pending).
+        if self._ingest_client:
+            events, frame_count = self._ingest_client.poll(self._data_service)
+            self.telemetry_packet_counter += frame_count
+            return events, False
+        max_messages = None if max_count is None else max_count * CAN_RAW_BATCH_SIZE
+        messages = self._can_service.drain_messages(max_messages)
+        self.telemetry_packet_counter += len(messages)
+        if self.recorder:
+            self.recorder.record_messages(messages)
+        events = self._motor_service.process_messages(messages, self.motors)
+        batches = self._can_service.drain_frame_batches(max_count)
+        for batch in batches:
+            self.telemetry_packet_counter += len(batch)
+            if self.recorder:
+                self.recorder.record_frame_batch(batch)
+            events.extend(self._motor_service.process_frame_batch(batch, self.motors))
+        backlog = max_count is not None and (len(messages) == max_messages or len(batches) == max_count)
+        return events, backlog
+
+    def _apply_events(self, events):
+        """Applies decoded events to the motors and UI, then publishes them to telemetry subscribers."""
+        for event_type, data in events:
+            if event_type == 'new_motor':
+                if data.id not in self.motors:
+                    self.motors.append(data)
+                    self.log_message(f"Discovered new motor with ID: {data.id} ({self._bus_name(data.bus)}, node {data.node_id})")
+                    self.ui_manager.rebuild_dynamic_ui()
+            elif event_type == 'telemetry':
+                motor = self.get_motor_by_id(data['motor_id'])
+                if motor:
+                    motor.angle, motor.velocity, motor.current_q = data['angle'], data['velocity'], data['current_q']
+            elif event_type == 'status_feedback':
+                motor = self.get_motor_by_id(data['motor_id'])
+                if motor:
+                    motor.status_angle, motor.status_velocity, motor.state = data['angle'], data['velocity'], data['state']
+            elif event_type == 'param_response':
+                motor = self.get_motor_by_id(data['motor_id'])
+                if motor:
+                    if data['reg_id'] == REG_PHASE_RESISTANCE: motor.phase_resistance = data['value']
+                    elif data['reg_id'] == REG_INDUCTANCE: motor.phase_inductance = data['value']
+                self.ui_manager.update_parameter_widgets(reg_id=data['reg_id'], value=data['value'])
+            elif event_type == 'status_response':
+                motor = self.get_motor_by_id(data['motor_id'])
+                if motor:
+                    motor.is_enabled = data['is_enabled']
+                    if motor.id == self.active_motor_id: self.ui_manager.update_enable_checkbox(motor.is_enabled)
+            elif event_type == 'char_response':
+                self.characterization_results = {'R': data['R'], 'L': data['L']}
+                if self.active_motor:
+                    self.active_motor.phase_resistance = data['R']
+                    self.active_motor.phase_inductance = data['L']
+                self.ui_manager.update_parameter_widgets(REG_PHASE_RESISTANCE, data['R'])
+                self.ui_manager.update_parameter_widgets(REG_INDUCTANCE, data['L'])
+        if self._ingest_client:
+            # The ingest process sends its events once per cycle, so they are published here,
+            # after the motors reflect them. Locally, _publish_received() did it on receipt.
+            self.telemetry.publish(events)
+
+    def _publish_received(self, frames):
+        # Called on the CAN reader (or replay) threads with each received message or FrameBatch.
+        self.telemetry.publish(self._motor_service.decode_events(frames))
+
+    def _bus_name(self, bus):
+        channels = self.replay.channels if self.replay else CAN_CHANNELS
+        return channels[bus] if bus < len(channels) else f"bus {bus}"
 
     def disconnect(self):
+        self.stop_recording()
+        self.stop_replay()
         if self.is_connected:
             self._can_service.disconnect()
             self.is_connected = False
@@ -321,6 +405,19 @@ class MainViewModel:
     def send_sync(self):
         self._motor_service.send_sync()
 
+    def set_periodic_sync(self, enabled):
+        if not enabled:
+            self._motor_service.stop_sync_stream()
+            return
+        if not self.is_connected:
+            self.log_message("ERROR: Must be connected to start periodic SYNC.")
+        elif self._motor_service.start_sync_stream():
+            self.log_message(f"Periodic SYNC started ({1.0 / CAN_SYNC_PERIOD:.0f} Hz, kernel-timed).")
+            return
+        else:
+            self.log_message("ERROR: Periodic SYNC needs CAN_USE_BCM = True in config.py.")
+        self.ui_manager.update_periodic_sync_checkbox(False)
+
     def plan_and_execute_trajectory(self):
         self.sync_motors.clear()
         all_motor_names = [f"Motor {m.id}" for m in self.motors]
@@ -439,17 +536,69 @@ class MainViewModel:
         except Exception as e:
             self.log_message(f"Error applying bandwidth gains: {e}")
             
-    def add_series_to_plot(self, data_key):
+    def _find_plot(self, plot_id):
+        return next((p for p in self.plots if p.id == plot_id), None)
+
+    def _is_plotted(self, data_key):
+        return any(s.data_key == data_key for p in self.plots for s in p.series_list)
+
+    def add_plot_panel(self):
+        self.plots.append(PlotConfig(name=f"Plot {len(self.plots) + 1}"))
+        self.ui_manager.rebuild_dynamic_ui()
+
+    def remove_plot_panel(self, plot_id):
+        if len(self.plots) == 1: return  # Always keep one panel
+        plot = self._find_plot(plot_id)
+        if not plot: return
+        self.plots.remove(plot)
+        self._release_series(plot.series_list)
+        self.ui_manager.rebuild_dynamic_ui()
+
+    def set_plot_refresh_rate(self, plot_id, refresh_hz):
+        plot = self._find_plot(plot_id)
+        if plot: plot.refresh_hz = max(float(refresh_hz), 0.1)
+
+    def set_series_axis(self, series_id, y_axis):
+        for plot in self.plots:
+            for series in plot.series_list:
+                if series.id == series_id:
+                    series.y_axis = min(max(int(y_axis), 0), PLOT_Y_AXES - 1)
+                    self.ui_manager.rebuild_dynamic_ui()
+                    return
+
+    def add_series_to_plot(self, data_key, plot_id=None, y_axis=0):
+        """Adds `data_key` to panel `plot_id` (the first panel by default) on Y-axis `y_axis`."""
         if not data_key: return
-        if any(s.data_key == data_key for s in self.the_plot.series_list): return
-        new_series = SeriesConfig(data_key=data_key)
-        self.the_plot.series_list.append(new_series)
+        plot = self._find_plot(plot_id) if plot_id else self.plots[0]
+        if not plot or any(s.data_key == data_key for s in plot.series_list): return
+        new_series = SeriesConfig(data_key=data_key, y_axis=min(max(int(y_axis), 0), PLOT_Y_AXES - 1))
+        plot.series_list.append(new_series)
+        self._data_service.enable_stats(data_key)
+        self._data_service.set_decimation(data_key)  # Full rate while under analysis
         self.ui_manager.rebuild_dynamic_ui()
 
     def remove_series(self, series_id):
-        self.the_plot.series_list = [s for s in self.the_plot.series_list if s.id != series_id]
+        removed = []
+        for plot in self.plots:
+            removed += [s for s in plot.series_list if s.id == series_id]
+            plot.series_list = [s for s in plot.series_list if s.id != series_id]
+        self._release_series(removed)
         self.ui_manager.rebuild_dynamic_ui()
 
+    def _release_series(self, removed):
+        # Streams no longer on any panel go back to their normal stats and decimation settings.
+        for series in removed:
+            if self._is_plotted(series.data_key): continue
+            if not STATS_ALL_STREAMS:
+                self._data_service.disable_stats(series.data_key)
+            self._data_service.restore_decimation(series.data_key)
+
+    def get_stream_stats(self, key):
+        return self._data_service.get_stats(key)
+
+    def reset_stream_stats(self, key):
+        self._data_service.reset_stats(key)
+
     def set_telemetry_rate(self, rate_str):
         if self.active_motor_id is None: return
         try:
@@ -460,18 +609,158 @@ class MainViewModel:
         except ValueError:
             self.log_message(f"Invalid frequency format: {rate_str}")
 
+    def instrument_main_loop(self, scheduler):
+        """Registers the stages of `scheduler` (a FrameScheduler) and of the work inside them with the frame profiler."""
+        targets = [
+            (scheduler, "run_frame", "frame"), (scheduler, "_ingest", "ingest"),
+            (self._motor_service, "process_messages", "decode"), (self._motor_service, "process_frame_batch", "decode"),
+            (self, "_apply_events", "events"), (scheduler, "_wait_for_io", "wait"), (scheduler, "_update_ui", "ui"),
+            (self.ui_manager, "create_and_update_dynamic_ui", "dynamic_ui"), (self.ui_manager, "update_plots_data", "plots"),
+            (self.ui_manager, "update_series_stats", "stats"), (self.ui_manager, "update_log", "log"),
+            (scheduler, "_render", "render"),
+        ]
+        for obj, name, stage in targets:
+            if hasattr(obj, name):  # The ingest process proxies don't decode in this process
+                self.profiler.instrument(obj, name, stage, frame=name == "run_frame")
+        if PROFILER_ENABLED:
+            self.set_profiler_state(True)
+
+    def set_profiler_state(self, enabled):
+        if enabled:
+            self.profiler.reset()
+            self.profiler.enable()
+        else:
+            self.profiler.disable()
+        self.ui_manager.show_profiler_overlay(enabled)
+
+    def reset_profiler(self):
+        self.profiler.reset()
+
     def set_plot_pause_state(self, is_paused):
         self.is_plot_paused = is_paused
 
+    def start_recording(self):
+        """
+        Starts recording every stream and every raw CAN frame to a new directory. In
+        CAN_PROCESS_MODE the ingest process records its streams and the frames into the
+        same directory, and this process only the streams it adds itself.
+        """
+        if self.recorder: return
+        directory = os.path.join(RECORD_DIRECTORY, time.strftime("%Y%m%d_%H%M%S"))
+        try:
+            recorder = Recorder(directory, self._data_service.value_dtype)
+            recorder.start()
+        except (OSError, ValueError) as e:
+            self.log_message(f"ERROR: Could not start recording: {e}")
+            return
+        if self._ingest_client and self._ingest_client.is_running:
+            if not self._ingest_client.call("ingest", "start_recording", directory, reply=True):
+                self.log_message("ERROR: The ingest process could not start recording; only GUI streams are recorded.")
+        self.recorder = self._data_service.recorder = recorder
+        self.log_message(f"Recording to {directory}")
+
+    def stop_recording(self):
+        if not self.recorder: return
+        recorder = self.recorder
+        self.recorder = self._data_service.recorder = None
+        recorder.stop()
+        written, dropped = recorder.written_rows, recorder.dropped_rows
+        if self._ingest_client:
+            remote = self._ingest_client.call("ingest", "stop_recording", reply=True)
+            if remote:
+                written, dropped = written + remote["written_rows"], dropped + remote["dropped_rows"]
+        self.log_message(f"Recording saved to {recorder.directory} ({written} rows, {dropped} dropped).")
+
+    def set_recording_state(self, is_recording):
+        if is_recording: self.start_recording()
+        else: self.stop_recording()
+
+    def start_replay(self, path, speed=1.0):
+        """
+        Replaces the CAN bus with a replay of a recording directory or a candump/ASC log, so
+        its frames go through MotorService, DataService and the UI like live traffic.
+        """
+        if CAN_PROCESS_MODE:
+            self.log_message("ERROR: Replay is not available with CAN_PROCESS_MODE.")
+            return
+        self.stop_replay()
+        try:
+            capture = CanCapture.load(path)
+        except (OSError, ValueError, can.CanError) as e:
+            self.log_message(f"ERROR: Could not load capture '{path}': {e}")
+            return
+        if self.is_connected:
+            self.connect_disconnect()
+        replay = CanReplayService(capture, speed)
+        replay.add_rx_listener(self._publish_received)
+        if not replay.connect():
+            self.log_message("ERROR: Replay failed to start.")
+            return
+        self.replay = replay
+        self._live_can_service = self._can_service
+        self._can_service = self._motor_service._can_service = replay
+        self.is_connected = True
+        self.status_text = "Status: Replaying"
+        self.start_time_ns = now_ns()
+        self.log_message(f"Replaying {len(capture)} frames ({capture.duration_s:.1f} s) from {path}")
+
+    def stop_replay(self):
+        if not self.replay: return
+        self.stop_winder()
+        if self._gearing_service.is_active:
+            self.stop_gearing()
+        self.replay.disconnect()
+        self.replay = None
+        self._can_service = self._motor_service._can_service = self._live_can_service
+        self.is_connected = False
+        self.status_text = "Status: Disconnected"
+        self.log_message("Replay stopped.")
+
+    def seek_replay(self, seconds):
+        if self.replay:
+            self.replay.seek(seconds)
+
+    def seek_replay_to_id(self, arbitration_id, seconds=0.0):
+        if self.replay and not self.replay.seek_to_id(arbitration_id, seconds):
+            self.log_message(f"No frame with ID 0x{arbitration_id:X} after {seconds:.3f} s.")
+
+    def set_replay_speed(self, speed):
+        if self.replay:
+            self.replay.set_speed(speed)
+
     def set_plot_history_length(self, length):
         self._data_service.change_history_length(length)
 
+    def set_stream_retention_seconds(self, key, seconds):
+        """Keeps `seconds` of history for `key` at priority 2 (above unplotted streams); 0 returns it to the global length."""
+        if seconds and seconds > 0:
+            self._data_service.set_retention(key, seconds=seconds, priority=2)
+        else:
+            self._data_service.set_retention(key)
+
+    def get_stream_retention(self, key):
+        return self._data_service.get_retention(key)
+
+    def log_memory_report(self, top=10):
+        report = self._data_service.memory_report()
+        self.log_message(f"Stream memory: {report['total_bytes'] / 1e6:.1f} MB of {report['budget_bytes'] / 1e6:.0f} MB budget "
+                         f"({report['calculated_bytes'] / 1e6:.1f} MB calculated streams, {report['pyramid_bytes'] / 1e6:.1f} MB plot pyramids)")
+        for row in report["streams"][:top]:
+            rate = f"{row['rate_hz']:.0f} Hz" if row["rate_hz"] else "-- Hz"
+            self.log_message(f"  {row['key']}: {row['samples']}/{row['capacity']} samples, {row['bytes'] / 1e6:.2f} MB, {rate}, {row['policy']}")
+
     def get_available_data_keys(self):
         return self._data_service.get_all_stream_keys()
 
     def get_stream_data(self, key):
         return self._data_service.get_stream_data(key)
 
+    def get_stream_version(self, key):
+        return self._data_service.get_stream_version(key)
+
+    def get_plot_data(self, key, max_points):
+        return self._data_service.get_plot_data(key, max_points)
+
     def start_or_resume_winder(self, config):
         self._winder_service.start_or_resume(config)
 
@@ -588,6 +877,22 @@ class MainViewModel:
         self.log_message(f"Created new signal '{name}' = d/dt({key})")
         self.ui_manager.rebuild_dynamic_ui()
         self.ui_manager.close_popups()
+
+    def create_expression_signal(self, name, expression):
+        if not name or not expression:
+            self.log_message("ERROR: Please provide a name and an expression.")
+            return
+        if name in self.get_available_data_keys():
+            self.log_message(f"ERROR: A signal named '{name}' already exists.")
+            return
+        try:
+            self._data_service.register_expression_stream(name, expression)
+        except ValueError as e:
+            self.log_message(f"ERROR: {e}")
+            return
+        self.log_message(f"Created new signal '{name}' = {expression}")
+        self.ui_manager.rebuild_dynamic_ui()
+        self.ui_manager.close_popups()
         
     def start_performance_test(self, test_type):
         if self.active_motor_id is None:
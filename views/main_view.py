@@ -22,6 +22,7 @@ class MainView:
         """
         self.ui_manager.update_live_data()
         self.ui_manager.update_plots_data()
+        self.ui_manager.update_series_stats()
         self.ui_manager.update_log()
         # This handles UI elements that need to be rebuilt (like plot series)
         self.ui_manager.create_and_update_dynamic_ui()
\ No newline at end of file